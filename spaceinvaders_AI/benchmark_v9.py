@@ -0,0 +1,234 @@
+# =============================================================================
+# benchmark_v9.py  —  Micro-benchmarks for PPO v9 training knobs
+# =============================================================================
+#
+# lstm   LSTM activation checkpointing (train_v9 LSTM_CHECKPOINT).
+#        For each checkpoint interval k and sequences-per-batch B, runs
+#        net.evaluate + backward on (B, SEQ_LEN) random sequences and reports
+#        training steps/s and the memory autograd holds for backward:
+#          saved MB   bytes of tensors saved for backward (any device)
+#          peak MB    torch.cuda.max_memory_allocated (GPU only)
+#        Recompute cost = steps/s drop vs k=0; the payoff is the larger B
+#        that fits the device.
+#
+# grid   Grid encoders (train_v9 GRID_ENCODER) on real env states:
+#          speed     backbone states/s — rollout batch (no grad) and a
+#                    training batch (forward + backward)
+#          exact     max |conv_lut - conv| output difference (same weights)
+#          learning  distillation proxy: each encoder trained from scratch to
+#                    match a teacher's single-step action distribution;
+#                    held-out KL after a fixed number of Adam steps. The
+#                    teacher is the given checkpoint, else a random conv net.
+#
+# Usage:
+#   python benchmark_v9.py lstm               # SEQ_LEN from ppo_agent_v9
+#   python benchmark_v9.py lstm 640           # shorter sequences (quick on CPU)
+#   python benchmark_v9.py grid               # random conv teacher
+#   python benchmark_v9.py grid best_model_v9.pth
+#
+# =============================================================================
+
+import sys
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from ppo_agent_v9 import ActorCritic, SEQ_LEN
+from features_v7 import STATE_SIZE
+
+DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+class _SavedBytes:
+    """
+    Bytes of storage autograd keeps for backward inside the block. Each
+    storage counts once — the LSTM saves the same weight at every step.
+    """
+
+    def __enter__(self):
+        self.bytes = 0
+        seen = set()
+
+        def pack(t):
+            st = t.untyped_storage()
+            if st.data_ptr() not in seen:
+                seen.add(st.data_ptr())
+                self.bytes += st.nbytes()
+            return t
+
+        self._hooks = torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t)
+        self._hooks.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._hooks.__exit__(*exc)
+
+
+def _sync(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+# =============================================================================
+# LSTM CHECKPOINTING
+# =============================================================================
+
+def bench_lstm_checkpoint(seq_len=SEQ_LEN, batch_sizes=(4, 8, 16), ks=(0, 64, 256),
+                          device=DEVICE, reps=2):
+    """Returns [(k, B, steps_per_sec, saved_mb, peak_mb or None), ...]."""
+    net = ActorCritic().to(device)
+    net.train()
+    rows = []
+    for B in batch_sizes:
+        states  = torch.rand(B, seq_len, STATE_SIZE, device=device)
+        actions = torch.randint(0, 4, (B, seq_len), device=device)
+        for k in ks:
+            net.lstm.checkpoint_every = k
+            if device.type == 'cuda':
+                torch.cuda.empty_cache()
+                torch.cuda.reset_peak_memory_stats()
+            try:
+                times = []
+                for _ in range(reps + 1):       # first pass is warm-up
+                    _sync(device)
+                    t0 = time.time()
+                    with _SavedBytes() as saved:
+                        lp, v, ent = net.evaluate(states, actions, net.init_hidden(B, device))
+                    (lp.mean() + v.mean() + ent.mean()).backward()
+                    _sync(device)
+                    times.append(time.time() - t0)
+                    net.zero_grad(set_to_none=True)
+            except torch.cuda.OutOfMemoryError:
+                rows.append((k, B, None, None, None))
+                print(f"  k={k:>4}  B={B:>3}  out of memory")
+                continue
+            sps  = B * seq_len / min(times[1:])
+            peak = torch.cuda.max_memory_allocated() / 2**20 if device.type == 'cuda' else None
+            rows.append((k, B, sps, saved.bytes / 2**20, peak))
+            print(f"  k={k:>4}  B={B:>3}  {sps:>9,.0f} steps/s  saved={saved.bytes / 2**20:>8.1f} MB"
+                  + (f"  peak={peak:>8.1f} MB" if peak is not None else ""))
+    net.lstm.checkpoint_every = 0
+    return rows
+
+
+# =============================================================================
+# GRID ENCODERS
+# =============================================================================
+
+ENCODERS = ('conv', 'conv_lut', 'embed')
+
+
+def _env_states(n, n_envs=32, seed=0):
+    """n real states from random play (the grid is binary, as in training)."""
+    from vec_env_v7 import VecEnv
+    rng    = np.random.default_rng(seed)
+    venv   = VecEnv(n_envs)
+    states = [venv.reset()]
+    while len(states) * n_envs < n:
+        states.append(venv.step(rng.integers(0, 4, n_envs))[0])
+    return torch.from_numpy(np.concatenate(states)[:n])
+
+
+def _rate(fn, n_states, device, reps=5):
+    fn()                                     # warm-up
+    best = float('inf')
+    for _ in range(reps):
+        _sync(device)
+        t0 = time.time()
+        fn()
+        _sync(device)
+        best = min(best, time.time() - t0)
+    return n_states / best
+
+
+def bench_grid_encoders(teacher_path=None, device=DEVICE, rollout_batch=32, train_batch=8192,
+                        distill_steps=300, distill_batch=256):
+    """Returns {encoder: {'rollout_sps', 'train_sps', 'max_diff', 'kl'}}."""
+    states = _env_states(train_batch + 4096).to(device)
+    train_x, test_x = states[:train_batch], states[train_batch:]
+
+    # ── Speed (+ exactness of conv_lut) ──────────────────────────────────────
+    ref  = ActorCritic('conv').to(device)
+    rows = {}
+    for enc in ENCODERS:
+        net = ActorCritic(enc).to(device)
+        if enc == 'conv_lut':
+            net.load_state_dict(ref.state_dict())
+        roll = train_x[:rollout_batch]
+        with torch.no_grad():
+            r_sps = _rate(lambda: net._backbone(roll), rollout_batch, device, reps=50)
+
+        def step():
+            net._backbone(train_x).sum().backward()
+            net.zero_grad(set_to_none=True)
+        t_sps = _rate(step, train_batch, device)
+
+        diff = None
+        if enc == 'conv_lut':
+            with torch.no_grad():
+                diff = float((net._backbone(test_x) - ref._backbone(test_x)).abs().max())
+        rows[enc] = {'rollout_sps': r_sps, 'train_sps': t_sps, 'max_diff': diff}
+
+    # ── Learning proxy: distil a teacher's action distribution ──────────────
+    if teacher_path:
+        from evaluate_v9 import load_policy
+        teacher = load_policy(teacher_path, device)[0]
+    else:
+        teacher = ActorCritic('conv').to(device)
+    teacher.eval()
+
+    def logits(net, x):
+        lstm_out, _ = net.lstm(net._backbone(x.unsqueeze(1)))
+        return net.actor_head(lstm_out.squeeze(1))
+
+    def logp(net, x):
+        return F.log_softmax(logits(net, x), dim=-1)
+
+    with torch.no_grad():
+        z = logits(teacher, states)
+        if not teacher_path:                 # fresh net is ~uniform — spread its logits
+            z = 3.0 * (z - z.mean(0)) / z.std(0)
+        t_all = F.log_softmax(z, dim=-1)
+        t_train, t_test = t_all[:train_batch], t_all[train_batch:]
+        t_ent = float(-(t_test.exp() * t_test).sum(-1).mean())
+    for enc in ENCODERS:
+        torch.manual_seed(0)
+        net = ActorCritic(enc).to(device)
+        opt = torch.optim.Adam(net.parameters(), lr=1e-3)
+        g   = torch.Generator().manual_seed(0)
+        for _ in range(distill_steps):
+            idx  = torch.randint(0, train_batch, (distill_batch,), generator=g).to(device)
+            loss = F.kl_div(logp(net, train_x[idx]), t_train[idx], log_target=True,
+                            reduction='batchmean')
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+        with torch.no_grad():
+            rows[enc]['kl'] = float(F.kl_div(logp(net, test_x), t_test, log_target=True,
+                                             reduction='batchmean'))
+
+    base = rows['conv']
+    print(f"  teacher entropy {t_ent:.3f} nats (uniform = {np.log(4):.3f})  |  "
+          f"{distill_steps} Adam steps × {distill_batch}")
+    for enc, r in rows.items():
+        print(f"  {enc:<9} rollout {r['rollout_sps']:>10,.0f} st/s ({r['rollout_sps'] / base['rollout_sps']:4.2f}×)"
+              f"  train {r['train_sps']:>9,.0f} st/s ({r['train_sps'] / base['train_sps']:4.2f}×)"
+              f"  distil KL {r['kl']:.4f}"
+              + (f"  max|Δ| vs conv {r['max_diff']:.1e}" if r['max_diff'] is not None else ""))
+    return rows
+
+
+if __name__ == '__main__':
+    what = sys.argv[1] if len(sys.argv) > 1 else 'lstm'
+    if what == 'lstm':
+        seq_len = int(sys.argv[2]) if len(sys.argv) > 2 else SEQ_LEN
+        print(f"LSTM checkpointing  |  seq_len={seq_len}  |  {DEVICE}")
+        bench_lstm_checkpoint(seq_len)
+    elif what == 'grid':
+        print(f"Grid encoders  |  {DEVICE}")
+        bench_grid_encoders(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        print("usage: python benchmark_v9.py lstm [seq_len] | grid [teacher.pth]")
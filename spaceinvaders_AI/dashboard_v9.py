@@ -0,0 +1,175 @@
+# =============================================================================
+# dashboard_v9.py  —  "Wall of games": watch many envs at once, cheaply
+# =============================================================================
+#
+# SpaceInvadersEnv.render() draws one 800×800 game with a pygame.draw.rect
+# per alien and re-renders the HUD font every frame. Fine for one game,
+# hopeless for watching 64 training envs side by side.
+#
+# GameWall draws N games from stacked snapshots (N, SNAPSHOT_SIZE) — see
+# SpaceInvadersEnv.snapshot():
+#
+#   1. Every alien / player / bullet of every game is rasterised into ONE
+#      8-bit palette-index array with a single fancy-index write per object
+#      type (no per-object draw calls).
+#   2. The array is pushed to an 8-bit palette surface with
+#      pygame.surfarray.blit_array, then blitted to the display once.
+#   3. Each tile's HUD line is a cached text surface — the font only
+#      re-renders when that tile's score/alien count actually changes.
+#
+# Usage (demo with random-action envs):
+#   python dashboard_v9.py          # 16 games
+#   python dashboard_v9.py 64 100   # 64 games, 100px tiles
+#
+# =============================================================================
+
+import sys
+import math
+import random
+import numpy as np
+import pygame
+
+from game_env_v7 import (SpaceInvadersEnv, SCREEN_W, MAX_ALIENS,
+                         ALIEN_BASE_X, ALIEN_BASE_Y,
+                         SNAP_ALIVE, SNAP_DX, SNAP_DY, SNAP_PX, SNAP_PY,
+                         SNAP_BULLET, SNAP_BX, SNAP_BY, SNAP_SCORE, SNAP_ALIENS,
+                         BG, BLUE, RED, WHITE)
+
+# Palette indices for the 8-bit canvas
+PAL_BG, PAL_ALIEN, PAL_PLAYER, PAL_BULLET, PAL_HUD = range(5)
+PALETTE = [BG, BLUE, RED, WHITE, (20, 20, 20)]
+
+HUD_COLOUR = (200, 200, 200)
+
+
+class GameWall:
+    """
+    Tiled viewer for N games.
+
+    n_envs:  number of tiles
+    tile:    tile width/height in px (game is scaled from 800×800)
+    cols:    tiles per row (default: square-ish grid)
+    surface: draw into this surface instead of opening a window
+    """
+
+    def __init__(self, n_envs, tile=160, cols=None, hud_h=14, surface=None,
+                 caption="Space Invaders — wall of games"):
+        self.n      = n_envs
+        self.tile   = tile
+        self.cols   = cols or math.ceil(math.sqrt(n_envs))
+        self.rows   = math.ceil(n_envs / self.cols)
+        self.hud_h  = hud_h
+        self.cell_h = tile + hud_h
+        self.scale  = tile / SCREEN_W
+        self.width  = self.cols * tile
+        self.height = self.rows * self.cell_h
+
+        if not pygame.get_init():
+            pygame.init()
+        if surface is None:
+            surface = pygame.display.set_mode((self.width, self.height))
+            pygame.display.set_caption(caption)
+        self.screen = surface
+        self.font   = pygame.font.SysFont(None, hud_h + 4)
+
+        # 8-bit palette canvas, indexed [x, y] like surfarray
+        self.canvas = pygame.Surface((self.width, self.height), depth=8)
+        self.canvas.set_palette(PALETTE)
+        self.pixels = np.zeros((self.width, self.height), dtype=np.uint8)
+
+        # Background template: black game areas, grey HUD strips
+        self._template = np.full((self.width, self.height), PAL_BG, dtype=np.uint8)
+        for r in range(self.rows):
+            y0 = r * self.cell_h + tile
+            self._template[:, y0:y0 + hud_h] = PAL_HUD
+
+        # Tile origin of each env, in canvas px
+        env_ids = np.arange(n_envs)
+        self._ox = (env_ids % self.cols) * tile
+        self._oy = (env_ids // self.cols) * self.cell_h
+
+        self._hud_cache = [None] * n_envs   # per tile: (text, rendered surface)
+
+    # ── Rasterise a batch of equal-sized rects in one write ─────────────────
+
+    def _fill_rects(self, env_ids, x, y, w, h, colour):
+        pw = max(1, int(round(w * self.scale)))
+        ph = max(1, int(round(h * self.scale)))
+        x0 = np.clip((x * self.scale).astype(np.int64), 0, self.tile - pw) + self._ox[env_ids]
+        y0 = np.clip((y * self.scale).astype(np.int64), 0, self.tile - ph) + self._oy[env_ids]
+        xs = x0[:, None, None] + np.arange(pw)[None, :, None]
+        ys = y0[:, None, None] + np.arange(ph)[None, None, :]
+        self.pixels[xs, ys] = colour
+
+    # ── Draw ────────────────────────────────────────────────────────────────
+
+    def draw(self, snaps, flip=True):
+        """snaps: (n_envs, SNAPSHOT_SIZE) float32, one row per game."""
+        snaps = np.asarray(snaps)
+        np.copyto(self.pixels, self._template)
+
+        # Aliens — all live aliens of all games in one write
+        env_ids, alien_ids = np.nonzero(snaps[:, SNAP_ALIVE:SNAP_ALIVE + MAX_ALIENS] > 0.5)
+        if len(env_ids):
+            ax = ALIEN_BASE_X[alien_ids] + snaps[env_ids, SNAP_DX]
+            ay = ALIEN_BASE_Y[alien_ids] + snaps[env_ids, SNAP_DY]
+            self._fill_rects(env_ids, ax, ay, 40, 40, PAL_ALIEN)
+
+        # Players
+        all_ids = np.arange(self.n)
+        self._fill_rects(all_ids, snaps[:, SNAP_PX], snaps[:, SNAP_PY], 40, 35, PAL_PLAYER)
+
+        # Bullets in flight
+        b_ids = np.flatnonzero(snaps[:, SNAP_BULLET] > 0.5)
+        if len(b_ids):
+            self._fill_rects(b_ids, snaps[b_ids, SNAP_BX], snaps[b_ids, SNAP_BY],
+                             10, 30, PAL_BULLET)
+
+        pygame.surfarray.blit_array(self.canvas, self.pixels)
+        self.screen.blit(self.canvas, (0, 0))
+
+        # HUD text — only re-rendered when the numbers change
+        for i in range(self.n):
+            text = f"{int(snaps[i, SNAP_SCORE]):>4}  |  {int(snaps[i, SNAP_ALIENS]):>2} left"
+            cached = self._hud_cache[i]
+            if cached is None or cached[0] != text:
+                cached = (text, self.font.render(text, True, HUD_COLOUR))
+                self._hud_cache[i] = cached
+            self.screen.blit(cached[1], (self._ox[i] + 3, self._oy[i] + self.tile + 1))
+
+        if flip:
+            pygame.display.flip()
+
+
+# =============================================================================
+# DEMO — random-action envs
+# =============================================================================
+
+if __name__ == '__main__':
+    n_envs = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    tile   = int(sys.argv[2]) if len(sys.argv) > 2 else 160
+
+    envs  = [SpaceInvadersEnv(render_mode=False) for _ in range(n_envs)]
+    wall  = GameWall(n_envs, tile=tile)
+    snaps = np.zeros((n_envs, len(envs[0].snapshot())), dtype=np.float32)
+    clock = pygame.time.Clock()
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_q:
+                running = False
+
+        for i, env in enumerate(envs):
+            _, _, done, _ = env.step(random.randrange(4))
+            if done:
+                env.reset()
+            env.snapshot(out=snaps[i])
+
+        wall.draw(snaps)
+        clock.tick(60)
+        pygame.display.set_caption(f"Wall of games — {n_envs} envs  |  {clock.get_fps():.0f} FPS")
+
+    pygame.quit()
@@ -15,9 +15,12 @@
 #                    prevents Q-value overestimation
 #   Soft updates   — target net drifts slowly toward online (tau=0.001)
 #                    prevents "chasing a moving target" instability
+#                    (torch._foreach_* — one fused op for all parameters)
 #   Huber loss     — MSE for small errors, L1 for large ones
 #                    stops early training from blowing up weights
 #   Grad clipping  — belt-and-braces against gradient explosions
+#   Replay buffer  — preallocated numpy arrays; optional proportional PER
+#                    (prioritized_replay=True) via a vectorised sum-tree
 #
 # [AGENT-TUNABLE] Hyperparameters are set in train_v7.py DQNAgent() call.
 # Do not hardcode defaults here — keep them as constructor args so the
@@ -26,16 +29,14 @@
 # =============================================================================
 
 import random
-import collections
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 
-GRID_ROWS    = 7
-GRID_COLS    = 10
-GRID_SIZE    = GRID_ROWS * GRID_COLS   # 70
-CONTEXT_SIZE = 24                       # must match game_env_v7.py
+from features_v7 import (GRID_ROWS, GRID_COLS, GRID_SIZE, CONTEXT_SIZE, STATE_SIZE,
+                         feature_schema, check_schema)
 
 
 # =============================================================================
@@ -93,6 +94,51 @@ class DQNNetwork(nn.Module):
         return self.q_head(trunk)   # (batch, 4)
 
 
+# =============================================================================
+# SUM TREE — prioritised sampling
+# =============================================================================
+
+class SumTree:
+    """
+    Binary sum-tree over `capacity` leaves (rounded up to a power of two).
+    tree[1] is the total; leaf i lives at tree[size + i].
+    Updates and sampling are vectorised over a whole batch — one numpy op per
+    tree level (~17 for 100k leaves), no per-sample Python loop.
+    """
+
+    def __init__(self, capacity):
+        self.size  = 1 << max(0, (capacity - 1).bit_length())
+        self.depth = self.size.bit_length() - 1
+        self.tree  = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, idx):
+        return self.tree[self.size + np.asarray(idx)]
+
+    def update(self, idx, values):
+        nodes = self.size + np.asarray(idx, dtype=np.int64)
+        self.tree[nodes] = values
+        for _ in range(self.depth):
+            nodes = np.unique(nodes >> 1)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def sample(self, n, rng):
+        """n leaf indices, stratified: one draw from each of n equal mass slices."""
+        total = self.tree[1]
+        u = (np.arange(n) + rng.random(n)) * (total / n)
+        u = np.minimum(u, total * (1.0 - 1e-12))
+        nodes = np.ones(n, dtype=np.int64)
+        for _ in range(self.depth):
+            left     = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = u >= left_sum
+            u       -= np.where(go_right, left_sum, 0.0)
+            nodes    = left + go_right
+        return nodes - self.size
+
+
 # =============================================================================
 # REPLAY BUFFER
 # =============================================================================
@@ -104,33 +150,320 @@ class EventDrivenReplayBuffer:
 
     Random sampling breaks temporal correlations so training batches
     look like diverse slices of experience, not correlated episode chunks.
+
+    Storage: preallocated numpy ring buffers, no per-event Python objects.
+      obs_grid  (obs_capacity, 70)  state pool, grid part as uint8 (binary
+                                     by construction in features_v7)
+      obs_ctx   (obs_capacity, 24)  state pool, context part as float32 —
+                                     every state stored once, 166 bytes
+      s_idx / ns_idx                 per-transition row numbers into the pool
+      actions / rewards / dones      per-transition columns
+      horizons                       steps between state and next_state
+                                     (1, or n for n-step returns — the
+                                     target discounts by gamma**horizon)
+
+    A state equal to the previous pool row (typically the last event's
+    next_state), a next_state equal to its own state (wasted shot) and the
+    never-read next_state of a terminal transition all reuse an existing row.
+    The pool is a ring too: a transition stays valid while the oldest row it
+    references hasn't been overwritten. References only point at rows written
+    at or after the transition's own state, so validity is "newest N" — the
+    oldest transitions are simply dropped early if the pool wraps first.
+    obs_capacity = 2 × capacity (the default) can never wrap first.
+
+    At 100k capacity that is ~38 MB of arrays, vs ~110 MB for the old deque
+    of (ndarray, int, float, ndarray, bool) tuples; smaller obs_capacity
+    trades effective capacity for memory.
+
+    prioritized=True switches sampling to proportional PER (Schaul et al.):
+    P(i) ∝ p_i^alpha, importance weights (N·P(i))^-beta normalised by the
+    batch max. New events get the current max priority.
     """
 
-    def __init__(self, capacity):
-        self.buffer = collections.deque(maxlen=capacity)
+    def __init__(self, capacity, state_size=STATE_SIZE, obs_capacity=None,
+                 prioritized=False, alpha=0.6, beta=0.4, priority_eps=1e-3):
+        self.capacity     = capacity
+        self.obs_capacity = obs_capacity or 2 * capacity
+        self.state_size   = state_size
+
+        self._alloc_storage()
+        self.gen = np.zeros(capacity, dtype=np.int64)   # pool write no. of s_idx row
+
+        self.ptr        = 0   # next transition slot
+        self.size       = 0   # valid transitions
+        self.obs_writes = 0   # total pool rows written (generation counter)
+        self._last_row  = -1
+        self._last_gen  = -1
+        self._last_obs  = None   # host copy of the last pool row, for dedup
+
+        self.prioritized  = prioritized
+        self.alpha        = alpha
+        self.beta         = beta
+        self.priority_eps = priority_eps
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity) if prioritized else None
+        self.rng  = np.random.default_rng()
+
+    # ── Storage (overridden by TensorReplayBuffer) ───────────────────────────
+
+    def _alloc_storage(self):
+        self.obs_grid = np.zeros((self.obs_capacity, GRID_SIZE), dtype=np.uint8)
+        self.obs_ctx  = np.zeros((self.obs_capacity, self.state_size - GRID_SIZE), dtype=np.float32)
+        self.s_idx    = np.zeros(self.capacity, dtype=np.int64)
+        self.ns_idx   = np.zeros(self.capacity, dtype=np.int64)
+        self.actions  = np.zeros(self.capacity, dtype=np.int64)
+        self.rewards  = np.zeros(self.capacity, dtype=np.float32)
+        self.dones    = np.zeros(self.capacity, dtype=np.float32)
+        self.horizons = np.ones(self.capacity, dtype=np.float32)
+
+    def _write_obs(self, row, x):
+        self.obs_grid[row] = x[:GRID_SIZE]
+        self.obs_ctx[row]  = x[GRID_SIZE:]
+
+    def _states(self, rows):
+        """(n, state_size) float32 states for pool rows."""
+        out = np.empty((len(rows), self.state_size), dtype=np.float32)
+        out[:, :GRID_SIZE] = self.obs_grid[rows]
+        out[:, GRID_SIZE:] = self.obs_ctx[rows]
+        return out
+
+    def _write_transition(self, slot, s_row, ns_row, action, reward, done, horizon):
+        self.s_idx[slot]    = s_row
+        self.ns_idx[slot]   = ns_row
+        self.actions[slot]  = action
+        self.rewards[slot]  = reward
+        self.dones[slot]    = done
+        self.horizons[slot] = horizon
+
+    # ── Writing ──────────────────────────────────────────────────────────────
+
+    def _put_obs(self, x):
+        """Pool row for state x — reuses the last row if identical."""
+        if self._last_row >= 0 and np.array_equal(self._last_obs, x):
+            return self._last_row, self._last_gen
+        row = self.obs_writes % self.obs_capacity
+        self._write_obs(row, x)
+        self._last_obs = np.array(x, dtype=np.float32)
+        self._last_row, self._last_gen = row, self.obs_writes
+        self.obs_writes += 1
+        return row, self._last_gen
+
+    def store(self, state, action, reward, next_state, done, horizon=1):
+        s_row, s_gen = self._put_obs(state)
+        if done or np.array_equal(next_state, state):
+            ns_row = s_row   # terminal next_state is masked out of the target
+        else:
+            ns_row, _ = self._put_obs(next_state)
+
+        slot = self.ptr
+        self.gen[slot] = s_gen
+        self._write_transition(slot, s_row, ns_row, int(action), float(reward),
+                               float(done), horizon)
+        if self.prioritized:
+            self.tree.update([slot], [self.max_priority])
+
+        self.ptr  = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self._drop_overwritten()
+
+    def _drop_overwritten(self):
+        """Retire the oldest transitions whose state rows the pool has reused."""
+        oldest_ok = self.obs_writes - self.obs_capacity
+        while self.size > 0:
+            oldest = (self.ptr - self.size) % self.capacity
+            if self.gen[oldest] >= oldest_ok:
+                break
+            if self.prioritized:
+                self.tree.update([oldest], [0.0])
+            self.size -= 1
+
+    # ── Sampling ─────────────────────────────────────────────────────────────
+
+    def sample_indices(self, batch_size, n_batches=1):
+        """
+        Slots for n_batches batches, flat (batch-major). Returns (slots, weights)
+        — weights are the PER importance-sampling weights normalised per batch,
+        or None in uniform mode. Uniform batches are drawn without replacement.
+        """
+        if not self.prioritized:
+            offsets = np.concatenate([self.rng.choice(self.size, size=batch_size, replace=False)
+                                      for _ in range(n_batches)])
+            return (self.ptr - self.size + offsets) % self.capacity, None
+        slots   = self.tree.sample(batch_size * n_batches, self.rng)
+        probs   = self.tree.get(slots) / self.tree.total()
+        weights = ((self.size * probs) ** (-self.beta)).reshape(n_batches, batch_size)
+        weights /= weights.max(axis=1, keepdims=True)
+        return slots, weights.ravel().astype(np.float32)
+
+    def gather(self, slots):
+        """(states, actions, rewards, next_states, dones) — one fancy index each."""
+        return (
+            self._states(self.s_idx[slots]),
+            self.actions[slots],
+            self.rewards[slots],
+            self._states(self.ns_idx[slots]),
+            self.dones[slots],
+        )
 
-    def store(self, state, action, reward, next_state, done):
-        self.buffer.append((
-            np.array(state,      dtype=np.float32),
-            int(action),
-            float(reward),
-            np.array(next_state, dtype=np.float32),
-            bool(done),
-        ))
+    def horizon(self, slots):
+        return self.horizons[slots]
 
     def sample(self, batch_size):
-        batch = random.sample(self.buffer, batch_size)
-        s, a, r, ns, d = zip(*batch)
+        slots, _ = self.sample_indices(batch_size)
+        return self.gather(slots)
+
+    def update_priorities(self, slots, td_errors):
+        p = (np.abs(td_errors) + self.priority_eps) ** self.alpha
+        self.tree.update(slots, p)
+        self.max_priority = max(self.max_priority, float(p.max()))
+
+    def __len__(self):
+        return self.size
+
+
+class TensorReplayBuffer(EventDrivenReplayBuffer):
+    """
+    Same buffer, storage held in torch tensors so sampling never leaves torch.
+
+      storage='device'   columns live on the training device (GPU): a batch is
+                         a few index_selects on-device, no host→device copy.
+                         Falls back to 'pinned' if the device isn't a GPU or
+                         the allocation doesn't fit.
+      storage='pinned'   columns in page-locked host memory: batches are
+                         gathered on the host and copied with non_blocking=True
+                         (plain host tensors when there is no GPU at all).
+
+    store() is still called per event from the game loop, so writes are
+    staged in host arrays and flushed as one copy per column every
+    STAGE_ROWS events (or before sampling) — not one tiny copy per event.
+    Uniform batches are drawn on-device with replacement.
+    """
+
+    STAGE_ROWS = 1024
+
+    def __init__(self, capacity, device, storage='device', **kw):
+        self.device = torch.device(device)
+        self.storage_device = self.device
+        if storage == 'device' and self.device.type != 'cuda':
+            storage = 'pinned'
+        if storage == 'pinned':
+            self.storage_device = torch.device('cpu')
+        self.pinned = storage == 'pinned' and torch.cuda.is_available()
+        try:
+            super().__init__(capacity, **kw)
+        except torch.cuda.OutOfMemoryError:
+            print(f"  [Replay buffer does not fit on {self.device} — using pinned host memory]")
+            self.storage_device = torch.device('cpu')
+            self.pinned = True
+            super().__init__(capacity, **kw)
+        self.storage = 'pinned' if self.storage_device.type == 'cpu' else 'device'
+
+        n = min(self.STAGE_ROWS, self.capacity, self.obs_capacity)
+        self._stage_obs      = np.zeros((n, self.state_size), dtype=np.float32)
+        self._stage_obs_rows = np.zeros(n, dtype=np.int64)
+        self._stage_tr       = np.zeros((n, 7), dtype=np.float64)   # slot, s, ns, a, r, d, h
+        self._n_obs = self._n_tr = 0
+        self._pinned_out = {}   # column → [pinned staging tensor, CUDA event of its last copy]
+
+    def _zeros(self, shape, dtype):
+        t = torch.zeros(shape, dtype=dtype, device=self.storage_device)
+        return t.pin_memory() if self.pinned else t
+
+    def _alloc_storage(self):
+        self.obs_grid = self._zeros((self.obs_capacity, GRID_SIZE), torch.uint8)
+        self.obs_ctx  = self._zeros((self.obs_capacity, self.state_size - GRID_SIZE), torch.float32)
+        self.s_idx    = self._zeros(self.capacity, torch.int64)
+        self.ns_idx   = self._zeros(self.capacity, torch.int64)
+        self.actions  = self._zeros(self.capacity, torch.int64)
+        self.rewards  = self._zeros(self.capacity, torch.float32)
+        self.dones    = self._zeros(self.capacity, torch.float32)
+        self.horizons = self._zeros(self.capacity, torch.float32).fill_(1.0)
+
+    # ── Staged writes ────────────────────────────────────────────────────────
+
+    def _write_obs(self, row, x):
+        if self._n_obs == len(self._stage_obs):
+            self.flush()
+        self._stage_obs[self._n_obs]      = x
+        self._stage_obs_rows[self._n_obs] = row
+        self._n_obs += 1
+
+    def _write_transition(self, slot, s_row, ns_row, action, reward, done, horizon):
+        if self._n_tr == len(self._stage_tr):
+            self.flush()
+        self._stage_tr[self._n_tr] = (slot, s_row, ns_row, action, reward, done, horizon)
+        self._n_tr += 1
+
+    def flush(self):
+        """Copy staged events into storage — one transfer per column."""
+        dev = self.storage_device
+        if self._n_obs:
+            rows = torch.from_numpy(self._stage_obs_rows[:self._n_obs]).to(dev)
+            obs  = torch.from_numpy(self._stage_obs[:self._n_obs]).to(dev)
+            self.obs_grid.index_copy_(0, rows, obs[:, :GRID_SIZE].to(torch.uint8))
+            self.obs_ctx.index_copy_(0, rows, obs[:, GRID_SIZE:])
+            self._n_obs = 0
+        if self._n_tr:
+            tr    = torch.from_numpy(self._stage_tr[:self._n_tr]).to(dev)
+            slots = tr[:, 0].long()
+            self.s_idx.index_copy_(0, slots, tr[:, 1].long())
+            self.ns_idx.index_copy_(0, slots, tr[:, 2].long())
+            self.actions.index_copy_(0, slots, tr[:, 3].long())
+            self.rewards.index_copy_(0, slots, tr[:, 4].float())
+            self.dones.index_copy_(0, slots, tr[:, 5].float())
+            self.horizons.index_copy_(0, slots, tr[:, 6].float())
+            self._n_tr = 0
+
+    # ── Sampling ─────────────────────────────────────────────────────────────
+
+    def sample_indices(self, batch_size, n_batches=1):
+        if self.prioritized:
+            return super().sample_indices(batch_size, n_batches)
+        offsets = torch.randint(self.size, (batch_size * n_batches,), device=self.storage_device)
+        return (offsets + (self.ptr - self.size)) % self.capacity, None
+
+    def _states(self, rows):
+        return torch.cat([self.obs_grid[rows].float(), self.obs_ctx[rows]], dim=1)
+
+    def _to_device(self, t, col):
+        """
+        Copy column `col` to the training device. Pinned mode stages it in that
+        column's own page-locked buffer and copies asynchronously; the buffer
+        is only refilled once its previous copy's event has fired, so a later
+        column or a later gather() can't overwrite data still in flight.
+        """
+        if self.storage_device == self.device:
+            return t
+        if not self.pinned:
+            return t.to(self.device)
+        stage = self._pinned_out.get(col)
+        if stage is None or stage[0].shape != t.shape or stage[0].dtype != t.dtype:
+            stage = self._pinned_out[col] = [torch.empty_like(t).pin_memory(), None]
+        buf, copied = stage
+        if copied is not None:
+            copied.synchronize()
+        buf.copy_(t)
+        out = buf.to(self.device, non_blocking=True)
+        stage[1] = torch.cuda.Event()
+        stage[1].record()
+        return out
+
+    def gather(self, slots):
+        """Same five columns as torch tensors on the training device."""
+        self.flush()
+        slots = torch.as_tensor(slots, device=self.storage_device)
         return (
-            np.array(s,  dtype=np.float32),
-            np.array(a,  dtype=np.int64),
-            np.array(r,  dtype=np.float32),
-            np.array(ns, dtype=np.float32),
-            np.array(d,  dtype=np.float32),
+            self._to_device(self._states(self.s_idx[slots]),  'states'),
+            self._to_device(self.actions[slots],              'actions'),
+            self._to_device(self.rewards[slots],              'rewards'),
+            self._to_device(self._states(self.ns_idx[slots]), 'next_states'),
+            self._to_device(self.dones[slots],                'dones'),
         )
 
-    def __len__(self):
-        return len(self.buffer)
+    def horizon(self, slots):
+        self.flush()
+        return self._to_device(self.horizons[torch.as_tensor(slots, device=self.storage_device)],
+                               'horizons')
 
 
 # =============================================================================
@@ -148,7 +481,11 @@ class DQNAgent:
                  epsilon_decay_episodes=800,
                  batch_size=64,
                  buffer_capacity=100_000,
-                 warmup_events=2_000):
+                 warmup_events=2_000,
+                 prioritized_replay=False,
+                 per_alpha=0.6,
+                 per_beta=0.4,
+                 replay_storage='numpy'):
 
         self.device       = device
         self.gamma        = gamma
@@ -164,11 +501,20 @@ class DQNAgent:
         self.target_net = DQNNetwork(GRID_SIZE, CONTEXT_SIZE, action_size).to(device)
         self.target_net.load_state_dict(self.online_net.state_dict())
         self.target_net.eval()
+        self._online_params = list(self.online_net.parameters())
+        self._target_params = list(self.target_net.parameters())
 
         self.loss_fn   = nn.SmoothL1Loss()
         self.optimizer = optim.Adam(self.online_net.parameters(), lr=lr)
 
-        self.buffer      = EventDrivenReplayBuffer(buffer_capacity)
+        # replay_storage: 'numpy' (host arrays), 'device' (tensors on the
+        # training device) or 'pinned' (page-locked host tensors)
+        per_kw = dict(prioritized=prioritized_replay, alpha=per_alpha, beta=per_beta)
+        if replay_storage == 'numpy':
+            self.buffer = EventDrivenReplayBuffer(buffer_capacity, **per_kw)
+        else:
+            self.buffer = TensorReplayBuffer(buffer_capacity, device,
+                                             storage=replay_storage, **per_kw)
         self.train_steps = 0
         self.total_events = 0
 
@@ -181,44 +527,87 @@ class DQNAgent:
         with torch.no_grad():
             return self.online_net(s).argmax(dim=1).item()
 
-    def store(self, state, action, reward, next_state, done):
-        self.buffer.store(state, action, reward, next_state, done)
+    def choose_actions(self, states):
+        """Epsilon-greedy for a batch of states (N, 94) — one forward pass."""
+        n = len(states)
+        s = torch.as_tensor(states, dtype=torch.float32).to(self.device)
+        with torch.no_grad():
+            actions = self.online_net(s).argmax(dim=1).cpu().numpy()
+        explore = np.random.random(n) < self.epsilon
+        actions[explore] = np.random.randint(0, 4, size=int(explore.sum()))
+        return actions
+
+    def store(self, state, action, reward, next_state, done, horizon=1):
+        """horizon > 1: reward is an n-step return, next_state is n steps on."""
+        self.buffer.store(state, action, reward, next_state, done, horizon)
         self.total_events += 1
 
     def train_step(self):
         """One gradient update. Returns {'loss': float} or None if in warmup."""
+        return self.train_many(1)
+
+    def train_many(self, k, batch_size=None):
+        """
+        k gradient updates from k batches sampled up front.
+        All k batches go to the device in one transfer per column; losses are
+        read back once at the end. Returns {'loss': mean loss} or None.
+        (Named train_many because self.train_steps is the update counter.)
+
+        With PER, priorities updated by step i are not seen by batches
+        i+1..k-1 — they were sampled before step i ran.
+        """
         if len(self.buffer) < self.warmup_events:
             return None
-
-        states, actions, rewards, next_states, dones = self.buffer.sample(self.batch_size)
-
-        s  = torch.FloatTensor(states).to(self.device)
-        a  = torch.LongTensor(actions).to(self.device)
-        r  = torch.FloatTensor(rewards).to(self.device)
-        ns = torch.FloatTensor(next_states).to(self.device)
-        d  = torch.FloatTensor(dones).to(self.device)
-
-        # Current Q(s, a)
-        current_q = self.online_net(s).gather(1, a.unsqueeze(1)).squeeze(1)
-
-        # Double DQN target: online picks action, target evaluates it
+        bs = batch_size or self.batch_size
+
+        slots, weights = self.buffer.sample_indices(bs, k)
+        states, actions, rewards, next_states, dones = self.buffer.gather(slots)
+        discounts = self.gamma ** self.buffer.horizon(slots)
+
+        # numpy buffer: one host→device copy per column; tensor buffer: no-op
+        dev = self.device
+        s  = torch.as_tensor(states,      device=dev).view(k, bs, -1)
+        a  = torch.as_tensor(actions,     device=dev).view(k, bs)
+        r  = torch.as_tensor(rewards,     device=dev).view(k, bs)
+        ns = torch.as_tensor(next_states, device=dev).view(k, bs, -1)
+        d  = torch.as_tensor(dones,       device=dev).view(k, bs)
+        g  = torch.as_tensor(discounts,   device=dev).view(k, bs)
+        w  = None if weights is None else torch.as_tensor(weights, device=dev).view(k, bs)
+
+        losses = torch.zeros(k, device=dev)
+        for i in range(k):
+            # Current Q(s, a)
+            current_q = self.online_net(s[i]).gather(1, a[i].unsqueeze(1)).squeeze(1)
+
+            # Double DQN target: online picks action, target evaluates it
+            with torch.no_grad():
+                best_a   = self.online_net(ns[i]).argmax(dim=1, keepdim=True)
+                next_q   = self.target_net(ns[i]).gather(1, best_a).squeeze(1)
+                target_q = r[i] + g[i] * next_q * (1.0 - d[i])
+
+            if w is None:
+                loss = self.loss_fn(current_q, target_q)
+            else:
+                # PER: importance-weighted Huber, then refresh the sampled priorities
+                loss = (w[i] * F.smooth_l1_loss(current_q, target_q, reduction='none')).mean()
+                self.buffer.update_priorities(slots[i * bs:(i + 1) * bs],
+                                              (target_q - current_q).detach().cpu().numpy())
+
+            self.optimizer.zero_grad()
+            loss.backward()
+            nn.utils.clip_grad_norm_(self.online_net.parameters(), max_norm=10.0)
+            self.optimizer.step()
+            self._soft_update()
+            losses[i] = loss.detach()
+
+        self.train_steps += k
+        return {'loss': losses.mean().item()}
+
+    def _soft_update(self):
+        """θ_target = τ·θ_online + (1-τ)·θ_target — two fused ops over all params."""
         with torch.no_grad():
-            best_a   = self.online_net(ns).argmax(dim=1, keepdim=True)
-            next_q   = self.target_net(ns).gather(1, best_a).squeeze(1)
-            target_q = r + self.gamma * next_q * (1.0 - d)
-
-        loss = self.loss_fn(current_q, target_q)
-        self.optimizer.zero_grad()
-        loss.backward()
-        nn.utils.clip_grad_norm_(self.online_net.parameters(), max_norm=10.0)
-        self.optimizer.step()
-
-        # Soft target update: θ_target = τ·θ_online + (1-τ)·θ_target
-        for tp, op in zip(self.target_net.parameters(), self.online_net.parameters()):
-            tp.data.copy_(self.tau * op.data + (1.0 - self.tau) * tp.data)
-
-        self.train_steps += 1
-        return {'loss': loss.item()}
+            torch._foreach_mul_(self._target_params, 1.0 - self.tau)
+            torch._foreach_add_(self._target_params, self._online_params, alpha=self.tau)
 
     def decay_epsilon(self):
         self.epsilon = max(self.epsilon_end, self.epsilon - self.epsilon_decay)
@@ -236,11 +625,13 @@ class DQNAgent:
             'epsilon':      self.epsilon,
             'train_steps':  self.train_steps,
             'total_events': self.total_events,
+            'feature_schema': feature_schema(),
         }, path)
         print(f"  [Saved → {path}]")
 
     def load(self, path):
         ck = torch.load(path, map_location=self.device, weights_only=False)
+        check_schema(ck.get('feature_schema'), path)
         self.online_net.load_state_dict(ck['online_net'])
         self.target_net.load_state_dict(ck['target_net'])
         self.optimizer.load_state_dict(ck['optimizer'])
@@ -248,3 +639,56 @@ class DQNAgent:
         self.train_steps  = ck.get('train_steps',  0)
         self.total_events = ck.get('total_events', 0)
         print(f"  [Loaded ← {path}]  ε={self.epsilon:.3f}  steps={self.train_steps:,}")
+
+
+# =============================================================================
+# SELF-CHECK
+# =============================================================================
+
+def check_tensor_replay(device='cuda', capacity=20_000, n_events=50_000, batch_size=256,
+                        n_batches=200, seed=0):
+    """
+    TensorReplayBuffer.gather() / horizon() in 'pinned' and 'device' storage
+    against the same indices read from the host columns. Back-to-back
+    gathers, so a staging buffer reused before its async copy finished
+    shows up as a mismatch. Needs a GPU (host-only storage has no copies).
+    """
+    rng = np.random.default_rng(seed)
+    ref = EventDrivenReplayBuffer(capacity)
+    bufs = {st: TensorReplayBuffer(capacity, device, storage=st) for st in ('pinned', 'device')}
+    def random_state():                         # binary grid, float context
+        x = rng.random(STATE_SIZE, dtype=np.float32)
+        x[:GRID_SIZE] = x[:GRID_SIZE] < 0.3
+        return x
+
+    state = random_state()
+    for _ in range(n_events):
+        nxt  = random_state()
+        args = (state, int(rng.integers(4)), float(rng.normal()), nxt,
+                bool(rng.random() < 0.05), int(rng.integers(1, 4)))
+        ref.store(*args)
+        for b in bufs.values():
+            b.store(*args)
+        state = nxt
+
+    ok = True
+    for name, b in bufs.items():
+        pending = []
+        for _ in range(n_batches):
+            slots, _ = ref.sample_indices(batch_size)
+            pending.append((slots, b.gather(slots), b.horizon(slots)))   # no sync in between
+        torch.cuda.synchronize()
+        bad = sum(not all(np.array_equal(g.cpu().numpy(), r) for g, r in
+                          zip((*got, hz), (*ref.gather(slots), ref.horizon(slots))))
+                  for slots, got, hz in pending)
+        print(f"  {name:<7} {n_batches - bad}/{n_batches} batches match the host columns")
+        ok &= bad == 0
+    return ok
+
+
+if __name__ == '__main__':
+    # python dqn_agent_v7.py     — replay self-check (GPU)
+    if not torch.cuda.is_available():
+        print("check_tensor_replay needs a GPU — skipped")
+    else:
+        raise SystemExit(0 if check_tensor_replay() else 1)
@@ -0,0 +1,233 @@
+# =============================================================================
+# dqn_collector_v7.py  —  Parallel event collection + n-step returns for DQN v7
+# =============================================================================
+#
+# The v7 loop stepped one env and called agent.choose_action once per step —
+# one single-state forward pass and one host→device copy per frame.
+#
+# DQNCollector steps a VecEnv / SubprocVecEnv of N envs instead:
+#   1. agent.choose_actions(states)    one batched epsilon-greedy pass for N envs
+#   2. venv.step(actions)              N env steps (spread over cores with Subproc)
+#   3. NStepEventWriter.step(...)      event rules → replay buffer
+#
+# Event rules are unchanged (see CLAUDE_AGENT.md, "Understanding the event
+# types"):
+#
+#   Kill         (pre-shot state, shoot, +kill_reward, post-kill state)
+#   Miss         (pre-shot state, shoot, miss,         empty state, done)
+#   Death/inv.   (pre-death state, action, step reward, terminal, done)
+#   Drop         (pre-bounce state, action, drop_penalty, post-drop state)
+#   Wasted shot  (state, shoot, wasted_shot, same state)
+#   Movement     every STORE_MOVEMENT_EVERY steps if the gap to the swarm
+#                closed: (state 5 steps ago, action, MOVEMENT_REWARD, state)
+#
+# N-STEP: kill, drop and movement events stay "open" for n-1 further env
+# steps, adding γ^k · reward_k of each step, then close with the state n
+# steps on and horizon=n (the target discounts by γ^n). An episode end closes
+# them early as terminal. Miss / wasted-shot next-states are synthetic, and
+# terminal events have no future, so those are always stored 1-step.
+# N_STEP = 1 reproduces the original 1-step events exactly.
+#
+# Usage (trains a DQN agent on N_ENVS envs):
+#   python dqn_collector_v7.py
+#
+# =============================================================================
+
+import time
+import collections
+import numpy as np
+
+from game_env_v7 import REWARDS, STATE_SIZE, MAX_ALIENS
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+N_ENVS               = 16
+N_WORKERS            = 0       # 0 = in-process VecEnv, >0 = SubprocVecEnv workers
+N_STEP               = 3
+GAMMA                = 0.999   # same as DQNAgent default
+STORE_MOVEMENT_EVERY = 5
+MOVEMENT_REWARD      = 0.05
+TRAIN_EVERY          = 4       # env batch-steps between train_many calls
+TRAIN_BATCHES        = 4       # gradient steps per train_many call
+
+_EMPTY_STATE = np.zeros(STATE_SIZE, dtype=np.float32)
+
+# =============================================================================
+# N-STEP EVENT WRITER
+# =============================================================================
+
+class NStepEventWriter:
+    """
+    Turns per-step results from N envs into event transitions.
+    store_fn(state, action, reward, next_state, done, horizon) — usually
+    DQNAgent.store.
+    """
+
+    def __init__(self, n_envs, store_fn, n_step=N_STEP, gamma=GAMMA,
+                 movement_every=STORE_MOVEMENT_EVERY, movement_reward=MOVEMENT_REWARD):
+        self.n_envs          = n_envs
+        self.store_fn        = store_fn
+        self.n_step          = n_step
+        self.gamma           = gamma
+        self.movement_every  = movement_every
+        self.movement_reward = movement_reward
+
+        self.pending    = [[] for _ in range(n_envs)]   # open events: [s, a, R, k]
+        self.shot_state = [None] * n_envs
+        self.move_state = [None] * n_envs
+        self.move_gap   = np.zeros(n_envs)
+        self.move_steps = np.zeros(n_envs, dtype=np.int64)
+        self.counts     = [collections.Counter() for _ in range(n_envs)]
+
+    def reset(self, states):
+        for i in range(self.n_envs):
+            self._reset_env(i, states[i])
+
+    def _reset_env(self, i, state):
+        self.pending[i]    = []
+        self.shot_state[i] = None
+        self.move_state[i] = state.copy()
+        self.move_gap[i]   = 0.0
+        self.move_steps[i] = 0
+        self.counts[i]     = collections.Counter()
+
+    def _open(self, i, s, a, r, ns, done):
+        """New event at this step — stored now if 1-step or terminal, else kept open."""
+        if self.n_step == 1 or done:
+            self.store_fn(s, a, r, ns, done, 1)
+        else:
+            self.pending[i].append([s, a, r, 1])
+        self.counts[i]['events'] += 1
+
+    def step(self, states, actions, rewards, next_states, dones, infos):
+        """
+        states: states the actions were chosen from. next_states: as returned
+        by VecEnv.step (already reset where done). Returns the counts of env i
+        for every finished episode, as a list of (i, Counter).
+        """
+        finished = []
+        for i in range(self.n_envs):
+            s, a, r, done, info = states[i], int(actions[i]), float(rewards[i]), bool(dones[i]), infos[i]
+            ns = info['terminal_state'] if done else next_states[i]
+
+            # ── Extend open events by this step, close at n (or episode end) ──
+            still_open = []
+            for ev in self.pending[i]:
+                ev[2] += self.gamma ** ev[3] * r
+                ev[3] += 1
+                if ev[3] >= self.n_step or done:
+                    self.store_fn(ev[0], ev[1], ev[2], ns, done, ev[3])
+                else:
+                    still_open.append(ev)
+            self.pending[i] = still_open
+
+            # ── Events produced by this step ───────────────────────────────
+            if info['bullet_fired']:
+                self.shot_state[i] = s.copy()
+
+            if info['resolution_type'] == 'kill':
+                self._open(i, self.shot_state[i], 2, info['event_reward'], ns, done)
+                self.counts[i]['kills'] += 1
+            elif info['resolution_type'] == 'miss':
+                self.store_fn(self.shot_state[i], 2, info['event_reward'], _EMPTY_STATE, True, 1)
+                self.counts[i]['misses'] += 1
+                self.counts[i]['events'] += 1
+
+            if info['wasted_shot']:
+                self.store_fn(s, 2, REWARDS['wasted_shot'], s, False, 1)
+                self.counts[i]['wasted_shots'] += 1
+                self.counts[i]['events'] += 1
+
+            if info['drop_event']:
+                self._open(i, info['pre_drop_state'], a, info['drop_penalty'], ns, done)
+                self.counts[i]['drops'] += 1
+
+            if done:
+                if info['episode']['kills'] < MAX_ALIENS:   # death or invasion, not a win
+                    self.counts[i]['deaths'] += 1
+                self.store_fn(s, a, r, ns, True, 1)
+                self.counts[i]['events'] += 1
+            else:
+                self.move_gap[i]   += info['alignment_delta']
+                self.move_steps[i] += 1
+                if self.move_steps[i] >= self.movement_every:
+                    if self.move_gap[i] > 0:
+                        self._open(i, self.move_state[i], a, self.movement_reward, ns, False)
+                    self.move_state[i] = ns.copy()
+                    self.move_gap[i]   = 0.0
+                    self.move_steps[i] = 0
+
+            if done:
+                finished.append((i, self.counts[i]))
+                self._reset_env(i, next_states[i])
+        return finished
+
+
+# =============================================================================
+# COLLECTOR
+# =============================================================================
+
+class DQNCollector:
+    """Batched epsilon-greedy rollout over a vector env, feeding agent.store."""
+
+    def __init__(self, agent, venv, n_step=N_STEP, **writer_kw):
+        self.agent  = agent
+        self.venv   = venv
+        self.writer = NStepEventWriter(venv.n_envs, agent.store, n_step=n_step,
+                                       gamma=agent.gamma, **writer_kw)
+        self.states = venv.reset()
+        self.writer.reset(self.states)
+
+    def collect(self, n_batch_steps):
+        """
+        Step every env n_batch_steps times. Returns a list of finished
+        episodes: dicts with score, kills, steps and the event counts.
+        """
+        episodes = []
+        for _ in range(n_batch_steps):
+            actions = self.agent.choose_actions(self.states)
+            next_states, rewards, dones, infos = self.venv.step(actions)
+            for i, counts in self.writer.step(self.states, actions, rewards,
+                                              next_states, dones, infos):
+                episodes.append({**counts, **infos[i]['episode']})
+                self.agent.decay_epsilon()
+            self.states = next_states
+        return episodes
+
+
+# =============================================================================
+# MAIN — minimal training loop on N_ENVS envs
+# =============================================================================
+
+if __name__ == '__main__':
+    import torch
+    from dqn_agent_v7 import DQNAgent
+    from vec_env_v7 import VecEnv, SubprocVecEnv
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    agent  = DQNAgent(STATE_SIZE, 4, device, gamma=GAMMA)
+    venv   = SubprocVecEnv(N_ENVS, N_WORKERS) if N_WORKERS > 0 else VecEnv(N_ENVS)
+    coll   = DQNCollector(agent, venv)
+    scores = collections.deque(maxlen=50)
+
+    print(f"  DQN v7 collector — {N_ENVS} envs  |  {N_STEP}-step  |  "
+          f"{'%d workers' % N_WORKERS if N_WORKERS else 'in-process'}")
+    t0, steps, n_eps = time.time(), 0, 0
+    try:
+        while True:
+            for ep in coll.collect(TRAIN_EVERY):
+                n_eps += 1
+                scores.append(ep['score'])
+                print(f"  Ep {n_eps:>5}  score={ep['score']:>5}  kills={ep['kills']:>2}  "
+                      f"events={ep['events']:>4}  avg50={np.mean(scores):>6.1f}  "
+                      f"ε={agent.epsilon:.3f}  buffer={len(agent.buffer):,}")
+            steps += TRAIN_EVERY * N_ENVS
+            agent.train_many(TRAIN_BATCHES)
+            if steps % (TRAIN_EVERY * N_ENVS * 500) == 0:
+                print(f"  [{steps:,} env steps  |  {steps / (time.time() - t0):,.0f} steps/s]")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        venv.close()
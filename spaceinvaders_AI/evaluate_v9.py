@@ -0,0 +1,331 @@
+# =============================================================================
+# evaluate_v9.py  —  Headless batched evaluation of PPO v9 checkpoints
+# =============================================================================
+#
+# watch_v9.py plays one rendered game at a time — fine for looking, far too
+# slow for a stable average. This plays hundreds of games side by side:
+#
+#   - N_ENVS headless envs, one batched LSTM forward per step for all of them
+#   - finished games are replaced until n_episodes have been played, then the
+#     batch shrinks (no padding rows run through the network)
+#   - game k always starts from seed + k, so two checkpoints evaluated with
+#     the same seed face the same start positions (paired comparison)
+#   - n_workers > 0 splits the games over processes (CPU inference each)
+#
+# Reports kill / score distributions, clear rate with a Wilson interval and
+# 95% confidence intervals on the means.
+#
+# Usage:
+#   python evaluate_v9.py best_model_v9.pth 2000            # one checkpoint
+#   python evaluate_v9.py best_model_v9.pth 2000 --greedy
+#   python evaluate_v9.py best_model_v9.onnx 2000           # export_v9.py output
+#   python evaluate_v9.py server 2000                       # running policy_server_v9.py
+#   python evaluate_v9.py D:/PythonProjects/MikeAI/spaceinvaders_AI 500
+#                                   # ranks every checkpoint_v9_upd*.pth there
+#
+# From code:
+#   res = evaluate_checkpoint(path, n_episodes=1000, greedy=False)
+#   res['kills_mean'], res['kills_ci'], res['clear_rate'], res['clear_ci']
+#
+# =============================================================================
+
+import os
+import re
+import sys
+import glob
+import time
+import math
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from game_env_v7 import SpaceInvadersEnv, MAX_ALIENS, STATE_SIZE
+from ppo_agent_v9 import ActorCritic, weights_path, load_weights
+from features_v7 import RunningNorm, check_schema
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+N_ENVS     = 256      # games in flight per process
+N_WORKERS  = 0        # 0 = in-process on DEVICE; >0 = processes, CPU inference
+EVAL_SEED  = 12345    # game k starts from EVAL_SEED + k
+MAX_STEPS  = 20_000   # safety cap per game (a stalled policy can't hang the eval)
+CKPT_GLOB  = 'checkpoint_v9_upd*.pth'
+
+DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def load_policy(path, device=DEVICE, full=False):
+    """
+    (net in eval mode, ctx_norm or None, checkpoint dict) from a v9 checkpoint.
+
+    Reads the <stem>.weights.pt artifact beside the checkpoint when it is at
+    least as new — the third item is then its metadata (update_num,
+    best_avg50, feature_schema, ...). full=True always unpickles the checkpoint.
+    """
+    wpath = weights_path(path)
+    if not full and os.path.exists(wpath) and (
+            not os.path.exists(path) or wpath == path
+            or os.path.getmtime(wpath) >= os.path.getmtime(path)):
+        return load_weights(wpath, device)
+    ckpt = torch.load(path, map_location=device, weights_only=False)
+    check_schema(ckpt.get('feature_schema'), os.path.basename(path))
+    net = ActorCritic(ckpt.get('grid_encoder', 'conv')).to(device)
+    net.load_state_dict(ckpt['net'])
+    net.eval()
+    ctx_norm = None
+    if ckpt.get('ctx_norm') is not None:
+        ctx_norm = RunningNorm()
+        ctx_norm.load_state_dict(ckpt['ctx_norm'])
+    return net, ctx_norm, ckpt
+
+# =============================================================================
+# BATCHED PLAY
+# =============================================================================
+
+class NetPlayer:
+    """
+    ActorCritic over up to n_envs games. act(states, rows) steps only the
+    given rows (their hidden state is gathered and scattered back), so the
+    batch can shrink as games finish. OnnxPolicy has the same interface.
+    """
+
+    def __init__(self, net, n_envs, greedy=False, ctx_norm=None, device=DEVICE, sample_seed=0):
+        self.net      = net
+        self.greedy   = greedy
+        self.ctx_norm = ctx_norm
+        self.device   = device
+        self.gen      = torch.Generator(device=device).manual_seed(sample_seed)
+        self.h, self.c = net.init_hidden(n_envs, device)
+
+    @torch.no_grad()
+    def act(self, states, rows):
+        net, h, c = self.net, self.h, self.c
+        x = states if self.ctx_norm is None else self.ctx_norm(states)
+        idx   = torch.as_tensor(rows, device=self.device)
+        trunk = net._backbone(torch.as_tensor(x, device=self.device).unsqueeze(1))
+        lstm_out, (h_a, c_a) = net.lstm(trunk, (h[:, idx], c[:, idx]))
+        h[:, idx], c[:, idx] = h_a, c_a
+        logits = net.actor_head(lstm_out.squeeze(1))
+        if self.greedy:
+            actions = logits.argmax(dim=-1)
+        else:
+            actions = torch.multinomial(F.softmax(logits, dim=-1), 1, generator=self.gen).squeeze(1)
+        return actions.cpu().numpy()
+
+    def reset(self, row):
+        self.h[:, row] = 0.0
+        self.c[:, row] = 0.0
+
+
+def make_player(path, n_envs, greedy=False, device=DEVICE, sample_seed=0):
+    """
+    Player for a .pth checkpoint, an exported .onnx graph (export_v9.py), or
+    path='server' — sessions on a running policy_server_v9 (whatever model it
+    serves; its sampling RNG is shared, so sample_seed does not apply).
+    """
+    if path == 'server':
+        from policy_server_v9 import PolicyClient
+        return PolicyClient(batch_size=n_envs, greedy=greedy)
+    if path.endswith('.onnx'):
+        from onnx_policy_v9 import OnnxPolicy
+        return OnnxPolicy(path, batch_size=n_envs, greedy=greedy, seed=sample_seed)
+    net, ctx_norm, _ = load_policy(path, device)
+    return NetPlayer(net, n_envs, greedy, ctx_norm, device, sample_seed)
+
+
+def play_games(player, seeds, n_envs=N_ENVS):
+    """
+    Play one game per entry of seeds with `player` (NetPlayer / OnnxPolicy
+    built for n_envs rows; a player with close() is closed afterwards).
+    Returns dict of (len(seeds),) arrays: kills, score (game score),
+    reward (env reward sum), steps.
+    """
+    n      = len(seeds)
+    n_envs = min(n_envs, n)
+    envs   = [SpaceInvadersEnv(render_mode=False) for _ in range(n_envs)]
+
+    out = {'kills':  np.zeros(n, dtype=np.int64),
+           'score':  np.zeros(n, dtype=np.int64),
+           'reward': np.zeros(n, dtype=np.float64),
+           'steps':  np.zeros(n, dtype=np.int64)}
+
+    states  = np.zeros((n_envs, STATE_SIZE), dtype=np.float32)
+    game_of = np.arange(n_envs)             # which game each env is playing
+    for j, env in enumerate(envs):
+        states[j] = env.reset(seed=int(seeds[j]))
+    next_game = n_envs
+    ep_reward = np.zeros(n_envs)
+    active    = np.arange(n_envs)
+
+    try:
+        while len(active):
+            actions = player.act(states[active], active)
+
+            keep = np.ones(len(active), dtype=bool)
+            for k, j in enumerate(active):
+                env = envs[j]
+                states[j], r, done, _ = env.step(int(actions[k]))
+                ep_reward[j] += r
+                if done or env.steps >= MAX_STEPS:
+                    g = game_of[j]
+                    out['kills'][g]  = MAX_ALIENS - env.alien_count
+                    out['score'][g]  = env.score
+                    out['reward'][g] = ep_reward[j]
+                    out['steps'][g]  = env.steps
+                    if next_game < n:
+                        game_of[j]   = next_game
+                        states[j]    = env.reset(seed=int(seeds[next_game]))
+                        ep_reward[j] = 0.0
+                        player.reset(j)
+                        next_game   += 1
+                    else:
+                        keep[k] = False
+            active = active[keep]
+    finally:
+        if hasattr(player, 'close'):       # PolicyClient — free its server sessions
+            player.close()
+    return out
+
+
+def play_episodes(net, seeds, greedy=False, ctx_norm=None, n_envs=N_ENVS,
+                  device=DEVICE, sample_seed=0):
+    """play_games with an in-memory ActorCritic."""
+    n_envs = min(n_envs, len(seeds))
+    return play_games(NetPlayer(net, n_envs, greedy, ctx_norm, device, sample_seed), seeds, n_envs)
+
+# =============================================================================
+# STATISTICS
+# =============================================================================
+
+def mean_ci(x, z=1.96):
+    """(mean, (lo, hi)) — normal-approximation 95% CI of the mean."""
+    x = np.asarray(x, dtype=np.float64)
+    m = float(x.mean())
+    half = z * float(x.std(ddof=1)) / math.sqrt(len(x)) if len(x) > 1 else float('inf')
+    return m, (m - half, m + half)
+
+
+def wilson_interval(k, n, z=1.96):
+    """Wilson score interval for a binomial proportion k/n."""
+    if n == 0:
+        return 0.0, 1.0
+    p      = k / n
+    denom  = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half   = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def summarise(games):
+    kills, score = games['kills'], games['score']
+    n       = len(kills)
+    clears  = int((kills == MAX_ALIENS).sum())
+    k_mean, k_ci = mean_ci(kills)
+    s_mean, s_ci = mean_ci(score)
+    r_mean, r_ci = mean_ci(games['reward'])
+    return {
+        'n_episodes':     n,
+        'kills_mean':     k_mean,  'kills_ci':  k_ci,
+        'kills_median':   float(np.median(kills)),
+        'kills_pct':      {q: float(np.percentile(kills, q)) for q in (10, 25, 75, 90)},
+        'kills_hist':     np.bincount(kills, minlength=MAX_ALIENS + 1),
+        'score_mean':     s_mean,  'score_ci':  s_ci,
+        'score_median':   float(np.median(score)),
+        'reward_mean':    r_mean,  'reward_ci': r_ci,
+        'steps_mean':     float(games['steps'].mean()),
+        'clears':         clears,
+        'clear_rate':     clears / n,
+        'clear_ci':       wilson_interval(clears, n),
+        'games':          games,
+    }
+
+# =============================================================================
+# ENTRY POINTS
+# =============================================================================
+
+def _worker(args):
+    path, seeds, greedy, n_envs, sample_seed = args
+    torch.set_num_threads(1)
+    n_envs = min(n_envs, len(seeds))
+    return play_games(make_player(path, n_envs, greedy, 'cpu', sample_seed), seeds, n_envs)
+
+
+def evaluate_checkpoint(path, n_episodes=1000, greedy=False, seed=EVAL_SEED,
+                        n_envs=N_ENVS, n_workers=N_WORKERS, device=DEVICE):
+    """
+    Play n_episodes games of checkpoint `path` headless — a .pth checkpoint
+    or an exported .onnx policy. Returns summarise() dict.
+    """
+    seeds = seed + np.arange(n_episodes)
+    t0 = time.time()
+    if n_workers > 0:
+        import multiprocessing as mp
+        chunks = np.array_split(seeds, n_workers)
+        with mp.get_context('spawn').Pool(n_workers) as pool:
+            parts = pool.map(_worker, [(path, ch, greedy, n_envs, seed + w)
+                                       for w, ch in enumerate(chunks) if len(ch)])
+        games = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    else:
+        n_envs = min(n_envs, n_episodes)
+        games  = play_games(make_player(path, n_envs, greedy, device, seed), seeds, n_envs)
+    res = summarise(games)
+    res['path']    = path
+    res['greedy']  = greedy
+    res['seconds'] = time.time() - t0
+    return res
+
+
+def format_result(res):
+    lo, hi   = res['kills_ci']
+    clo, chi = res['clear_ci']
+    slo, shi = res['score_ci']
+    p = res['kills_pct']
+    return (f"  {os.path.basename(res['path'])}  |  {res['n_episodes']} games  |  "
+            f"{'greedy' if res['greedy'] else 'stochastic'}  |  {res['seconds']:.1f}s\n"
+            f"    kills   mean={res['kills_mean']:5.2f}  [{lo:5.2f}, {hi:5.2f}]  "
+            f"median={res['kills_median']:4.1f}  p10={p[10]:.0f}  p90={p[90]:.0f}\n"
+            f"    score   mean={res['score_mean']:6.1f}  [{slo:6.1f}, {shi:6.1f}]\n"
+            f"    clears  {res['clears']}/{res['n_episodes']} = {res['clear_rate'] * 100:5.1f}%  "
+            f"[{clo * 100:5.1f}%, {chi * 100:5.1f}%]")
+
+
+def _update_no(path):
+    m = re.search(r'upd(\d+)', os.path.basename(path))
+    return int(m.group(1)) if m else -1
+
+
+def rank_checkpoints(directory, n_episodes=500, greedy=False, pattern=CKPT_GLOB,
+                     key='kills_mean', **kw):
+    """Evaluate every checkpoint matching pattern in directory, best first."""
+    paths = sorted(glob.glob(os.path.join(directory, pattern)), key=_update_no)
+    results = []
+    for path in paths:
+        res = evaluate_checkpoint(path, n_episodes, greedy, **kw)
+        print(format_result(res))
+        results.append(res)
+    results.sort(key=lambda r: r[key], reverse=True)
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python evaluate_v9.py <checkpoint.pth | policy.onnx | server | dir> [n_episodes] [--greedy]")
+        sys.exit(1)
+    target = sys.argv[1]
+    n_eps  = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 1000
+    greedy = '--greedy' in sys.argv
+
+    if os.path.isdir(target):
+        ranked = rank_checkpoints(target, n_eps, greedy)
+        print(f"\n{'─' * 65}\n  RANKING ({n_eps} games each, by mean kills)\n{'─' * 65}")
+        for i, r in enumerate(ranked, 1):
+            lo, hi = r['kills_ci']
+            print(f"  {i:>3}. {os.path.basename(r['path']):<32} kills={r['kills_mean']:5.2f} "
+                  f"[{lo:5.2f}, {hi:5.2f}]  clear={r['clear_rate'] * 100:5.1f}%")
+    else:
+        print(format_result(evaluate_checkpoint(target, n_eps, greedy)))
@@ -0,0 +1,128 @@
+# =============================================================================
+# export_v9.py  —  Export a v9 checkpoint as a standalone single-step graph
+# =============================================================================
+#
+# A .pth checkpoint needs the full training stack to run: PyTorch, this
+# repo's ActorCritic / ManualLSTM source, and the RunningNorm state beside
+# the weights. For playing, all that is needed is one step:
+#
+#   (state, h, c)  →  (logits, value, h', c')
+#     state: (B, 94) raw env state     h, c: (B, 128) LSTM memory
+#
+# This writes that step (StepPolicy from ppo_agent_v9 — context
+# normalisation folded in) as:
+#
+#   <name>.onnx   ONNX graph, batch axis dynamic. Runs on onnxruntime alone
+#                 via onnx_policy_v9.OnnxPolicy — no torch install.
+#   <name>.pt     TorchScript — torch.jit.load() without this repo's source;
+#                 InferenceSession(torch.jit.load(path)) plays it.
+#
+# The feature schema and training update are stored in the .onnx metadata,
+# and the export is checked against the eager network before returning.
+#
+# Usage:
+#   python export_v9.py                              # best_model_v9.pth → .onnx + .pt
+#   python export_v9.py path/to/checkpoint.pth onnx
+#
+# =============================================================================
+
+import os
+import sys
+import json
+import numpy as np
+import torch
+
+from ppo_agent_v9 import StepPolicy, LSTM_HIDDEN
+from features_v7 import STATE_SIZE, feature_schema
+from evaluate_v9 import load_policy
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAVE_DIR   = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
+BEST_PATH  = f'{SAVE_DIR}/best_model_v9.pth'
+
+OPSET      = 17
+CHECK_TOL  = 1e-4    # max |logit| difference allowed between export and eager net
+
+IO_NAMES   = (['state', 'h', 'c'], ['logits', 'value', 'h_out', 'c_out'])
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def _example_inputs(batch_size=1, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    return (torch.rand(batch_size, STATE_SIZE, generator=g),
+            torch.randn(batch_size, LSTM_HIDDEN, generator=g) * 0.1,
+            torch.randn(batch_size, LSTM_HIDDEN, generator=g) * 0.1)
+
+
+def export_onnx(step, path, metadata=None):
+    """Write StepPolicy `step` to path as ONNX with a dynamic batch axis."""
+    inputs, outputs = IO_NAMES
+    dynamic = {name: {0: 'batch'} for name in inputs + outputs}
+    with torch.no_grad():
+        torch.onnx.export(step, _example_inputs(), path, input_names=inputs,
+                          output_names=outputs, dynamic_axes=dynamic,
+                          opset_version=OPSET, dynamo=False)
+    if metadata:
+        import onnx
+        model = onnx.load(path)
+        for k, v in metadata.items():
+            model.metadata_props.add(key=k, value=v)
+        onnx.save(model, path)
+    return path
+
+
+def export_torchscript(step, path):
+    """Write StepPolicy `step` to path as traced TorchScript."""
+    with torch.no_grad():
+        torch.jit.trace(step, _example_inputs()).save(path)
+    return path
+
+
+def _check(step, run, name):
+    """Compare an exported runner against the eager StepPolicy on a batch."""
+    x, h, c = _example_inputs(batch_size=8, seed=1)
+    with torch.no_grad():
+        ref = [t.numpy() for t in step(x, h, c)]
+        got = run(x.numpy(), h.numpy(), c.numpy())
+    err = max(float(np.abs(r - g).max()) for r, g in zip(ref, got))
+    if err > CHECK_TOL:
+        raise RuntimeError(f"{name} export differs from the network by {err:.2e}")
+    return err
+
+
+def export_checkpoint(path, formats=('onnx', 'torchscript')):
+    """Export checkpoint `path` next to itself. Returns {format: output path}."""
+    net, ctx_norm, ckpt = load_policy(path, 'cpu')
+    step = StepPolicy(net, ctx_norm).eval()
+    stem = os.path.splitext(path)[0]
+    out  = {}
+
+    if 'onnx' in formats:
+        import onnxruntime as ort
+        meta = {'feature_schema': json.dumps(ckpt.get('feature_schema') or feature_schema()),
+                'update_num':     str(ckpt.get('update_num', '?')),
+                'source':         os.path.basename(path)}
+        out['onnx'] = export_onnx(step, stem + '.onnx', meta)
+        sess = ort.InferenceSession(out['onnx'], providers=['CPUExecutionProvider'])
+        err  = _check(step, lambda x, h, c: sess.run(None, {'state': x, 'h': h, 'c': c}), 'ONNX')
+        print(f"  ONNX        → {out['onnx']}  (max diff {err:.1e})")
+
+    if 'torchscript' in formats:
+        out['torchscript'] = export_torchscript(step, stem + '.pt')
+        loaded = torch.jit.load(out['torchscript'])
+        err = _check(step, lambda x, h, c: [t.numpy() for t in loaded(*map(torch.from_numpy, (x, h, c)))],
+                     'TorchScript')
+        print(f"  TorchScript → {out['torchscript']}  (max diff {err:.1e})")
+    return out
+
+
+if __name__ == '__main__':
+    target  = sys.argv[1] if len(sys.argv) > 1 else BEST_PATH
+    formats = sys.argv[2:] or ('onnx', 'torchscript')
+    print(f"Exporting {target}")
+    export_checkpoint(target, formats)
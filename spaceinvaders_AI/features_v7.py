@@ -0,0 +1,257 @@
+# =============================================================================
+# features_v7.py  —  Observation schema + batched feature pipeline
+# =============================================================================
+#
+# One place for everything that defines what the agents see:
+#
+#   - game geometry the features depend on (screen, formation)
+#   - the snapshot layout written by SpaceInvadersEnv.snapshot()
+#   - the 94-number state layout (grid + context) and its normalisers
+#   - build_observations(): snapshots (N, 53) → states (N, 94) in one set of
+#     vector ops, for one env (N=1) or a whole batch of envs
+#   - RunningNorm: optional running mean/std for the 24 context features
+#   - FEATURE_SCHEMA: versioned description stored in every checkpoint, so a
+#     checkpoint trained on a different feature layout fails fast on load
+#
+# game_env_v7.py, ppo_agent_v9.py and dqn_agent_v7.py import their constants
+# from here instead of each redefining GRID_ROWS / CONTEXT_SIZE / STATE_SIZE.
+#
+# Bump FEATURE_VERSION whenever the state layout or a normaliser changes.
+#
+# State vector (94 numbers):
+#
+#   [0..69]   7×10 unified grid → CNN path
+#               rows 0-4: aliens (1=alive, 0=dead)
+#               row 5:    bullet column (one-hot)
+#               row 6:    player column (one-hot)
+#   [70]      player_x normalised
+#   [71]      bullet_active (0/1)
+#   [72]      bullet_x normalised
+#   [73]      bullet_y normalised
+#   [74..77]  swarm bounding box (left, right, top, bottom) normalised
+#   [78]      alien_direction (0=left, 1=right)
+#   [79..86]  column_counts[0..7] normalised /5
+#   [87..91]  row_counts[0..4] normalised /8
+#   [92]      player_x - swarm_centre_x (relative horizontal)
+#   [93]      p_y - swarm_bottom_y (relative vertical / threat distance)
+#
+# =============================================================================
+
+import numpy as np
+
+FEATURE_VERSION = 1
+
+# =============================================================================
+# GEOMETRY
+# =============================================================================
+
+SCREEN_W = 800
+SCREEN_H = 800
+
+ALIEN_COLS = 8
+ALIEN_ROWS = 5
+MAX_ALIENS = ALIEN_COLS * ALIEN_ROWS   # 40
+
+ALIEN_W  = 40
+ALIEN_H  = 40
+PLAYER_W = 40
+BULLET_W = 10
+
+# Start-formation position of each alien, in _make_aliens order (row-major)
+ALIEN_BASE_X = np.array([10 + (i % ALIEN_COLS) * 80 for i in range(MAX_ALIENS)], dtype=np.float32)
+ALIEN_BASE_Y = np.array([10 + (i // ALIEN_COLS) * 70 for i in range(MAX_ALIENS)], dtype=np.float32)
+
+# =============================================================================
+# SNAPSHOT LAYOUT — compact float32 view of one game, see env.snapshot()
+# =============================================================================
+# Live aliens always share one x/y offset from the start formation, so a game
+# is fully described by the alive mask plus a handful of scalars. Stacked
+# snapshots (N, SNAPSHOT_SIZE) are the "vectorised state" that viewers and
+# batch tools read instead of walking alien dicts.
+
+SNAP_ALIVE    = 0                  # [0..39] alive mask, _make_aliens order
+SNAP_DX       = MAX_ALIENS + 0     # swarm x offset from start formation
+SNAP_DY       = MAX_ALIENS + 1     # swarm y offset (drops × 40)
+SNAP_DIR      = MAX_ALIENS + 2     # +1 moving right, -1 moving left
+SNAP_PX       = MAX_ALIENS + 3
+SNAP_PY       = MAX_ALIENS + 4
+SNAP_BULLET   = MAX_ALIENS + 5     # bullet_active (0/1)
+SNAP_BX       = MAX_ALIENS + 6
+SNAP_BY       = MAX_ALIENS + 7
+SNAP_SCORE    = MAX_ALIENS + 8
+SNAP_ALIENS   = MAX_ALIENS + 9     # alien_count
+SNAP_STEPS    = MAX_ALIENS + 10
+SNAP_REWARD   = MAX_ALIENS + 11    # last_reward
+SNAP_DONE     = MAX_ALIENS + 12
+SNAPSHOT_SIZE = MAX_ALIENS + 13    # 53
+
+# =============================================================================
+# STATE LAYOUT
+# =============================================================================
+
+GRID_ROWS    = 7    # 5 alien + 1 bullet + 1 player
+GRID_COLS    = 10   # 8 alien cols + 2 overflow zones
+GRID_SIZE    = GRID_ROWS * GRID_COLS     # 70
+CONTEXT_SIZE = 24
+STATE_SIZE   = GRID_SIZE + CONTEXT_SIZE  # 94
+
+# Fixed normalisers (applied before any running normalisation)
+X_SCALE         = SCREEN_W      # positions / widths
+Y_SCALE         = SCREEN_H
+COL_COUNT_SCALE = ALIEN_ROWS    # aliens left in a column, /5
+ROW_COUNT_SCALE = ALIEN_COLS    # aliens left in a row, /8
+
+CONTEXT_NAMES = (
+    ['player_x', 'bullet_active', 'bullet_x', 'bullet_y',
+     'swarm_left', 'swarm_right', 'swarm_top', 'swarm_bottom', 'alien_dir']
+    + [f'col_count_{c}' for c in range(ALIEN_COLS)]
+    + [f'row_count_{r}' for r in range(ALIEN_ROWS)]
+    + ['rel_x', 'threat_y']
+)
+
+FEATURE_SCHEMA = {
+    'version':      FEATURE_VERSION,
+    'grid':         (GRID_ROWS, GRID_COLS),
+    'context':      tuple(CONTEXT_NAMES),
+    'state_size':   STATE_SIZE,
+    'scales':       (X_SCALE, Y_SCALE, COL_COUNT_SCALE, ROW_COUNT_SCALE),
+}
+
+
+def feature_schema():
+    """Plain-data copy of FEATURE_SCHEMA, for storing in checkpoints."""
+    return {k: (list(v) if isinstance(v, tuple) else v) for k, v in FEATURE_SCHEMA.items()}
+
+
+def check_schema(saved, source='checkpoint'):
+    """
+    Fail fast if a checkpoint was trained on a different feature layout.
+    saved=None means a pre-schema checkpoint — those are all version 1.
+    """
+    if saved is None:
+        saved = feature_schema() if FEATURE_VERSION == 1 else {'version': 1}
+    current = feature_schema()
+    if saved != current:
+        diff = [k for k in current if saved.get(k) != current[k]]
+        raise ValueError(f"Feature schema mismatch in {source}: "
+                         f"saved v{saved.get('version')} vs current v{FEATURE_VERSION} "
+                         f"(differs in: {', '.join(diff) or 'extra keys'})")
+
+
+# =============================================================================
+# BATCHED OBSERVATIONS
+# =============================================================================
+
+_COL_CENTRES = ALIEN_BASE_X[:ALIEN_COLS].astype(np.float64) + ALIEN_W / 2
+
+# Per-alien extents for the swarm bounding box, as "min over live aliens":
+# rows = left, -right, top, -bottom (negated so one min() covers all four)
+_BOX_TABLE = np.stack([ALIEN_BASE_X, -(ALIEN_BASE_X + ALIEN_W),
+                       ALIEN_BASE_Y, -(ALIEN_BASE_Y + ALIEN_H)]).astype(np.float64)
+_BOX_SIGN  = np.array([1.0, -1.0, 1.0, -1.0])
+
+
+def build_observations(snaps, out=None):
+    """
+    States for a batch of games.
+    snaps: (N, SNAPSHOT_SIZE) from env.snapshot()
+    Returns (N, STATE_SIZE) float32 — identical to the per-env get_state().
+    """
+    snaps = np.asarray(snaps)
+    n     = snaps.shape[0]
+    obs   = out if out is not None else np.empty((n, STATE_SIZE), dtype=np.float32)
+    obs[:] = 0.0
+    rows   = np.arange(n)
+
+    alive = snaps[:, SNAP_ALIVE:SNAP_ALIVE + MAX_ALIENS] > 0.5      # (N, 40)
+    live  = alive.any(axis=1)
+    sc = snaps[:, SNAP_DX:SNAP_BY + 1].astype(np.float64)
+    dx, dy, dirn, p_x, p_y, b_on, b_x, b_y = sc.T
+    b_on = b_on > 0.5
+
+    # ── Grid ────────────────────────────────────────────────────────────────
+    grid = obs[:, :GRID_SIZE].reshape(n, GRID_ROWS, GRID_COLS)
+    grid[:, :ALIEN_ROWS, 1:1 + ALIEN_COLS] = alive.reshape(n, ALIEN_ROWS, ALIEN_COLS)
+
+    # Player + bullet → grid column, both in one pass:
+    # nearest column centre, 0 / 9 when outside the formation by > 40px
+    centres = _COL_CENTRES[None, :] + dx[:, None]                     # (N, 8)
+    x_pos   = sc[:, [SNAP_PX - SNAP_DX, SNAP_BX - SNAP_DX]] + (PLAYER_W / 2, BULLET_W / 2)
+    col = np.argmin(np.abs(x_pos[:, :, None] - centres[:, None, :]), axis=2) + 1
+    col[x_pos < centres[:, :1] - 40]  = 0
+    col[x_pos > centres[:, -1:] + 40] = GRID_COLS - 1
+
+    grid[rows, 6, np.where(live, col[:, 0], 5)] = 1.0
+    b_rows = np.flatnonzero(live & b_on)
+    grid[b_rows, 5, col[b_rows, 1]] = 1.0
+
+    # ── Context ─────────────────────────────────────────────────────────────
+    ctx = obs[:, GRID_SIZE:]
+    ctx[:, 0] = p_x / X_SCALE
+    ctx[:, 1] = b_on
+    ctx[:, 2] = b_on * (b_x / X_SCALE)
+    ctx[:, 3] = b_on * (b_y / Y_SCALE)
+
+    # Bounding box: left, right, top, bottom (0 when no aliens are left)
+    box = np.where(alive[:, None, :], _BOX_TABLE, np.inf).min(axis=2) * _BOX_SIGN
+    box += sc[:, [0, 0, 1, 1]]        # + dx, dx, dy, dy
+    box  = np.where(live[:, None], box, 0.0)
+    ctx[:, 4:8] = box / (X_SCALE, X_SCALE, Y_SCALE, Y_SCALE)
+    ctx[:, 8]   = live & (dirn > 0)
+
+    counts = alive.reshape(n, ALIEN_ROWS, ALIEN_COLS)
+    ctx[:, 9:9 + ALIEN_COLS]   = counts.sum(axis=1) / COL_COUNT_SCALE
+    ctx[:, 17:17 + ALIEN_ROWS] = counts.sum(axis=2) / ROW_COUNT_SCALE
+
+    centre_x = (box[:, 0] + box[:, 1]) / 2
+    ctx[:, 22] = live * ((p_x + PLAYER_W / 2 - centre_x) / X_SCALE)
+    ctx[:, 23] = live * ((p_y - box[:, 3]) / Y_SCALE)
+
+    return obs
+
+
+# =============================================================================
+# RUNNING NORMALISATION — context features only
+# =============================================================================
+
+class RunningNorm:
+    """
+    Running mean/std over the 24 context features (grid stays binary).
+
+    Batched Chan/Welford update, so one call per env step or one call per
+    batch of envs costs the same handful of vector ops.
+    """
+
+    def __init__(self, size=CONTEXT_SIZE, clip=10.0, eps=1e-8):
+        self.mean  = np.zeros(size, dtype=np.float64)
+        self.var   = np.ones(size,  dtype=np.float64)
+        self.count = eps
+        self.clip  = clip
+        self.eps   = eps
+
+    def update(self, states):
+        x = np.asarray(states, dtype=np.float64).reshape(-1, STATE_SIZE)[:, GRID_SIZE:]
+        b_mean, b_var, b_n = x.mean(axis=0), x.var(axis=0), x.shape[0]
+        delta = b_mean - self.mean
+        total = self.count + b_n
+        self.mean = self.mean + delta * b_n / total
+        m2 = self.var * self.count + b_var * b_n + delta ** 2 * self.count * b_n / total
+        self.var   = m2 / total
+        self.count = total
+
+    def __call__(self, states):
+        """Normalised copy of state(s) — (94,) or (..., 94)."""
+        out = np.array(states, dtype=np.float32, copy=True)
+        ctx = (out[..., GRID_SIZE:] - self.mean) / np.sqrt(self.var + self.eps)
+        out[..., GRID_SIZE:] = np.clip(ctx, -self.clip, self.clip)
+        return out
+
+    def state_dict(self):
+        return {'mean': self.mean.copy(), 'var': self.var.copy(),
+                'count': self.count, 'clip': self.clip}
+
+    def load_state_dict(self, d):
+        self.mean  = np.asarray(d['mean'], dtype=np.float64)
+        self.var   = np.asarray(d['var'],  dtype=np.float64)
+        self.count = float(d['count'])
+        self.clip  = d.get('clip', self.clip)
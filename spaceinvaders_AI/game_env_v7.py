@@ -27,21 +27,8 @@
 #  5. Reward values live in REWARDS dict — easy for agent to tune.
 #
 # State vector (94 numbers — same structure as v6b, 2 new context features):
-#
-#   [0..69]   7×10 unified grid → CNN path
-#               rows 0-4: aliens (1=alive, 0=dead)
-#               row 5:    bullet column (one-hot)
-#               row 6:    player column (one-hot)
-#   [70]      player_x normalised
-#   [71]      bullet_active (0/1)
-#   [72]      bullet_x normalised
-#   [73]      bullet_y normalised
-#   [74..77]  swarm bounding box (left, right, top, bottom) normalised
-#   [78]      alien_direction (0=left, 1=right)
-#   [79..86]  column_counts[0..7] normalised /5
-#   [87..91]  row_counts[0..4] normalised /8
-#   [92]      player_x - swarm_centre_x (relative horizontal)
-#   [93]      p_y - swarm_bottom_y (relative vertical / threat distance)
+#   layout, normalisers and the batched builder live in features_v7.py.
+#   get_state() = build_observations(snapshot()) for this one game.
 #
 # =============================================================================
 
@@ -58,15 +45,64 @@ YELLOW = (255, 255, 0)
 GREEN  = (0,   200, 0)
 ORANGE = (255, 140, 0)
 
-SCREEN_W = 800
-SCREEN_H = 800
+# Geometry, snapshot layout and state layout live in features_v7.py —
+# re-exported here so existing "from game_env_v7 import ..." keeps working.
+from features_v7 import (SCREEN_W, SCREEN_H, ALIEN_COLS, ALIEN_ROWS, MAX_ALIENS,
+                         ALIEN_BASE_X, ALIEN_BASE_Y,
+                         GRID_ROWS, GRID_COLS, GRID_SIZE, CONTEXT_SIZE, STATE_SIZE,
+                         SNAP_ALIVE, SNAP_DX, SNAP_DY, SNAP_DIR, SNAP_PX, SNAP_PY,
+                         SNAP_BULLET, SNAP_BX, SNAP_BY, SNAP_SCORE, SNAP_ALIENS,
+                         SNAP_STEPS, SNAP_REWARD, SNAP_DONE, SNAPSHOT_SIZE,
+                         build_observations)
+
+# Swarm physics (must match _make_aliens / step)
+ALIEN_STEP  = 1.25   # px per step, signed by "speed"
+ALIEN_DROP  = 40     # px dropped on every bounce
+WALL_RIGHT  = 760    # alien x at/after which the swarm bounces
+WALL_LEFT   = 0      # alien x at/before which the swarm bounces
+
+# =============================================================================
+# SWARM FAST-FORWARD — closed form
+# =============================================================================
+# The whole swarm moves in lockstep: x += 1.25 * speed for every live alien,
+# and when any of them reaches a wall every live alien flips speed and drops
+# 40px (no extra x move on the bounce step). So the formation offset is a
+# triangle wave in units of whole steps:
+#
+#   n  = net steps to the right (x offset = 1.25 * n)
+#   hi = first n where the rightmost column hits WALL_RIGHT   (152 for full swarm)
+#   lo = first n where the leftmost column hits WALL_LEFT     (-8  for full swarm)
+#
+#   t < hi          →  n = t,  no drops, still moving right
+#   otherwise       →  u = t - hi,  drops = 1 + u // span,  r = u % span
+#                      odd drops  → n = hi - r, moving left
+#                      even drops → n = lo + r, moving right
+#
+# Works on scalars or numpy arrays of walk_steps, so thousands of random
+# starts cost one set of vector ops instead of a per-step Python loop.
+# =============================================================================
+
+def swarm_fast_forward(walk_steps, left_x=10, right_x=10 + (ALIEN_COLS - 1) * 80):
+    """
+    Where is the swarm after walk_steps steps from the start formation?
 
-ALIEN_COLS = 8
-ALIEN_ROWS = 5
-MAX_ALIENS = ALIEN_COLS * ALIEN_ROWS   # 40
+    left_x / right_x: x of the leftmost / rightmost live alien at offset 0.
+    Returns (x_offset, speed_sign, n_drops) — each the shape of walk_steps.
+    """
+    t    = np.asarray(walk_steps, dtype=np.int64)
+    hi   = int(np.ceil((WALL_RIGHT - right_x) / ALIEN_STEP))
+    lo   = int(np.floor((WALL_LEFT - left_x) / ALIEN_STEP))
+    span = hi - lo
 
-GRID_ROWS = 7    # 5 alien + 1 bullet + 1 player
-GRID_COLS = 10   # 8 alien cols + 2 overflow zones
+    bounced    = t >= hi
+    u          = np.maximum(t - hi, 0)
+    drops      = np.where(bounced, 1 + u // span, 0)
+    r          = u % span
+    going_left = (drops % 2) == 1
+    n          = np.where(~bounced, t, np.where(going_left, hi - r, lo + r))
+    speed      = np.where(going_left, -1, 1)
+
+    return n * ALIEN_STEP, speed, drops
 
 # =============================================================================
 # REWARD CONFIG — agent can tune these values, not the structure
@@ -91,8 +127,10 @@ REWARDS = {
 
 class SpaceInvadersEnv:
 
-    def __init__(self, render_mode=False):
+    def __init__(self, render_mode=False, seed=None, rewards=None):
         self.render_mode = render_mode
+        self.rng         = random.Random(seed)   # start positions — seed for reproducible evals
+        self.rewards     = {**REWARDS, **(rewards or {})}   # per-instance overrides (pbt_v9)
 
         self.p_width       = 40
         self.p_height      = 35
@@ -100,9 +138,9 @@ class SpaceInvadersEnv:
         self.bullet_height = 30
 
         self.action_space = 4   # 0=left, 1=right, 2=shoot, 3=nothing
-        self.grid_size    = GRID_ROWS * GRID_COLS   # 70
-        self.context_size = 24
-        self.state_size   = self.grid_size + self.context_size  # 94
+        self.grid_size    = GRID_SIZE      # 70
+        self.context_size = CONTEXT_SIZE   # 24
+        self.state_size   = STATE_SIZE     # 94
 
         if not pygame.get_init():
             pygame.init()
@@ -113,7 +151,7 @@ class SpaceInvadersEnv:
             self.font_large = pygame.font.SysFont(None, 36)
             self.font_small = pygame.font.SysFont(None, 22)
         else:
-            self.screen = pygame.Surface((SCREEN_W, SCREEN_H))
+            self.screen = None   # headless — render() is a no-op, no 800×800 surface per env
 
         self.clock = pygame.time.Clock()
         self.reset()
@@ -143,15 +181,6 @@ class SpaceInvadersEnv:
                 return a["x"] - (10 + a["col"] * 80)
         return 0.0
 
-    def _map_x_to_grid_col(self, x_pos, drift):
-        """Map screen x to grid column 0-9 (0 and 9 are overflow zones)."""
-        centers = [10 + c * 80 + 20 + drift for c in range(ALIEN_COLS)]
-        if x_pos < centers[0] - 40:
-            return 0
-        if x_pos > centers[-1] + 40:
-            return 9
-        return int(np.argmin([abs(x_pos - cc) for cc in centers])) + 1
-
     def _swarm_centre_x(self):
         live = [a for a in self.aliens if a["alive"]]
         if not live:
@@ -162,30 +191,27 @@ class SpaceInvadersEnv:
     # RESET
     # =========================================================================
 
-    def reset(self):
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
         self.aliens      = self._make_aliens()
         self.alien_count = MAX_ALIENS
 
         # Fair random start: teleport player, fast-forward aliens same distance
         centre_x = SCREEN_W // 2 - self.p_width // 2
-        target_x = random.randint(0, SCREEN_W - self.p_width)
+        target_x = self.rng.randint(0, SCREEN_W - self.p_width)
 #         target_x = centre_x # REMOVE THE RANDOM START
         walk_steps = int(abs(target_x - centre_x) / 4.5)
-        for _ in range(walk_steps):
-            for a in self.aliens:
-                if a["alive"]:
-                    a["x"] += 1.25 * a["speed"]
-                    if a["x"] >= 760 or a["x"] <= 0:
-                        for b in self.aliens:
-                            if b["alive"]:
-                                b["speed"] *= -1
-                                b["y"]     += 40
-                        break
+        dx, speed, drops = swarm_fast_forward(walk_steps)
+        for a in self.aliens:
+            a["x"]    += float(dx)
+            a["y"]    += ALIEN_DROP * int(drops)
+            a["speed"] = int(speed)
         self.p_x = target_x
 
 # REMOVED FOR FIXED START TEST
         # Randomise direction after fast-forward
-        if random.random() < 0.5:
+        if self.rng.random() < 0.5:
             for a in self.aliens:
                 a["speed"] = -1
 
@@ -205,55 +231,33 @@ class SpaceInvadersEnv:
     # =========================================================================
 
     def get_state(self):
-        state = np.zeros(self.state_size, dtype=np.float32)
-        grid  = np.zeros((GRID_ROWS, GRID_COLS), dtype=np.float32)
-
-        live  = [a for a in self.aliens if a["alive"]]
+        """94-number state — see features_v7.build_observations."""
+        return build_observations(self.snapshot()[None])[0]
 
-        # Alien rows (0-4): alive = 1.0
-        for a in self.aliens:
-            if a["alive"]:
-                grid[a["row"], a["col"] + 1] = 1.0
-
-        # Player (row 6) and bullet (row 5) relative to formation
-        if live:
-            drift = self._swarm_drift()
-            grid[6, self._map_x_to_grid_col(self.p_x + self.p_width / 2, drift)] = 1.0
-            if self.bullet_active:
-                grid[5, self._map_x_to_grid_col(self.bullet_x + self.bullet_width / 2, drift)] = 1.0
-        else:
-            grid[6, 5] = 1.0
-
-        state[:self.grid_size] = grid.flatten()
-
-        # Context features
-        o = self.grid_size
-        state[o+0] = self.p_x / SCREEN_W
-        state[o+1] = 1.0 if self.bullet_active else 0.0
-        state[o+2] = self.bullet_x / SCREEN_W if self.bullet_active else 0.0
-        state[o+3] = self.bullet_y / SCREEN_H if self.bullet_active else 0.0
-
-        if live:
-            state[o+4] = min(a["x"] for a in live) / SCREEN_W
-            state[o+5] = max(a["x"] + a["width"] for a in live) / SCREEN_W
-            state[o+6] = min(a["y"] for a in live) / SCREEN_H
-            state[o+7] = max(a["y"] + a["height"] for a in live) / SCREEN_H
-            state[o+8] = 1.0 if live[0]["speed"] > 0 else 0.0
-
-        for col in range(ALIEN_COLS):
-            count = sum(1 for a in self.aliens if a["alive"] and a["col"] == col)
-            state[o+9+col] = count / ALIEN_ROWS
-
-        for row in range(ALIEN_ROWS):
-            count = sum(1 for a in self.aliens if a["alive"] and a["row"] == row)
-            state[o+17+row] = count / ALIEN_COLS
-
-        if live:
-            cx = self._swarm_centre_x()
-            state[o+22] = (self.p_x + self.p_width / 2 - cx) / SCREEN_W
-            state[o+23] = (self.p_y - max(a["y"] + a["height"] for a in live)) / SCREEN_H
-
-        return state
+    def snapshot(self, out=None):
+        """
+        Pack the game into a SNAPSHOT_SIZE float32 vector (layout above).
+        out: optional preallocated row to write into (e.g. a ring-buffer slot).
+        """
+        snap = out if out is not None else np.empty(SNAPSHOT_SIZE, dtype=np.float32)
+        snap[SNAP_ALIVE:SNAP_ALIVE + MAX_ALIENS] = [a["alive"] for a in self.aliens]
+
+        lead = next((a for a in self.aliens if a["alive"]), self.aliens[0])
+        snap[SNAP_DX]  = lead["x"] - (10 + lead["col"] * 80) if self.alien_count else 0.0
+        snap[SNAP_DY]  = lead["y"] - (10 + lead["row"] * 70) if self.alien_count else 0.0
+        snap[SNAP_DIR] = 1.0 if lead["speed"] > 0 else -1.0
+
+        snap[SNAP_PX]     = self.p_x
+        snap[SNAP_PY]     = self.p_y
+        snap[SNAP_BULLET] = 1.0 if self.bullet_active else 0.0
+        snap[SNAP_BX]     = self.bullet_x
+        snap[SNAP_BY]     = self.bullet_y
+        snap[SNAP_SCORE]  = self.score
+        snap[SNAP_ALIENS] = self.alien_count
+        snap[SNAP_STEPS]  = self.steps
+        snap[SNAP_REWARD] = self.last_reward
+        snap[SNAP_DONE]   = 1.0 if self.done else 0.0
+        return snap
 
     # =========================================================================
     # STEP
@@ -309,7 +313,7 @@ class SpaceInvadersEnv:
                 # Wasted shot — bullet already in flight
                 # Small mash penalty for feel (not stored); wasted_shot flag
                 # triggers storage of a proper event in the training loop
-                reward += REWARDS['mash']
+                reward += self.rewards['mash']
                 info['wasted_shot'] = True
 
         self.p_x = max(0, min(self.p_x, SCREEN_W - self.p_width))
@@ -328,7 +332,7 @@ class SpaceInvadersEnv:
         # BULLET OFF SCREEN — MISS
         # ---------------------------------------------------------------
         if self.bullet_active and self.bullet_y <= 0:
-            miss_penalty = REWARDS['miss']
+            miss_penalty = self.rewards['miss']
             reward += miss_penalty
             self.bullet_active = False
             info['bullet_resolved'] = True
@@ -367,7 +371,7 @@ class SpaceInvadersEnv:
             _live     = [a for a in self.aliens if a["alive"]]
             _bot      = max(a["y"] + a["height"] for a in _live) if _live else self.p_y
             _distance = max(10, self.p_y - _bot)
-            _drop_pen = -(abs(REWARDS['drop']) * 370.0) / _distance
+            _drop_pen = -(abs(self.rewards['drop']) * 370.0) / _distance
             info['drop_event']   = True
             info['drop_penalty'] = _drop_pen
             reward += _drop_pen
@@ -392,7 +396,7 @@ class SpaceInvadersEnv:
                 self.bullet_active = False
 
                 kills_so_far = MAX_ALIENS - self.alien_count
-                kill_reward  = REWARDS['kill_base'] + kills_so_far
+                kill_reward  = self.rewards['kill_base'] + kills_so_far
                 reward      += kill_reward
 
                 info['bullet_resolved'] = True
@@ -401,18 +405,18 @@ class SpaceInvadersEnv:
 
             # Death — check alive again (bullet may have just killed this alien)
             if a["alive"] and p_rect.colliderect(a_rect):
-                reward    += REWARDS['death']
+                reward    += self.rewards['death']
                 self.done  = True
 
         # Invasion
         for a in self.aliens:
             if a["alive"] and a["y"] >= self.p_y:
-                reward    += REWARDS['invasion']
+                reward    += self.rewards['invasion']
                 self.done  = True
 
         # Win
         if self.alien_count == 0:
-            reward    += REWARDS['win']
+            reward    += self.rewards['win']
             self.done  = True
 
         self.last_reward = reward
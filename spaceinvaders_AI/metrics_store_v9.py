@@ -0,0 +1,381 @@
+# =============================================================================
+# metrics_store_v9.py  —  Append-only columnar store for training metrics
+# =============================================================================
+#
+# training_log_v9.csv (one row per update) and diag_log_v9.csv (one row per
+# episode, appended forever across runs) have to be re-parsed in full for
+# every question about a long run. This keeps the same rows as typed
+# columns that load in a fraction of a second at 10M episodes:
+#
+#   metrics_v9/
+#     episodes/c00000.ep_kills.npy     ┐ CHUNK_ROWS rows per chunk, one .npy
+#     episodes/c00000.start_p_x.npy    │ per column, written once when the
+#     ...                              ┘ tail fills up (np.load, mmap-able)
+#     episodes/chunks.bin              CHUNK_DTYPE records: rows, run and
+#                                      update range per chunk — the index
+#     episodes/tail_<first row>.bin    rows not yet in a chunk, appended as
+#                                      fixed-size records one by one
+#     updates/...                      same layout, one row per update
+#
+# Every row carries `run`: a fresh train_v9 run (update 0) starts the next
+# run id, a resume continues the last one — the diag CSV's mix of runs is
+# kept apart. Chunks whose run / update range misses a query are not read.
+#
+# Crash safety: a chunk's columns are written first, then its index record,
+# then the tail restarts as tail_<next row>.bin. A tail whose first row is
+# already indexed is a leftover and is deleted on open.
+#
+# From code:
+#   st = MetricsStore('metrics_v9')
+#   ep = st.load('episodes', ['update', 'ep_kills'], run=-1)     # latest run
+#   rolling_mean(ep['ep_kills'], 1000)
+#   percentiles_by_update(ep, 'ep_kills', (10, 50, 90))
+#   by_start(st.load('episodes'), 'ep_kills')
+#
+# CLI:
+#   python metrics_store_v9.py import              # backfill from the two CSVs
+#   python metrics_store_v9.py summary
+#   python metrics_store_v9.py rolling ep_kills 1000 [run]
+#   python metrics_store_v9.py pct ep_kills [run]
+#   python metrics_store_v9.py start ep_kills [run]
+#
+# =============================================================================
+
+import os
+import sys
+import csv
+import glob
+import numpy as np
+
+SAVE_DIR    = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
+METRICS_DIR = f'{SAVE_DIR}/metrics_v9'
+LOG_PATH    = f'{SAVE_DIR}/training_log_v9.csv'
+DIAG_PATH   = f'{SAVE_DIR}/diag_log_v9.csv'
+
+CHUNK_ROWS  = 1_048_576
+
+# Columns after (run, update) match the CSV headers train_v9 writes
+TABLES = {
+    'episodes': np.dtype([
+        ('run',               np.int32),
+        ('update',            np.int32),
+        ('ep_num',            np.int64),
+        ('ep_score',          np.float32),
+        ('ep_kills',          np.int16),
+        ('ep_steps',          np.int32),
+        ('start_p_x',         np.float32),
+        ('start_alien_dir',   np.int8),
+        ('start_swarm_drift', np.float32),
+    ]),
+    'updates': np.dtype([
+        ('run',                np.int32),
+        ('update',             np.int32),
+        ('episodes',           np.int64),
+        ('total_steps',        np.int64),
+        ('ep_mean',            np.float32),
+        ('ep_min',             np.float32),
+        ('ep_max',             np.float32),
+        ('avg50',              np.float32),
+        ('best_avg50',         np.float32),
+        ('mean_kills',         np.float32),
+        ('max_kills',          np.float32),
+        ('avg50_kills',        np.float32),
+        ('best_avg50_kills',   np.float32),
+        ('policy_loss',        np.float32),
+        ('value_loss',         np.float32),
+        ('rel_value_loss_pct', np.float32),
+        ('entropy',            np.float32),
+        ('secs_rollout',       np.float32),
+        ('secs_update',        np.float32),
+    ]),
+}
+
+CHUNK_DTYPE = np.dtype([
+    ('first_row', np.int64),
+    ('n_rows',    np.int64),
+    ('run_lo',    np.int32),
+    ('run_hi',    np.int32),
+    ('update_lo', np.int32),
+    ('update_hi', np.int32),
+])
+
+
+def _chunk_path(tdir, i, col):
+    return os.path.join(tdir, f'c{i:05d}.{col}.npy')
+
+
+def _read_chunks(tdir):
+    path = os.path.join(tdir, 'chunks.bin')
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=CHUNK_DTYPE)
+    return np.fromfile(path, dtype=CHUNK_DTYPE)
+
+
+def _tail(tdir, chunks, dtype, clean=False):
+    """(path of the live tail, its rows). clean: delete tails already folded into chunks."""
+    committed = int(chunks['first_row'][-1] + chunks['n_rows'][-1]) if len(chunks) else 0
+    live = os.path.join(tdir, f'tail_{committed:012d}.bin')
+    if clean:
+        for p in glob.glob(os.path.join(tdir, 'tail_*.bin')):
+            if p != live:
+                os.remove(p)
+    rows = np.fromfile(live, dtype=dtype) if os.path.exists(live) else np.zeros(0, dtype)
+    return live, rows
+
+# =============================================================================
+# WRITER
+# =============================================================================
+
+class _TableWriter:
+
+    def __init__(self, tdir, dtype, chunk_rows):
+        self.tdir       = tdir
+        self.dtype      = dtype
+        self.chunk_rows = chunk_rows
+        os.makedirs(tdir, exist_ok=True)
+        self.chunks = _read_chunks(tdir)
+        self.path, rows = _tail(tdir, self.chunks, dtype, clean=True)
+        self.n_tail   = len(rows)
+        self.last_run = int(rows['run'][-1]) if len(rows) else (
+            int(self.chunks['run_hi'][-1]) if len(self.chunks) else -1)
+        self.f = open(self.path, 'ab')
+
+    def append(self, fields):
+        rec = np.zeros(1, dtype=self.dtype)
+        for k, v in fields.items():
+            rec[k] = v
+        self.f.write(rec.tobytes())
+        self.n_tail += 1
+        if self.n_tail >= self.chunk_rows:
+            self._compact()
+
+    def _compact(self):
+        """Fold the tail into a new chunk and start an empty tail."""
+        self.f.close()
+        rows  = np.fromfile(self.path, dtype=self.dtype)
+        i     = len(self.chunks)
+        first = int(self.chunks['first_row'][-1] + self.chunks['n_rows'][-1]) if i else 0
+        for col in self.dtype.names:
+            np.save(_chunk_path(self.tdir, i, col), np.ascontiguousarray(rows[col]))
+        rec = np.array([(first, len(rows), rows['run'].min(), rows['run'].max(),
+                         rows['update'].min(), rows['update'].max())], dtype=CHUNK_DTYPE)
+        with open(os.path.join(self.tdir, 'chunks.bin'), 'ab') as f:
+            f.write(rec.tobytes())
+        self.chunks = np.concatenate([self.chunks, rec])
+        old, self.path = self.path, os.path.join(self.tdir, f'tail_{first + len(rows):012d}.bin')
+        self.f      = open(self.path, 'ab')
+        self.n_tail = 0
+        os.remove(old)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class MetricsWriter:
+    """
+    Appends rows to every table in TABLES. new_run=True starts the next run
+    id (a fresh training run); otherwise rows continue the last run.
+    """
+
+    def __init__(self, root=METRICS_DIR, new_run=False, chunk_rows=CHUNK_ROWS):
+        self.tables = {name: _TableWriter(os.path.join(root, name), dtype, chunk_rows)
+                       for name, dtype in TABLES.items()}
+        last = max(t.last_run for t in self.tables.values())
+        self.run = last + 1 if new_run or last < 0 else last
+
+    def episode(self, **fields):
+        self.tables['episodes'].append({'run': self.run, **fields})
+
+    def update(self, **fields):
+        self.tables['updates'].append({'run': self.run, **fields})
+
+    def flush(self):
+        for t in self.tables.values():
+            t.flush()
+
+    def close(self):
+        for t in self.tables.values():
+            t.close()
+
+# =============================================================================
+# READER
+# =============================================================================
+
+class MetricsStore:
+    """Read-only view. load() re-reads the index, so it sees rows a live trainer flushed."""
+
+    def __init__(self, root=METRICS_DIR):
+        self.root = root
+
+    def runs(self, table='episodes'):
+        return np.unique(self.load(table, ['run'])['run'])
+
+    def load(self, table, columns=None, run=None, updates=None):
+        """
+        Columns of `table` as a dict of arrays, rows in append order.
+        run:     None = all, int = that run, -1 = latest run
+        updates: None or (lo, hi) — keep lo <= update <= hi
+        """
+        tdir    = os.path.join(self.root, table)
+        dtype   = TABLES[table]
+        columns = list(columns or dtype.names)
+        need    = list(dict.fromkeys(columns + ['run', 'update']))
+        chunks  = _read_chunks(tdir)
+        _, tail = _tail(tdir, chunks, dtype) if os.path.isdir(tdir) else (None, np.zeros(0, dtype))
+
+        if run == -1:
+            run = max(int(chunks['run_hi'].max()) if len(chunks) else -1,
+                      int(tail['run'].max()) if len(tail) else -1)
+        parts = {c: [] for c in need}
+        for i, ch in enumerate(chunks):
+            if run is not None and not ch['run_lo'] <= run <= ch['run_hi']:
+                continue
+            if updates is not None and (ch['update_hi'] < updates[0] or ch['update_lo'] > updates[1]):
+                continue
+            for c in need:
+                parts[c].append(np.load(_chunk_path(tdir, i, c), mmap_mode='r'))
+        for c in need:
+            parts[c].append(tail[c])
+
+        out = {c: np.concatenate(parts[c]) for c in need}
+        keep = None
+        if run is not None:
+            keep = out['run'] == run
+        if updates is not None:
+            in_range = (out['update'] >= updates[0]) & (out['update'] <= updates[1])
+            keep = in_range if keep is None else keep & in_range
+        if keep is not None and not keep.all():
+            out = {c: v[keep] for c, v in out.items()}
+        return {c: out[c] for c in columns}
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def rolling_mean(x, window):
+    """Trailing mean over `window` rows (shorter at the start) — one cumsum."""
+    x = np.asarray(x, dtype=np.float64)
+    c = np.concatenate(([0.0], np.cumsum(x)))
+    end = np.arange(1, len(x) + 1)
+    n   = np.minimum(end, window)
+    return (c[end] - c[end - n]) / n
+
+
+def percentiles_by_update(data, column, qs=(10, 50, 90)):
+    """
+    (updates, (n_updates, len(qs)) percentiles of column) for loaded episode
+    rows — numpy's linear interpolation, one in-place sort per update group.
+    """
+    upd   = data['update']
+    order = np.argsort(upd, kind='stable')      # rows are near-sorted already
+    v     = np.asarray(data[column], dtype=np.float64)[order]
+    u, first, count = np.unique(upd[order], return_index=True, return_counts=True)
+    for f, c in zip(first.tolist(), count.tolist()):
+        v[f:f + c].sort()
+    pos = first[:, None] + (count[:, None] - 1) * (np.asarray(qs, dtype=np.float64) / 100.0)
+    lo  = np.floor(pos).astype(np.int64)
+    hi  = np.minimum(lo + 1, (first + count - 1)[:, None])
+    return u, v[lo] + (v[hi] - v[lo]) * (pos - lo)
+
+
+def by_start(data, column='ep_kills', n_bins=8, qs=(10, 50, 90)):
+    """
+    Breakdown of column by start position: start_p_x quantile bins ×
+    start_alien_dir. Returns [(x_lo, x_hi, dir, n, mean, *percentiles)].
+    """
+    x     = data['start_p_x']
+    edges = np.unique(np.percentile(x, np.linspace(0, 100, n_bins + 1)))
+    if len(edges) == 1:                       # every game started in the same place
+        edges = np.repeat(edges, 2)
+    b     = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, len(edges) - 2)
+    vals  = np.asarray(data[column], dtype=np.float64)
+    rows  = []
+    for d in np.unique(data['start_alien_dir']):
+        for i in range(len(edges) - 1):
+            m = (b == i) & (data['start_alien_dir'] == d)
+            if m.any():
+                rows.append((float(edges[i]), float(edges[i + 1]), int(d), int(m.sum()),
+                             float(vals[m].mean()), *np.percentile(vals[m], qs).tolist()))
+    return rows
+
+# =============================================================================
+# CSV IMPORT
+# =============================================================================
+
+def import_csv(root=METRICS_DIR, diag_path=DIAG_PATH, log_path=LOG_PATH):
+    """
+    Backfill the store from train_v9's CSVs. A new run starts wherever the
+    update counter goes backwards. Returns {table: rows imported}.
+    """
+    w = MetricsWriter(root, new_run=True)
+    first_run, counts = w.run, {}
+    for table, path in (('episodes', diag_path), ('updates', log_path)):
+        counts[table] = 0
+        if not os.path.exists(path):
+            continue
+        names = TABLES[table].names[1:]
+        run, prev = first_run, None
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                continue
+            col = {h: i for i, h in enumerate(header)}
+            for row in reader:
+                if not row:
+                    continue
+                upd = int(float(row[col['update']]))
+                if prev is not None and upd < prev:
+                    run += 1
+                prev = upd
+                fields = {k: float(row[col[k]]) for k in names if k in col and row[col[k]] != ''}
+                w.tables[table].append({'run': run, **fields})
+                counts[table] += 1
+    w.close()
+    return counts
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def _run_arg(args, i):
+    return int(args[i]) if len(args) > i else None
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    cmd  = args[0] if args else 'summary'
+    st   = MetricsStore(METRICS_DIR)
+
+    if cmd == 'import':
+        print(import_csv())
+    elif cmd == 'summary':
+        for table in TABLES:
+            d = st.load(table, ['run', 'update'])
+            print(f"  {table:<9} {len(d['run']):>11,} rows  |  runs {np.unique(d['run']).tolist()}"
+                  f"  |  updates {d['update'].min() if len(d['update']) else '-'}"
+                  f"–{d['update'].max() if len(d['update']) else '-'}")
+    elif cmd == 'rolling':
+        column, window = args[1], int(args[2]) if len(args) > 2 else 1000
+        d  = st.load('episodes', ['update', column], run=_run_arg(args, 3))
+        rm = rolling_mean(d[column], window)
+        for i in np.linspace(0, len(rm) - 1, min(len(rm), 20)).astype(int):
+            print(f"  ep {i:>10,}  update {d['update'][i]:>6}  {column} mean{window} = {rm[i]:8.3f}")
+    elif cmd == 'pct':
+        column = args[1]
+        d = st.load('episodes', ['update', column], run=_run_arg(args, 2))
+        u, p = percentiles_by_update(d, column)
+        for i in np.linspace(0, len(u) - 1, min(len(u), 25)).astype(int):
+            print(f"  update {u[i]:>6}  p10={p[i, 0]:7.2f}  p50={p[i, 1]:7.2f}  p90={p[i, 2]:7.2f}")
+    elif cmd == 'start':
+        column = args[1] if len(args) > 1 else 'ep_kills'
+        d = st.load('episodes', ['start_p_x', 'start_alien_dir', column], run=_run_arg(args, 2))
+        print(f"  {'start_p_x':>15}  dir  {'n':>9}  {'mean':>7}  {'p10':>6}  {'p50':>6}  {'p90':>6}")
+        for lo, hi, d_, n, m, p10, p50, p90 in by_start(d, column):
+            print(f"  {lo:6.1f}–{hi:6.1f}  {d_:>+3}  {n:>9,}  {m:7.2f}  {p10:6.1f}  {p50:6.1f}  {p90:6.1f}")
+    else:
+        print("usage: python metrics_store_v9.py [import | summary | rolling COL [WIN [RUN]] |"
+              " pct COL [RUN] | start [COL [RUN]]]")
@@ -0,0 +1,87 @@
+# =============================================================================
+# onnx_policy_v9.py  —  Play an exported v9 policy with onnxruntime + numpy
+# =============================================================================
+#
+# Runs the .onnx graph written by export_v9.py. Imports only numpy,
+# onnxruntime and features_v7 (for the schema check) — no PyTorch, so a
+# machine that just wants to watch or evaluate the agent needs
+#   pip install numpy onnxruntime pygame
+# instead of a GPU PyTorch stack.
+#
+# Same interface as ppo_agent_v9.InferenceSession:
+#
+#   policy = OnnxPolicy('best_model_v9.onnx', greedy=True)
+#   policy.reset()                   # episode start
+#   action = policy.act(state)       # int for batch_size=1, else (B,) array
+#
+# For a batch, act(states, rows) steps only the given rows (states then has
+# len(rows) entries) — evaluate_v9 uses this as games finish.
+#
+# =============================================================================
+
+import json
+import numpy as np
+import onnxruntime as ort
+
+from features_v7 import STATE_SIZE, check_schema
+
+LSTM_HIDDEN = 128   # matches ppo_agent_v9.LSTM_HIDDEN — checked against the graph
+
+
+class OnnxPolicy:
+    """Stepwise LSTM policy on onnxruntime. Hidden state lives in numpy arrays."""
+
+    def __init__(self, path, batch_size=1, greedy=False, seed=None, n_threads=1):
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = n_threads
+        opts.inter_op_num_threads = 1
+        self.sess = ort.InferenceSession(path, opts, providers=['CPUExecutionProvider'])
+
+        meta = self.sess.get_modelmeta().custom_metadata_map
+        check_schema(json.loads(meta['feature_schema']) if 'feature_schema' in meta else None, path)
+        self.update_num = meta.get('update_num', '?')
+        hidden = self.sess.get_inputs()[1].shape[1]
+        if hidden != LSTM_HIDDEN:
+            raise ValueError(f"{path}: hidden size {hidden}, expected {LSTM_HIDDEN}")
+
+        self.batch_size = batch_size
+        self.greedy     = greedy
+        self.rng        = np.random.default_rng(seed)
+        self.h          = np.zeros((batch_size, LSTM_HIDDEN), dtype=np.float32)
+        self.c          = np.zeros((batch_size, LSTM_HIDDEN), dtype=np.float32)
+
+    def reset(self, mask=None):
+        """Zero the LSTM state — all rows, or only rows where mask is True."""
+        if mask is None:
+            self.h[:] = 0.0
+            self.c[:] = 0.0
+        else:
+            self.h[mask] = 0.0
+            self.c[mask] = 0.0
+
+    def forward(self, states, rows=None):
+        """Advance one step. Returns (logits (n, 4), values (n,)) as numpy."""
+        x = np.asarray(states, dtype=np.float32).reshape(-1, STATE_SIZE)
+        if rows is None:
+            h, c = self.h, self.c
+        else:
+            h, c = self.h[rows], self.c[rows]
+        logits, values, h_new, c_new = self.sess.run(None, {'state': x, 'h': h, 'c': c})
+        if rows is None:
+            self.h[:], self.c[:] = h_new, c_new
+        else:
+            self.h[rows], self.c[rows] = h_new, c_new
+        return logits, values
+
+    def act(self, states, rows=None):
+        logits, _ = self.forward(states, rows)
+        if self.greedy:
+            actions = logits.argmax(axis=-1)
+        else:
+            p = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            cdf = np.cumsum(p, axis=-1)
+            u = self.rng.random(len(p))[:, None] * cdf[:, -1:]
+            actions = np.minimum((cdf < u).sum(axis=-1), logits.shape[1] - 1)
+        if self.batch_size == 1 and rows is None:
+            return int(actions[0])
+        return actions
@@ -0,0 +1,341 @@
+# =============================================================================
+# pbt_v9.py  —  Population-based training / hyperparameter sweep for PPO v9
+# =============================================================================
+#
+# train_v9.py's config block (LR, ENTROPY_COEF, CLIP_EPS, ALIVE_BONUS) and
+# game_env_v7.REWARDS are tuned one run at a time. This trains a population
+# of POPULATION members side by side, one process each, and every round:
+#
+#   1. TRAIN     each member runs READY_UPDATES PPO updates with its own
+#                config — hyperparameters and reward overrides (the envs
+#                take a per-instance rewards dict).
+#   2. EVALUATE  EVAL_GAMES games per member from the same start seeds;
+#                fitness = mean kills (unshaped, so members with different
+#                REWARDS are comparable).
+#   3. EXPLOIT   the bottom TRUNCATE of the population load the weights and
+#                optimizer of a random member from the top TRUNCATE ...
+#   4. EXPLORE   ... and take that member's config, each value perturbed
+#                (× 0.8 / × 1.25) or, with RESAMPLE_P, redrawn from SEARCH_SPACE.
+#
+# The starting population is drawn from the SEARCH_SPACE grid, so a whole
+# grid of configs trains in the wall time of one run. Env stepping is the
+# CPU-heavy part: the ROLLOUT_WORKERS processes are shared out between
+# members (SubprocVecEnv each) rather than every member taking all cores.
+#
+# Output in PBT_DIR:
+#   member_<i>.pth        latest weights of member i (train_v9 checkpoint keys
+#                         + 'pbt_config') — evaluate_v9 / watch_v9 read them
+#   best_model_pbt.pth    best member so far by fitness
+#   pbt_log.csv           one row per member per round: fitness, config, parent
+#
+# Usage:
+#   python pbt_v9.py                # POPULATION members, N_ROUNDS rounds
+#   python pbt_v9.py 4 3            # 4 members, 3 rounds
+#
+# =============================================================================
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import random
+import itertools
+import multiprocessing as mp
+import numpy as np
+import torch
+import torch.optim as optim
+from torch.nn.utils import clip_grad_norm_
+
+from game_env_v7 import REWARDS
+from ppo_agent_v9 import ActorCritic, RolloutBuffer, ppo_loss, SEQ_LEN
+from rollout_engine_v9 import PPOPolicy, RolloutEngine
+from vec_env_v7 import VecEnv, SubprocVecEnv
+from features_v7 import feature_schema
+from evaluate_v9 import play_episodes
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAVE_DIR        = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
+PBT_DIR         = f'{SAVE_DIR}/pbt'
+
+POPULATION      = 8
+N_ROUNDS        = 200
+READY_UPDATES   = 3        # PPO updates per member between exploit/explore steps
+ROLLOUT_WORKERS = os.cpu_count() or 1   # env processes shared out between members
+
+N_ENVS          = 32       # per member
+STEPS_PER_ENV   = 2048
+SEQS_PER_BATCH  = 4
+PPO_EPOCHS      = 4
+GAMMA           = 0.99
+GAE_LAMBDA      = 0.95
+VALUE_COEF      = 0.5
+MAX_GRAD_NORM   = 0.5
+CRITIC_LR_MULT  = 4
+
+EVAL_GAMES      = 64
+EVAL_SEED       = 777_000  # round r plays seeds EVAL_SEED + r*EVAL_GAMES + k
+TRUNCATE        = 0.25     # bottom fraction copies from top fraction
+PERTURB         = (0.8, 1.25)
+RESAMPLE_P      = 0.25
+
+DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# Values to draw from. 'rewards.<key>' overrides game_env_v7.REWARDS[key].
+SEARCH_SPACE = {
+    'lr':                  [1.0e-4, 2.5e-4, 5.0e-4],
+    'entropy_coef':        [0.002, 0.004, 0.01],
+    'clip_eps':            [0.1, 0.2, 0.3],
+    'alive_bonus':         [0.0, 0.003, 0.01],
+    'rewards.kill_base':   [4.0, 8.0, 12.0],
+    'rewards.death':       [-5.0, -10.0],
+    'rewards.invasion':    [-10.0, -20.0],
+    'rewards.wasted_shot': [-1.0, -2.0, -4.0],
+}
+LIMITS = {'clip_eps': (0.05, 0.4), 'entropy_coef': (0.0, 0.05), 'lr': (1e-5, 2e-3)}
+
+# =============================================================================
+# CONFIGS
+# =============================================================================
+
+def initial_population(n, rng):
+    """n configs from the SEARCH_SPACE grid — distinct while the grid is big enough."""
+    keys = list(SEARCH_SPACE)
+    grid = list(itertools.product(*(SEARCH_SPACE[k] for k in keys)))
+    rng.shuffle(grid)
+    return [dict(zip(keys, grid[i % len(grid)])) for i in range(n)]
+
+
+def explore(cfg, rng):
+    """Perturb every value of cfg, or redraw it from SEARCH_SPACE with RESAMPLE_P."""
+    out = {}
+    for k, v in cfg.items():
+        if rng.random() < RESAMPLE_P:
+            v = rng.choice(SEARCH_SPACE[k])
+        else:
+            v = v * rng.choice(PERTURB)
+        lo, hi = LIMITS.get(k, (-float('inf'), float('inf')))
+        out[k] = float(min(hi, max(lo, v)))
+    return out
+
+
+def reward_overrides(cfg):
+    return {k.split('.', 1)[1]: v for k, v in cfg.items() if k.startswith('rewards.')}
+
+# =============================================================================
+# MEMBER PROCESS
+# =============================================================================
+
+class Member:
+    """One PPO learner with its own config, envs and checkpoint file."""
+
+    def __init__(self, idx, cfg, n_workers):
+        self.idx       = idx
+        self.path      = f'{PBT_DIR}/member_{idx}.pth'
+        self.n_workers = n_workers
+        self.device    = torch.device(DEVICE)
+        self.net       = ActorCritic().to(self.device)
+        critic_ids     = {id(p) for p in self.net.critic_head.parameters()}
+        self.opt       = optim.Adam([
+            {'params': [p for p in self.net.parameters() if id(p) not in critic_ids]},
+            {'params': self.net.critic_head.parameters()},
+        ], lr=cfg['lr'])
+        self.buf        = RolloutBuffer(N_ENVS * STEPS_PER_ENV, seq_len=SEQ_LEN)
+        self.engine     = None
+        self.update_num = 0
+        self.cfg        = {}
+        self.set_config(cfg)
+
+    def set_config(self, cfg):
+        """Apply cfg — optimizer LRs now, envs rebuilt only if rewards changed."""
+        rewards_changed = reward_overrides(cfg) != reward_overrides(self.cfg)
+        self.cfg = dict(cfg)
+        self.opt.param_groups[0]['lr'] = cfg['lr']
+        self.opt.param_groups[1]['lr'] = cfg['lr'] * CRITIC_LR_MULT
+        rewards = reward_overrides(cfg)
+        policy  = PPOPolicy(self.net, self.device, self.buf, N_ENVS, STEPS_PER_ENV, gamma=GAMMA,
+                            alive_bonus=cfg['alive_bonus'],
+                            wasted_shot_pen=rewards.get('wasted_shot', REWARDS['wasted_shot']))
+        if self.engine is None or rewards_changed:
+            if self.engine is not None:
+                self.engine.close()
+            venv = (SubprocVecEnv(N_ENVS, self.n_workers, rewards=rewards) if self.n_workers > 1
+                    else VecEnv(N_ENVS, rewards=rewards))
+            self.engine = RolloutEngine(venv, policy)
+        else:
+            self.engine.policy = policy
+
+    def train(self, n_updates):
+        """n_updates PPO updates. Returns mean shaped return of finished games."""
+        returns = []
+        for _ in range(n_updates):
+            self.buf.reset()
+            episodes, pieces = self.engine.run(STEPS_PER_ENV)
+            self.buf.compute_gae(0.0, gamma=GAMMA, gae_lambda=GAE_LAMBDA)
+            ep_records = ([(*ep['buf_range'], ep['return']) for ep in episodes] +
+                          [(*info['buf_range'], info['return']) for _, info in pieces])
+            returns.extend(ep['return'] for ep in episodes)
+
+            self.net.train()
+            for _ in range(PPO_EPOCHS):
+                for batch in self.buf.get_sequences(SEQS_PER_BATCH, self.device,
+                                                    ep_records=ep_records):
+                    states_b, actions_b, old_lp_b, adv_b, returns_b, init_h = batch
+                    new_lp, values_b, entropy = self.net.evaluate(states_b, actions_b, init_h)
+                    loss, _, _, _ = ppo_loss(new_lp, values_b, entropy, old_lp_b, adv_b,
+                                             returns_b, clip_eps=self.cfg['clip_eps'],
+                                             value_coef=VALUE_COEF,
+                                             entropy_coef=self.cfg['entropy_coef'])
+                    self.opt.zero_grad()
+                    loss.backward()
+                    clip_grad_norm_(self.net.parameters(), MAX_GRAD_NORM)
+                    self.opt.step()
+            self.net.eval()
+            self.update_num += 1
+        return float(np.mean(returns)) if returns else float('nan')
+
+    def evaluate(self, round_no):
+        seeds = EVAL_SEED + round_no * EVAL_GAMES + np.arange(EVAL_GAMES)
+        games = play_episodes(self.net, seeds, device=self.device, sample_seed=self.idx)
+        return float(games['kills'].mean()), float(games['score'].mean())
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        torch.save({
+            'net':            self.net.state_dict(),
+            'optimizer':      self.opt.state_dict(),
+            'update_num':     self.update_num,
+            'feature_schema': feature_schema(),
+            'ctx_norm':       None,
+            'pbt_config':     self.cfg,
+        }, tmp)
+        os.replace(tmp, self.path)
+
+    def load_from(self, path):
+        ck = torch.load(path, map_location=self.device, weights_only=False)
+        self.net.load_state_dict(ck['net'])
+        self.opt.load_state_dict(ck['optimizer'])
+        self.update_num = ck['update_num']
+
+
+def _member_main(idx, cfg, n_workers, seed, conn):
+    """Member process: obey controller commands until 'stop'."""
+    torch.set_num_threads(1)
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    member = Member(idx, cfg, n_workers)
+    try:
+        while True:
+            cmd, *args = conn.recv()
+            if cmd == 'round':
+                round_no, n_updates = args
+                t0 = time.time()
+                ret = member.train(n_updates)
+                kills, score = member.evaluate(round_no)
+                member.save()
+                conn.send({'kills': kills, 'score': score, 'train_return': ret,
+                           'secs': time.time() - t0})
+            elif cmd == 'exploit':
+                src_path, new_cfg = args
+                member.load_from(src_path)
+                member.set_config(new_cfg)
+                member.save()
+                conn.send('ok')
+            elif cmd == 'stop':
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        member.engine.close()
+        conn.close()
+
+# =============================================================================
+# CONTROLLER
+# =============================================================================
+
+def run_pbt(population=POPULATION, n_rounds=N_ROUNDS, seed=0):
+    os.makedirs(PBT_DIR, exist_ok=True)
+    rng      = random.Random(seed)
+    configs  = initial_population(population, rng)
+    parents  = [None] * population
+    n_work   = max(1, ROLLOUT_WORKERS // population)
+    ctx      = mp.get_context('spawn')
+
+    conns, procs = [], []
+    for i, cfg in enumerate(configs):
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=_member_main, args=(i, cfg, n_work, seed * 1000 + i, child))
+        proc.start()
+        child.close()
+        conns.append(parent)
+        procs.append(proc)
+
+    log_path = f'{PBT_DIR}/pbt_log.csv'
+    new_log  = not os.path.exists(log_path)
+    log_file = open(log_path, 'a', newline='')
+    log      = csv.writer(log_file)
+    if new_log:
+        log.writerow(['round', 'member', 'kills', 'score', 'train_return', 'parent', 'config'])
+
+    print(f"\n{'=' * 65}\n  PBT v9  |  {population} members  |  {n_rounds} rounds × "
+          f"{READY_UPDATES} updates\n  Rollout workers: {n_work}/member  |  "
+          f"Eval: {EVAL_GAMES} games  |  Device: {DEVICE}\n{'=' * 65}\n")
+
+    best_kills = -1.0
+    n_cut      = max(1, int(population * TRUNCATE)) if population > 1 else 0
+    try:
+        for r in range(n_rounds):
+            for conn in conns:
+                conn.send(('round', r, READY_UPDATES))
+            results = [conn.recv() for conn in conns]
+
+            for i, res in enumerate(results):
+                log.writerow([r, i, round(res['kills'], 3), round(res['score'], 1),
+                              round(res['train_return'], 2), parents[i], json.dumps(configs[i])])
+            log_file.flush()
+
+            order = sorted(range(population), key=lambda i: results[i]['kills'], reverse=True)
+            top = order[0]
+            print(f"  Round {r + 1:>4}  |  " + "  ".join(
+                f"#{i}:{results[i]['kills']:5.2f}" for i in order) +
+                f"  |  {max(res['secs'] for res in results):.0f}s")
+            if results[top]['kills'] > best_kills:
+                best_kills = results[top]['kills']
+                shutil.copyfile(f'{PBT_DIR}/member_{top}.pth', f'{PBT_DIR}/best_model_pbt.pth')
+                print(f"           best → member {top}  kills={best_kills:.2f}  "
+                      f"{json.dumps(configs[top])}")
+
+            if r == n_rounds - 1:
+                break
+            # ── Exploit / explore ────────────────────────────────────────────
+            parents = [None] * population
+            for i in order[-n_cut:] if n_cut else []:
+                src = rng.choice(order[:n_cut])
+                configs[i] = explore(configs[src], rng)
+                parents[i] = src
+                conns[i].send(('exploit', f'{PBT_DIR}/member_{src}.pth', configs[i]))
+            for i in range(population):
+                if parents[i] is not None:
+                    conns[i].recv()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for conn in conns:
+            try:
+                conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in procs:
+            proc.join(timeout=30)
+        log_file.close()
+    return configs
+
+
+if __name__ == '__main__':
+    pop    = int(sys.argv[1]) if len(sys.argv) > 1 else POPULATION
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else N_ROUNDS
+    run_pbt(pop, rounds)
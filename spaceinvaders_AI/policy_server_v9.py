@@ -0,0 +1,315 @@
+# =============================================================================
+# policy_server_v9.py  —  One warm v9 policy shared by many watchers / evaluators
+# =============================================================================
+#
+# watch_v9, evaluate_v9 and every probe load their own ActorCritic and step
+# it one state at a time. This process owns ONE model (StepPolicy, context
+# normalisation folded in) and serves it over a local socket:
+#
+#   clients   send  ('act', session ids, states (n, 94), greedy)
+#             get   actions (n,)
+#   sessions  any hashable id; the server keeps each session's LSTM (h, c)
+#             in one (capacity, 128) tensor — a new id starts from zeros,
+#             'reset' zeroes it, 'close' frees the row
+#   batching  a single worker thread drains the request queue — everything
+#             that arrived within MAX_WAIT_MS (or until every client has a
+#             request in), up to MAX_BATCH rows — and runs it as ONE forward
+#             pass, then replies to each client
+#   reload    the checkpoint (its .weights.pt artifact when present) is
+#             re-read when it changes on disk; session hidden states are kept
+#
+# Transport is multiprocessing.connection: a Unix socket on Linux/macOS, a
+# named pipe on Windows. Only local processes that know AUTHKEY can connect.
+#
+# Server:
+#   python policy_server_v9.py                       # final_model_v9.pth (else best)
+#   python policy_server_v9.py path/to/model.pth
+#
+# Client — same interface as InferenceSession / OnnxPolicy:
+#   policy = PolicyClient(greedy=True)               # one session
+#   policy.reset(); action = policy.act(state)
+#   policy = PolicyClient(batch_size=256)            # 256 sessions, one round trip
+#   actions = policy.act(states, rows)               # evaluate_v9.play_games
+#
+# =============================================================================
+
+import os
+import sys
+import time
+import queue
+import threading
+import itertools
+import numpy as np
+from multiprocessing.connection import Listener, Client
+
+from features_v7 import STATE_SIZE
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAVE_DIR    = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
+FINAL_PATH  = f'{SAVE_DIR}/final_model_v9.pth'
+BEST_PATH   = f'{SAVE_DIR}/best_model_v9.pth'
+
+ADDRESS     = r'\\.\pipe\spaceinvaders_policy_v9' if sys.platform == 'win32' \
+              else '/tmp/spaceinvaders_policy_v9.sock'
+AUTHKEY     = b'spaceinvaders-v9'
+
+MAX_BATCH   = 1024     # rows per forward pass
+MAX_WAIT_MS = 2.0      # after the first request, wait this long for more to batch
+RELOAD_SECS = 5.0      # check the checkpoint for changes this often (0 = never)
+SESSIONS    = 256      # initial hidden-state rows — doubles when full
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+class PolicyServer:
+    """Owns the model and the per-session LSTM state. serve() blocks."""
+
+    def __init__(self, path, address=ADDRESS, device=None, max_batch=MAX_BATCH,
+                 max_wait_ms=MAX_WAIT_MS, reload_secs=RELOAD_SECS):
+        import torch
+        self.torch       = torch
+        self.path        = path
+        self.address     = address
+        self.device      = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+        self.max_batch   = max_batch
+        self.max_wait    = max_wait_ms / 1000.0
+        self.reload_secs = reload_secs
+        self.requests    = queue.Queue()
+        self.conns       = set()           # connected clients
+        self.gen         = torch.Generator(device=self.device).manual_seed(0)
+
+        self.rows = {}                     # session id → row in h / c
+        self.free = list(range(SESSIONS))
+        self.h    = torch.zeros(SESSIONS, 0, device=self.device)   # sized by _load
+        self.c    = self.h
+        self._load()
+        self.stats = {'requests': 0, 'rows': 0, 'batches': 0}
+
+    # ── Model ────────────────────────────────────────────────────────────────
+
+    def _mtime(self):
+        from ppo_agent_v9 import weights_path
+        paths = [p for p in (self.path, weights_path(self.path)) if os.path.exists(p)]
+        return max(os.path.getmtime(p) for p in paths)
+
+    def _load(self):
+        from ppo_agent_v9 import StepPolicy, LSTM_HIDDEN
+        from evaluate_v9 import load_policy
+        net, ctx_norm, meta = load_policy(self.path, self.device)
+        self.step       = StepPolicy(net, ctx_norm).to(self.device).eval()
+        self.update_num = meta.get('update_num', '?')
+        self.loaded_at  = self._mtime()
+        self.checked_at = time.time()
+        if self.h.shape[1] != LSTM_HIDDEN:
+            self.h = self.torch.zeros(len(self.free) + len(self.rows), LSTM_HIDDEN, device=self.device)
+            self.c = self.torch.zeros_like(self.h)
+        print(f"  [Policy server] {os.path.basename(self.path)}  update={self.update_num}  "
+              f"device={self.device}")
+
+    def _maybe_reload(self):
+        if not self.reload_secs or time.time() - self.checked_at < self.reload_secs:
+            return
+        self.checked_at = time.time()
+        try:
+            if self._mtime() > self.loaded_at:
+                self._load()
+        except (OSError, RuntimeError, EOFError) as e:    # half-written file — next time
+            print(f"  [Policy server] reload skipped: {e}")
+
+    # ── Sessions ─────────────────────────────────────────────────────────────
+
+    def _row(self, sid):
+        row = self.rows.get(sid)
+        if row is None:
+            if not self.free:                                  # grow ×2
+                n = len(self.h)
+                self.h = self.torch.cat([self.h, self.torch.zeros_like(self.h)])
+                self.c = self.torch.cat([self.c, self.torch.zeros_like(self.c)])
+                self.free = list(range(n, 2 * n))
+            row = self.rows[sid] = self.free.pop()
+            self.h[row] = 0.0
+            self.c[row] = 0.0
+        return row
+
+    # ── Batching ─────────────────────────────────────────────────────────────
+
+    def _drain(self):
+        """
+        First request (blocking), then whatever arrives within max_wait — or
+        until every connected client has a request in (one watcher never waits).
+        """
+        batch = [self.requests.get()]
+        n     = len(batch[0][2])
+        until = time.perf_counter() + self.max_wait
+        while n < self.max_batch and len(batch) < len(self.conns):
+            timeout = until - time.perf_counter()
+            try:
+                req = self.requests.get(timeout=max(timeout, 0)) if timeout > 0 \
+                    else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(req)
+            n += len(req[2])
+        return batch
+
+    def _forward(self, batch):
+        """One forward pass for every row of every request in batch."""
+        torch = self.torch
+        rows   = [self._row(sid) for _, _, sids, _, _ in batch for sid in sids]
+        x      = torch.as_tensor(np.concatenate([s for _, _, _, s, _ in batch]), device=self.device)
+        greedy = torch.as_tensor(np.concatenate([np.full(len(sids), g) for _, _, sids, _, g in batch]),
+                                 device=self.device)
+        idx    = torch.as_tensor(rows, device=self.device)
+        with torch.no_grad():
+            logits, _, h, c = self.step(x, self.h[idx], self.c[idx])
+            self.h[idx], self.c[idx] = h, c
+            sampled = torch.multinomial(torch.softmax(logits, dim=-1), 1, generator=self.gen).squeeze(1)
+            actions = torch.where(greedy, logits.argmax(dim=-1), sampled).cpu().numpy()
+
+        start = 0
+        for _, conn, sids, _, _ in batch:
+            try:
+                conn.send(actions[start:start + len(sids)])
+            except (BrokenPipeError, OSError, EOFError):
+                pass
+            start += len(sids)
+        self.stats['requests'] += len(batch)
+        self.stats['rows']     += len(rows)
+        self.stats['batches']  += 1
+
+    def _worker(self):
+        while True:
+            batch = self._drain()
+            # Clients wait for each reply, so one batch holds at most one message
+            # per live client — only a disconnect's 'close' can follow its own
+            # unanswered 'act', hence forward first, then controls
+            acts  = [req for req in batch if req[0] == 'act']
+            if acts:
+                self._forward(acts)
+            for req in batch:
+                if req[0] != 'act':
+                    self._control(*req[:3])
+            self._maybe_reload()
+
+    def _control(self, cmd, conn, sids):
+        for sid in sids:
+            row = self.rows.get(sid)
+            if row is None:
+                continue
+            if cmd == 'reset':
+                self.h[row] = 0.0
+                self.c[row] = 0.0
+            elif cmd == 'close':
+                self.free.append(self.rows.pop(sid))
+        if conn not in self.conns:                 # client gone — see _client
+            conn.close()
+            return
+        try:
+            conn.send('ok')
+        except (BrokenPipeError, OSError, EOFError):
+            pass
+
+    # ── Connections ──────────────────────────────────────────────────────────
+
+    def _client(self, conn):
+        """
+        Reader thread per connection — requests go through the one queue. When
+        the client disconnects (closed or crashed) its sessions are freed.
+        """
+        self.conns.add(conn)
+        owned = set()                              # session ids this client has used
+        try:
+            while True:
+                msg = conn.recv()
+                if msg[0] == 'act':
+                    _, sids, states, greedy = msg
+                    owned.update(sids)
+                    states = np.asarray(states, dtype=np.float32).reshape(-1, STATE_SIZE)
+                    self.requests.put(('act', conn, list(sids), states, bool(greedy)))
+                elif msg[0] in ('reset', 'close'):
+                    # Through the queue, so it lands between this client's act calls
+                    self.requests.put((msg[0], conn, list(msg[1]), None, None))
+                elif msg[0] == 'info':
+                    conn.send({'update_num': self.update_num, 'sessions': len(self.rows),
+                               **self.stats})
+        except (EOFError, OSError):
+            pass
+        finally:
+            # The worker owns rows / free — it frees the sessions and closes conn
+            self.conns.discard(conn)
+            self.requests.put(('close', conn, list(owned), None, None))
+
+    def serve(self):
+        if not sys.platform == 'win32' and os.path.exists(self.address):
+            os.remove(self.address)                # stale socket from a killed server
+        listener = Listener(self.address, authkey=AUTHKEY)
+        threading.Thread(target=self._worker, daemon=True).start()
+        print(f"  [Policy server] listening on {self.address}")
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._client, args=(conn,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+_ids = itertools.count()
+
+
+class PolicyClient:
+    """
+    batch_size sessions on a running PolicyServer. Same act / reset interface
+    as InferenceSession (batch_size=1 → act returns an int) and OnnxPolicy
+    (act(states, rows) steps only those rows).
+    """
+
+    def __init__(self, batch_size=1, greedy=False, address=ADDRESS):
+        self.conn       = Client(address, authkey=AUTHKEY)
+        self.batch_size = batch_size
+        self.greedy     = greedy
+        prefix          = f'{os.getpid()}:{next(_ids)}'
+        self.sessions   = np.array([f'{prefix}:{i}' for i in range(batch_size)], dtype=object)
+
+    def act(self, states, rows=None):
+        sids = self.sessions if rows is None else self.sessions[rows]
+        self.conn.send(('act', sids.tolist(), np.asarray(states, dtype=np.float32), self.greedy))
+        actions = self.conn.recv()
+        if self.batch_size == 1 and rows is None:
+            return int(actions[0])
+        return actions
+
+    def _control(self, cmd, mask):
+        sids = self.sessions if mask is None else np.atleast_1d(self.sessions[mask])
+        self.conn.send((cmd, sids.tolist()))
+        self.conn.recv()
+
+    def reset(self, mask=None):
+        """Zero the LSTM state — all sessions, or rows selected by mask / index."""
+        self._control('reset', mask)
+
+    def info(self):
+        self.conn.send(('info',))
+        return self.conn.recv()
+
+    def close(self):
+        try:
+            self._control('close', None)
+        finally:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        target = sys.argv[1]
+    else:
+        target = next((p for p in (FINAL_PATH, BEST_PATH) if os.path.exists(p)), FINAL_PATH)
+    PolicyServer(target).serve()
@@ -35,11 +35,15 @@
 #
 # =============================================================================
 
+import os
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.distributions import Categorical
+from torch.utils.checkpoint import checkpoint
+
+from features_v7 import GRID_ROWS, GRID_COLS, GRID_SIZE, CONTEXT_SIZE, STATE_SIZE
 
 
 # =============================================================================
@@ -62,11 +66,20 @@ class ManualLSTM(nn.Module):
       hidden: (h, c) each (1, batch, hidden_size), or None
       output: (batch, seq_len, hidden_size)
       h_n, c_n: (1, batch, hidden_size)
+
+    checkpoint_every = k > 0: when autograd is recording, the sequence runs in
+    segments of k steps under activation checkpointing. Only each segment's
+    inputs, (h, c) and outputs are kept; the gate activations are recomputed
+    segment by segment in backward. Memory for the LSTM part drops by ~an
+    order of magnitude for one extra forward pass. Set on a live net with
+    net.lstm.checkpoint_every = k — ActorCritic.evaluate then checkpoints
+    the CNN backbone over the same segments.
     """
 
-    def __init__(self, input_size, hidden_size):
+    def __init__(self, input_size, hidden_size, checkpoint_every=0):
         super().__init__()
         self.hidden_size = hidden_size
+        self.checkpoint_every = checkpoint_every
         # Fused weights for all 4 gates: input (i), forget (f), cell (g), output (o)
         self.W_ih = nn.Linear(input_size,   4 * hidden_size, bias=True)
         self.W_hh = nn.Linear(hidden_size,  4 * hidden_size, bias=False)
@@ -85,26 +98,36 @@ class ManualLSTM(nn.Module):
             h = hidden[0].squeeze(0)   # (1, batch, H) → (batch, H)
             c = hidden[1].squeeze(0)
 
-        outputs = []
-        for t in range(seq_len):
-            gates = self.W_ih(x[:, t]) + self.W_hh(h)   # (batch, 4H)
-            i, f, g, o = gates.chunk(4, dim=-1)
-            i = torch.sigmoid(i)
-            f = torch.sigmoid(f)
-            g = torch.tanh(g)
-            o = torch.sigmoid(o)
-            c = f * c + i * g
-            h = o * torch.tanh(c)
-            outputs.append(h)
-
-        output = torch.stack(outputs, dim=1)   # (batch, seq_len, H)
+        k = self.checkpoint_every
+        if k and seq_len > k and torch.is_grad_enabled():
+            segments = []
+            for s in range(0, seq_len, k):
+                out, h, c = checkpoint(self._run, x[:, s:s + k], h, c, use_reentrant=False)
+                segments.append(out)
+            output = torch.cat(segments, dim=1)
+        else:
+            output, h, c = self._run(x, h, c)
         return output, (h.unsqueeze(0), c.unsqueeze(0))
 
-GRID_ROWS    = 7
-GRID_COLS    = 10
-GRID_SIZE    = GRID_ROWS * GRID_COLS   # 70
-CONTEXT_SIZE = 24
-STATE_SIZE   = GRID_SIZE + CONTEXT_SIZE  # 94
+    def _run(self, x, h, c):
+        """Cell loop over x (batch, n, input) → (output (batch, n, H), h, c)."""
+        outputs = []
+        for t in range(x.shape[1]):
+            h, c = self.cell(x[:, t], h, c)
+            outputs.append(h)
+        return torch.stack(outputs, dim=1), h, c
+
+    def cell(self, x, h, c):
+        """One time step. x: (batch, input_size), h/c: (batch, H) → (h, c)."""
+        gates = self.W_ih(x) + self.W_hh(h)   # (batch, 4H)
+        i, f, g, o = gates.chunk(4, dim=-1)
+        i = torch.sigmoid(i)
+        f = torch.sigmoid(f)
+        g = torch.tanh(g)
+        o = torch.sigmoid(o)
+        c = f * c + i * g
+        h = o * torch.tanh(c)
+        return h, c
 
 ACTION_NAMES  = ['Left', 'Right', 'Shoot', 'Nothing']
 
@@ -134,15 +157,33 @@ class ActorCritic(nn.Module):
 
     During rollout:   get_action() is called step-by-step, (h,c) passes forward.
     During training:  evaluate() receives (batch, seq_len, state) tensors.
+
+    grid_encoder — how the binary 7×10 grid becomes its 128 features:
+      'conv'      Conv2d → Conv2d → Linear(2240→128), as in v8.
+      'conv_lut'  Same weights and output. conv1 is linear and the grid is
+                  0/1, so conv1(grid) = bias + Σ over set cells of that cell's
+                  stamped 3×3 kernel — one (70 → 16·70) matmul against a
+                  table built from conv1.weight. Switchable on a live net.
+      'embed'     Learned per-cell embedding sum: relu(Σ set cells E[cell] + b),
+                  i.e. Linear(70→128) on the 0/1 grid. Different weights —
+                  checkpoints record it and load_policy rebuilds it.
     """
 
-    def __init__(self):
+    def __init__(self, grid_encoder='conv'):
         super().__init__()
-
-        # ── CNN path (same as v8) ───────────────────────────────────────────
-        self.conv1   = nn.Conv2d(1, 16, kernel_size=3, padding=1)
-        self.conv2   = nn.Conv2d(16, 32, kernel_size=3, padding=1)
-        self.grid_fc = nn.Linear(32 * GRID_ROWS * GRID_COLS, 128)
+        self.grid_encoder = grid_encoder
+
+        if grid_encoder == 'embed':
+            # ── Per-cell embeddings (70 × 128) ───────────────────────────────
+            self.grid_embed = nn.Linear(GRID_SIZE, 128)
+        elif grid_encoder in ('conv', 'conv_lut'):
+            # ── CNN path (same as v8) ───────────────────────────────────────
+            self.conv1   = nn.Conv2d(1, 16, kernel_size=3, padding=1)
+            self.conv2   = nn.Conv2d(16, 32, kernel_size=3, padding=1)
+            self.grid_fc = nn.Linear(32 * GRID_ROWS * GRID_COLS, 128)
+        else:
+            raise ValueError(f"unknown grid_encoder {grid_encoder!r}")
+        self._lut_cache = None
 
         # ── Dense path (same as v8) ─────────────────────────────────────────
         self.ctx_fc = nn.Linear(CONTEXT_SIZE, 64)
@@ -171,6 +212,36 @@ class ActorCritic(nn.Module):
 
     # ── Backbone: CNN + dense → trunk ──────────────────────────────────────
 
+    def _conv1_lut(self):
+        """
+        (70, 16·70) table: row k = conv1 response (no bias) to a grid with only
+        cell k set. Differentiable in conv1.weight; cached while weights and
+        grad mode stay unchanged (rollout / eval).
+        """
+        w   = self.conv1.weight
+        key = (w._version, w.data_ptr(), w.device)
+        if not torch.is_grad_enabled() and self._lut_cache is not None and self._lut_cache[0] == key:
+            return self._lut_cache[1]
+        eye = torch.eye(GRID_SIZE, device=w.device, dtype=w.dtype).view(GRID_SIZE, 1, GRID_ROWS, GRID_COLS)
+        lut = F.conv2d(eye, w, padding=1).reshape(GRID_SIZE, -1)
+        self._lut_cache = (key, lut.detach()) if not torch.is_grad_enabled() else None
+        return lut
+
+    def _grid_features(self, grid_flat):
+        """(N, 70) binary grid → (N, 128)."""
+        if self.grid_encoder == 'embed':
+            return self.relu(self.grid_embed(grid_flat))
+        if self.grid_encoder == 'conv_lut':
+            g = grid_flat @ self._conv1_lut()                      # (N, 16·70)
+            g = g.view(-1, 16, GRID_ROWS, GRID_COLS) + self.conv1.bias.view(1, 16, 1, 1)
+            g = self.relu(g)
+        else:
+            g = grid_flat.view(-1, 1, GRID_ROWS, GRID_COLS)
+            g = self.relu(self.conv1(g))
+        g = self.relu(self.conv2(g))
+        g = g.view(g.size(0), -1)
+        return self.relu(self.grid_fc(g))   # (N, 128)
+
     def _backbone(self, x):
         """
         Process state(s) through CNN + dense → trunk.
@@ -183,12 +254,7 @@ class ActorCritic(nn.Module):
         grid_flat = x_flat[:, :GRID_SIZE]
         context   = x_flat[:, GRID_SIZE:]
 
-        g = grid_flat.view(-1, 1, GRID_ROWS, GRID_COLS)
-        g = self.relu(self.conv1(g))
-        g = self.relu(self.conv2(g))
-        g = g.view(g.size(0), -1)
-        g = self.relu(self.grid_fc(g))   # (N, 128)
-
+        g = self._grid_features(grid_flat)    # (N, 128)
         c = self.relu(self.ctx_fc(context))   # (N, 64)
 
         merged = torch.cat([g, c], dim=1)         # (N, 192)
@@ -231,6 +297,20 @@ class ActorCritic(nn.Module):
 
         return action.item(), log_prob.item(), value.item(), new_hidden
 
+    @torch.no_grad()
+    def act_batch(self, states_t, hidden):
+        """
+        get_action for N envs at once — one forward pass.
+        states_t: (N, STATE_SIZE)   hidden: (h, c) each (1, N, LSTM_HIDDEN)
+        Returns tensors: (actions (N,), log_probs (N,), values (N,), new_hidden)
+        """
+        trunk = self._backbone(states_t.unsqueeze(1))         # (N, 1, 128)
+        lstm_out, new_hidden = self.lstm(trunk, hidden)
+        h_out  = lstm_out.squeeze(1)
+        dist   = Categorical(logits=self.actor_head(h_out))
+        action = dist.sample()
+        return action, dist.log_prob(action), self.critic_head(h_out).squeeze(-1), new_hidden
+
     # ── PPO update: sequence batch ──────────────────────────────────────────
 
     def evaluate(self, states_seq, actions_seq, hidden):
@@ -241,7 +321,13 @@ class ActorCritic(nn.Module):
         hidden:      (h, c) zero-initialised at sequence start
         Returns: (log_probs, values, entropy) — all (batch * seq_len,) with gradients.
         """
-        trunk = self._backbone(states_seq)              # (batch, seq_len, 128)
+        k = self.lstm.checkpoint_every
+        if k and states_seq.shape[1] > k and torch.is_grad_enabled():
+            # Same segments as the LSTM — conv activations recomputed in backward too
+            trunk = torch.cat([checkpoint(self._backbone, states_seq[:, s:s + k], use_reentrant=False)
+                               for s in range(0, states_seq.shape[1], k)], dim=1)
+        else:
+            trunk = self._backbone(states_seq)          # (batch, seq_len, 128)
         lstm_out, _ = self.lstm(trunk, hidden)           # (batch, seq_len, 128)
 
         batch, seq_len = states_seq.shape[:2]
@@ -257,6 +343,16 @@ class ActorCritic(nn.Module):
 
         return log_probs, values, entropy
 
+    @torch.no_grad()
+    def burn_in(self, states_seq, hidden):
+        """
+        Run (batch, n, STATE_SIZE) states through the LSTM without gradient and
+        return the hidden state after them — the R2D2-style warm-up that turns a
+        stored (possibly stale) (h, c) into one from the current weights.
+        """
+        _, new_hidden = self.lstm(self._backbone(states_seq), hidden)
+        return new_hidden
+
     # ── Probe helpers (for p_probe_v9.py) ──────────────────────────────────
 
     @torch.no_grad()
@@ -281,6 +377,243 @@ class ActorCritic(nn.Module):
         return self.critic_head(lstm_out.squeeze(1)).item()
 
 
+# =============================================================================
+# INFERENCE — single-step fast path for playing (watch, evaluation, serving)
+# =============================================================================
+
+class StepPolicy(nn.Module):
+    """
+    One env step of ActorCritic as a flat graph:
+      forward(x, h, c) → (logits, value, h, c)
+      x: (B, STATE_SIZE) raw states   h, c: (B, LSTM_HIDDEN)
+    No seq dimension, no (1, B, H) hidden packing, and the context
+    normalisation (if given) is folded in as buffers — so it traces to
+    TorchScript / exports to ONNX as one self-contained graph.
+    """
+
+    def __init__(self, net, ctx_norm=None):
+        super().__init__()
+        self.net = net
+        mean, inv_std, clip = np.zeros(CONTEXT_SIZE), np.ones(CONTEXT_SIZE), float('inf')
+        if ctx_norm is not None:
+            mean    = ctx_norm.mean
+            inv_std = 1.0 / np.sqrt(ctx_norm.var + ctx_norm.eps)
+            clip    = ctx_norm.clip
+        self.normalise = ctx_norm is not None
+        self.clip      = float(clip)
+        self.register_buffer('ctx_mean',    torch.as_tensor(mean,    dtype=torch.float32))
+        self.register_buffer('ctx_inv_std', torch.as_tensor(inv_std, dtype=torch.float32))
+
+    def forward(self, x, h, c):
+        if self.normalise:
+            ctx = ((x[:, GRID_SIZE:] - self.ctx_mean) * self.ctx_inv_std).clamp(-self.clip, self.clip)
+            x   = torch.cat([x[:, :GRID_SIZE], ctx], dim=1)
+        net  = self.net
+        h, c = net.lstm.cell(net._backbone(x), h, c)
+        return net.actor_head(h), net.critic_head(h).squeeze(-1), h, c
+
+
+class InferenceSession:
+    """
+    Plays a trained ActorCritic with no per-step allocation on the host side.
+
+    The input and (h, c) tensors are allocated once and reused every step;
+    states are copied into the input tensor through a numpy view. Each step
+    runs under torch.inference_mode. script=True runs a traced + frozen
+    TorchScript copy of StepPolicy instead of eager PyTorch. net may also be
+    a TorchScript step graph from export_v9.py (torch.jit.load).
+
+      sess = InferenceSession(net, ctx_norm=ctx_norm, greedy=True)
+      sess.reset()                 # episode start
+      action = sess.act(state)     # int for batch_size=1, else (B,) array
+
+    For a batch of envs, reset(mask) zeroes only the rows where mask is True.
+    """
+
+    def __init__(self, net, batch_size=1, greedy=False, ctx_norm=None, device='cpu',
+                 script=False, seed=None):
+        self.batch_size = batch_size
+        self.greedy     = greedy
+        self.device     = torch.device(device)
+
+        if isinstance(net, torch.jit.ScriptModule):
+            step = net.to(self.device).eval()     # exported StepPolicy (export_v9.py)
+        else:
+            step = StepPolicy(net, ctx_norm).to(self.device).eval()
+        # Host-side input — pinned when the model is on a GPU so the copy is async
+        pin = self.device.type == 'cuda'
+        self.x_host = torch.zeros(batch_size, STATE_SIZE, pin_memory=pin)
+        self.x_np   = self.x_host.numpy()
+        self.x      = self.x_host if not pin else torch.zeros(batch_size, STATE_SIZE, device=self.device)
+        self.h      = torch.zeros(batch_size, LSTM_HIDDEN, device=self.device)
+        self.c      = torch.zeros(batch_size, LSTM_HIDDEN, device=self.device)
+        self.gen    = torch.Generator(device=self.device)
+        if seed is not None:
+            self.gen.manual_seed(seed)
+
+        if script and not isinstance(step, torch.jit.ScriptModule):
+            with torch.no_grad():
+                step = torch.jit.optimize_for_inference(
+                    torch.jit.trace(step, (self.x, self.h, self.c)))
+        self.step = step
+
+    def reset(self, mask=None):
+        """Zero the LSTM state — all rows, or only rows where mask is True."""
+        if mask is None:
+            self.h.zero_()
+            self.c.zero_()
+        elif mask.any():
+            m = torch.as_tensor(mask, device=self.device)
+            self.h[m] = 0.0
+            self.c[m] = 0.0
+
+    def forward(self, states):
+        """Advance one step. Returns (logits, values) tensors, (B, 4) and (B,)."""
+        self.x_np[:] = states
+        with torch.inference_mode():
+            if self.x is not self.x_host:
+                self.x.copy_(self.x_host, non_blocking=True)
+            logits, values, h, c = self.step(self.x, self.h, self.c)
+            self.h.copy_(h)
+            self.c.copy_(c)
+        return logits, values
+
+    def act(self, states):
+        logits, _ = self.forward(states)
+        with torch.inference_mode():
+            if self.greedy:
+                actions = logits.argmax(dim=-1)
+            else:
+                actions = torch.multinomial(F.softmax(logits, dim=-1), 1,
+                                            generator=self.gen).squeeze(1)
+        if self.batch_size == 1:
+            return int(actions.item())
+        return actions.cpu().numpy()
+
+
+# ── Weights-only artifact ────────────────────────────────────────────────────
+# A training checkpoint pickles the optimizer, score histories and every HoF
+# episode array beside the weights. <stem>.weights.pt holds only tensors and
+# plain metadata — readable with weights_only=True and memory-mapped, so it
+# loads in milliseconds however large the HoF gets.
+
+def weights_path(path):
+    """best_model_v9.pth → best_model_v9.weights.pt"""
+    return path if path.endswith('.weights.pt') else os.path.splitext(path)[0] + '.weights.pt'
+
+
+def save_weights(path, net, ctx_norm=None, **meta):
+    """Write the weights-only artifact for checkpoint `path`. meta: plain values only."""
+    norm = None
+    if ctx_norm is not None:
+        d    = ctx_norm.state_dict()
+        norm = {'mean': torch.from_numpy(d['mean']), 'var': torch.from_numpy(d['var']),
+                'count': float(d['count']), 'clip': float(d['clip'])}
+    meta.setdefault('grid_encoder', net.grid_encoder)
+    out = weights_path(path)
+    tmp = out + '.tmp'
+    torch.save({'net':      {k: v.detach().cpu() for k, v in net.state_dict().items()},
+                'ctx_norm': norm,
+                'meta':     meta}, tmp)
+    os.replace(tmp, out)
+    return out
+
+
+def load_weights(path, device='cpu'):
+    """(net in eval mode, ctx_norm or None, meta dict) from a .weights.pt artifact."""
+    from features_v7 import RunningNorm, check_schema
+    # CPU first: the ctx_norm tensors go back to numpy; load_state_dict copies
+    # the weights onto device
+    art = torch.load(path, map_location='cpu', weights_only=True, mmap=True)
+    meta = art['meta']
+    check_schema(meta.get('feature_schema'), os.path.basename(path))
+    net = ActorCritic(meta.get('grid_encoder', 'conv')).to(device)
+    net.load_state_dict(art['net'])
+    net.eval()
+    ctx_norm = None
+    if art['ctx_norm'] is not None:
+        ctx_norm = RunningNorm()
+        ctx_norm.load_state_dict({k: v.numpy() if torch.is_tensor(v) else v
+                                  for k, v in art['ctx_norm'].items()})
+    return net, ctx_norm, meta
+
+
+# ── Int8 rollout copy ────────────────────────────────────────────────────────
+
+def quantized_copy(net):
+    """
+    CPU copy of net with every nn.Linear dynamically quantized to int8 —
+    grid_fc (2240→128), the LSTM gate matmuls (ManualLSTM is plain Linears),
+    ctx_fc, trunk and both heads. The two small convs stay fp32. Weights are
+    a snapshot: call again after each update to refresh from the learner.
+    """
+    import copy
+    from torch.ao.quantization import quantize_dynamic
+    src = copy.deepcopy(net).to('cpu').eval()
+    return quantize_dynamic(src, {nn.Linear}, dtype=torch.qint8)
+
+
+@torch.no_grad()
+def _sequence_log_probs(net, states_t):
+    """Log π over one (T, STATE_SIZE) sequence from a zero hidden state → (T, 4)."""
+    lstm_out, _ = net.lstm(net._backbone(states_t.unsqueeze(0)))
+    return F.log_softmax(net.actor_head(lstm_out.squeeze(0)), dim=-1)
+
+
+def policy_kl(ref_net, net, states, ref_device, device='cpu'):
+    """
+    How far net's policy is from ref_net's over one state sequence (T, 94):
+    returns (mean KL(ref || net), max |Δ log π|). Used to check that an
+    int8 rollout copy keeps PPO ratios honest.
+    """
+    states = np.asarray(states, dtype=np.float32)
+    lp_ref = _sequence_log_probs(ref_net, torch.as_tensor(states, device=ref_device)).cpu()
+    lp     = _sequence_log_probs(net, torch.as_tensor(states, device=device)).cpu()
+    kl     = (lp_ref.exp() * (lp_ref - lp)).sum(dim=-1).mean()
+    return float(kl), float((lp_ref - lp).abs().max())
+
+
+# =============================================================================
+# PPO LOSS
+# =============================================================================
+
+def _masked_mean(x, mask):
+    return x.mean() if mask is None else (x * mask).sum() / mask.sum().clamp(min=1.0)
+
+
+def ppo_loss(new_lp, values, entropy, old_lp, adv, returns, mask=None,
+             clip_eps=0.2, value_coef=0.5, entropy_coef=0.0):
+    """
+    Clipped-surrogate PPO loss over a (B, T) batch, flattened or not.
+    Advantages are normalised over the batch inside. mask (B, T) of
+    1.0 / 0.0 drops padded steps from the normalisation and every mean;
+    mask=None is the plain unmasked loss.
+    Returns (loss, policy_loss, value_loss, mean entropy).
+    """
+    new_lp, values, entropy = new_lp.reshape(-1), values.reshape(-1), entropy.reshape(-1)
+    old_lp, adv, returns    = old_lp.reshape(-1), adv.reshape(-1), returns.reshape(-1)
+    if mask is not None:
+        mask = mask.reshape(-1)
+
+    if mask is None:
+        adv = (adv - adv.mean()) / (adv.std() + 1e-8)
+    else:
+        n   = mask.sum()
+        mu  = (adv * mask).sum() / n
+        var = (((adv - mu) * mask) ** 2).sum() / (n - 1).clamp(min=1.0)
+        adv = (adv - mu) / (var.sqrt() + 1e-8)
+
+    ratio  = (new_lp - old_lp).exp()
+    surr1  = ratio * adv
+    surr2  = ratio.clamp(1.0 - clip_eps, 1.0 + clip_eps) * adv
+    policy_loss = -_masked_mean(torch.min(surr1, surr2), mask)
+    value_loss  = _masked_mean((values - returns) ** 2, mask)
+    ent         = _masked_mean(entropy, mask)
+
+    loss = policy_loss + value_coef * value_loss - entropy_coef * ent
+    return loss, policy_loss, value_loss, ent
+
+
 # =============================================================================
 # ROLLOUT BUFFER
 # =============================================================================
@@ -303,11 +636,25 @@ class RolloutBuffer:
       States:              524,288 × 94 × 4 bytes  = ~197 MB
       Actions/rewards/etc: 524,288 × 6 × 4 bytes   = ~12.6 MB
       Total:                                        ~210 MB  (trivial on 17 GB GPU)
+
+    Stored hidden states (hidden_every > 0):
+      record_hidden() keeps the rollout's (h, c) going into every
+      hidden_every-th step. get_sequences() then starts each sequence from
+      that stored state instead of zeros, optionally after a burn-in prefix
+      run without gradient — so SEQ_LEN no longer has to cover a whole game.
+      +1 KB per snapshot (~16 MB for 1M steps at hidden_every=64).
     """
 
-    def __init__(self, n_steps, seq_len=SEQ_LEN):
+    def __init__(self, n_steps, seq_len=SEQ_LEN, hidden_every=0):
         self.n_steps = n_steps
         self.seq_len = seq_len
+        self.hidden_every = hidden_every
+        if hidden_every:
+            if seq_len % hidden_every:
+                raise ValueError(f"seq_len {seq_len} must be a multiple of hidden_every {hidden_every}")
+            n_snap = n_steps // hidden_every + 1
+            self.hidden_h = np.zeros((n_snap, LSTM_HIDDEN), dtype=np.float32)
+            self.hidden_c = np.zeros((n_snap, LSTM_HIDDEN), dtype=np.float32)
         self.states    = np.zeros((n_steps, STATE_SIZE), dtype=np.float32)
         self.actions   = np.zeros(n_steps, dtype=np.int64)
         self.rewards   = np.zeros(n_steps, dtype=np.float32)
@@ -327,6 +674,28 @@ class RolloutBuffer:
         self.dones[self.ptr]     = float(done)
         self.ptr += 1
 
+    def record_hidden(self, hidden):
+        """
+        Call before add() each step with the (h, c) the step is about to use
+        (batch of 1). Only every hidden_every-th step is kept — one host copy.
+        """
+        if self.hidden_every and self.ptr % self.hidden_every == 0:
+            k = self.ptr // self.hidden_every
+            self.hidden_h[k] = hidden[0].reshape(-1).cpu().numpy()
+            self.hidden_c[k] = hidden[1].reshape(-1).cpu().numpy()
+
+    def add_many(self, states, actions, rewards, values, log_probs, dones):
+        """Append a contiguous run of steps (one episode piece) — one slice copy per column."""
+        n  = len(actions)
+        sl = slice(self.ptr, self.ptr + n)
+        self.states[sl]    = states
+        self.actions[sl]   = actions
+        self.rewards[sl]   = rewards
+        self.values[sl]    = values
+        self.log_probs[sl] = log_probs
+        self.dones[sl]     = dones
+        self.ptr += n
+
     def compute_gae(self, last_value, gamma=0.99, gae_lambda=0.95):
         """
         Backwards pass to compute GAE advantages and returns.
@@ -365,34 +734,10 @@ class RolloutBuffer:
         if n_seqs == 0:
             return np.ones(1, dtype=np.float32)
 
-        # Build step-level weights (same as v8's compute_weights)
-        step_weights = np.zeros(self.ptr, dtype=np.float32)
-        valid = [(s, min(e, self.ptr), score)
-                 for s, e, score in ep_records if s < min(e, self.ptr)]
-
-        if valid:
-            valid_sorted = sorted(valid, key=lambda x: x[2])
-            n = len(valid_sorted)
-            w_per_q = 1.0 / N_QUINTILES
-            for q in range(N_QUINTILES):
-                lo_idx = (q * n) // N_QUINTILES
-                hi_idx = ((q + 1) * n) // N_QUINTILES
-                q_eps  = valid_sorted[lo_idx:hi_idx]
-                if not q_eps:
-                    continue
-                total_steps = sum(e - s for s, e, _ in q_eps)
-                if total_steps > 0:
-                    for s, e, _ in q_eps:
-                        step_weights[s:min(e, self.ptr)] = w_per_q / total_steps
-        else:
-            step_weights[:self.ptr] = 1.0 / max(self.ptr, 1)
+        step_weights = self._step_weights(ep_records)
 
-        # Aggregate step weights to sequence weights
-        seq_weights = np.zeros(n_seqs, dtype=np.float32)
-        for i in range(n_seqs):
-            s = i * self.seq_len
-            e = s + self.seq_len
-            seq_weights[i] = step_weights[s:e].mean()
+        # Aggregate step weights to sequence weights — one mean per row
+        seq_weights = step_weights[:n_seqs * self.seq_len].reshape(n_seqs, self.seq_len).mean(axis=1)
 
         total = seq_weights.sum()
         if total > 0:
@@ -401,20 +746,100 @@ class RolloutBuffer:
             seq_weights[:] = 1.0 / n_seqs
         return seq_weights
 
-    def get_sequences(self, seqs_per_batch, device, ep_records=None):
+    def _step_weights(self, ep_records):
+        """
+        Per-step quintile weights (same as v8's compute_weights).
+
+        Episodes are ranked with a stable argsort on score and each quintile's
+        step total comes from one bincount; only the final paint loops, one
+        slice per episode.
+        """
+        step_weights = np.zeros(self.ptr, dtype=np.float32)
+        rec   = np.asarray(ep_records, dtype=np.float64).reshape(-1, 3)
+        s     = rec[:, 0].astype(np.int64)
+        e     = np.minimum(rec[:, 1].astype(np.int64), self.ptr)
+        valid = s < e
+        if not valid.any():
+            step_weights[:self.ptr] = 1.0 / max(self.ptr, 1)
+            return step_weights
+
+        order  = np.argsort(rec[valid, 2], kind='stable')
+        s, e   = s[valid][order], e[valid][order]
+        n      = len(s)
+        bounds = (np.arange(N_QUINTILES + 1) * n) // N_QUINTILES
+        q      = np.searchsorted(bounds, np.arange(n), side='right') - 1   # quintile of each rank
+        totals = np.bincount(q, weights=e - s, minlength=N_QUINTILES)
+        w      = (1.0 / N_QUINTILES) / totals[q]
+        for a, b, wi in zip(s.tolist(), e.tolist(), w.tolist()):
+            step_weights[a:b] = wi
+        return step_weights
+
+    def _start_hidden(self, starts, device, net=None, burn_in=0, fresh=None):
+        """
+        (h, c) to begin sequences starting at steps `starts` — each (1, B, H).
+
+        Zeros without stored hidden states. Otherwise the stored state at the
+        sequence start; with burn_in and net, sequences that have burn_in steps
+        of the same episode before them instead start from the state stored at
+        (start - burn_in) and replay the prefix through the current net.
+        fresh: optional bool mask of sequences that begin an episode — zeros.
+        """
+        B = len(starts)
+        if not self.hidden_every or (fresh is not None and fresh.all()):
+            h = torch.zeros(1, B, LSTM_HIDDEN, device=device)
+            return h, torch.zeros_like(h)
+        if fresh is not None and fresh.any():
+            h, c = self._start_hidden(np.where(fresh, 0, starts), device, net, burn_in)
+            m = torch.as_tensor(fresh, device=device)
+            h[:, m] = 0.0
+            c[:, m] = 0.0
+            return h, c
+
+        k = starts // self.hidden_every
+        h = torch.as_tensor(self.hidden_h[k], device=device).unsqueeze(0)
+        c = torch.as_tensor(self.hidden_c[k], device=device).unsqueeze(0)
+        if not burn_in or net is None:
+            return h, c
+
+        # Prefix must lie in the same episode — a done inside it means the
+        # rollout reset (h, c) there, so the stored start state is already right
+        n_done  = np.concatenate([[0], np.cumsum(self.dones[:self.ptr])])
+        pre     = starts - burn_in
+        ok      = pre >= 0
+        ok[ok] &= n_done[starts[ok]] == n_done[pre[ok]]
+        rows    = np.flatnonzero(ok)
+        if len(rows) == 0:
+            return h, c
+
+        p   = pre[rows]
+        idx = p[:, None] + np.arange(burn_in)
+        k0  = p // self.hidden_every
+        h0  = torch.as_tensor(self.hidden_h[k0], device=device).unsqueeze(0)
+        c0  = torch.as_tensor(self.hidden_c[k0], device=device).unsqueeze(0)
+        h_b, c_b = net.burn_in(torch.as_tensor(self.states[idx], device=device), (h0, c0))
+        r = torch.as_tensor(rows, device=device)
+        h[:, r], c[:, r] = h_b, c_b
+        return h, c
+
+    def get_sequences(self, seqs_per_batch, device, ep_records=None, net=None, burn_in=0):
         """
         Yield mini-batches of contiguous sequences for LSTM training.
 
-        Each batch: (states, actions, log_probs, advantages, returns)
-        Shapes: (seqs_per_batch, seq_len, ...) except scalars (seqs_per_batch * seq_len,)
+        Each batch: (states, actions, log_probs, advantages, returns, hidden)
+        Shapes: (seqs_per_batch, seq_len, ...); hidden = (h, c) each
+        (1, seqs_per_batch, LSTM_HIDDEN) to start the sequences from.
 
-        Hidden state is zeroed at each sequence start (truncated BPTT).
-        The LSTM learns to reconstruct context from the first few frames.
-        The full-episode hidden state is maintained during ROLLOUT (not training).
+        Without stored hidden states, hidden is zeros (truncated BPTT) — the
+        LSTM reconstructs context from the first few frames, which is why
+        SEQ_LEN had to grow to a whole game. With hidden_every > 0 it is the
+        rollout's own (h, c) at the sequence start, refreshed by a burn_in
+        prefix through `net` when given (multiple of hidden_every).
         """
         n_seqs = self.ptr // self.seq_len
         if n_seqs == 0:
             return
+        if burn_in and self.hidden_every and burn_in % self.hidden_every:
+            raise ValueError(f"burn_in {burn_in} must be a multiple of hidden_every {self.hidden_every}")
 
         if ep_records is not None:
             seq_weights = self._compute_sequence_weights(ep_records)
@@ -449,6 +874,73 @@ class RolloutBuffer:
                 torch.FloatTensor(lp_b).to(device),        # (B, seq_len)
                 torch.FloatTensor(adv_b).to(device),       # (B, seq_len)
                 torch.FloatTensor(ret_b).to(device),       # (B, seq_len)
+                self._start_hidden(batch_seq_ids * self.seq_len, device, net, burn_in),
+            )
+
+    def episode_chunks(self):
+        """
+        Split the buffer at every episode end AND every seq_len grid line.
+        Returns (starts, lengths, fresh): each chunk lies inside one episode,
+        is at most seq_len long, and either begins its episode (fresh — the
+        rollout's hidden was zero there) or begins on the grid (where a
+        stored hidden state exists).
+        """
+        n = self.ptr
+        cuts = np.union1d(np.flatnonzero(self.dones[:n]) + 1,
+                          np.arange(self.seq_len, n, self.seq_len))
+        starts  = np.concatenate([[0], cuts[cuts < n]]).astype(np.int64)
+        lengths = np.diff(np.append(starts, n))
+        ep_start = np.zeros(n + 1, dtype=bool)
+        ep_start[0] = True
+        ep_start[np.flatnonzero(self.dones[:n]) + 1] = True
+        return starts, lengths, ep_start[starts]
+
+    def get_episode_sequences(self, seqs_per_batch, device, ep_records=None, net=None, burn_in=0):
+        """
+        Episode-aligned version of get_sequences: no sequence crosses a done.
+
+        Chunks from episode_chunks() are sampled (quintile-weighted like
+        get_sequences), sorted by length and cut into batches, so each batch
+        pads to a near-equal length. Yields
+          (states, actions, log_probs, advantages, returns, hidden, mask)
+        with (B, T) tensors, T = longest chunk in the batch, mask 1.0 on real
+        steps and 0.0 on padding. Chunks that begin an episode start from
+        zeros — the rollout reset there too.
+        """
+        if self.ptr == 0:
+            return
+        if burn_in and self.hidden_every and burn_in % self.hidden_every:
+            raise ValueError(f"burn_in {burn_in} must be a multiple of hidden_every {self.hidden_every}")
+        starts, lengths, fresh = self.episode_chunks()
+        n_chunks = len(starts)
+
+        if ep_records is not None:
+            step_w = self._step_weights(ep_records)
+            w = np.add.reduceat(step_w, starts) / lengths    # mean step weight per chunk
+            w = w / w.sum() if w.sum() > 0 else np.full(n_chunks, 1.0 / n_chunks)
+            picks = np.random.choice(n_chunks, size=n_chunks, replace=True, p=w)
+        else:
+            picks = np.random.permutation(n_chunks)
+
+        picks   = picks[np.argsort(lengths[picks], kind='stable')]
+        batches = [picks[i:i + seqs_per_batch] for i in range(0, n_chunks, seqs_per_batch)]
+        for bi in np.random.permutation(len(batches)):
+            ids = batches[bi]
+            if len(ids) < seqs_per_batch // 2:
+                continue
+            T    = int(lengths[ids].max())
+            offs = np.arange(T)
+            mask = offs[None, :] < lengths[ids][:, None]              # (B, T)
+            idx  = np.where(mask, starts[ids][:, None] + offs, 0)    # padding → row 0, masked
+
+            yield (
+                torch.as_tensor(self.states[idx] * mask[..., None], device=device),
+                torch.as_tensor(self.actions[idx] * mask, device=device),
+                torch.as_tensor(self.log_probs[idx] * mask, device=device),
+                torch.as_tensor(self.advantages[idx] * mask, device=device),
+                torch.as_tensor(self.returns[idx] * mask, device=device),
+                self._start_hidden(starts[ids], device, net, burn_in, fresh=fresh[ids]),
+                torch.as_tensor(mask, dtype=torch.float32, device=device),
             )
 
     def reset(self):
@@ -457,15 +949,12 @@ class RolloutBuffer:
         self.returns[:]    = 0
 
     def episode_stats(self):
-        """Scan buffer for episode boundaries, return list of episode rewards."""
-        ep_rewards = []
-        current = 0.0
-        for i in range(self.ptr):
-            current += self.rewards[i]
-            if self.dones[i]:
-                ep_rewards.append(current)
-                current = 0.0
-        return ep_rewards
+        """Rewards of every episode that ends in the buffer (float64 sums)."""
+        ends = np.flatnonzero(self.dones[:self.ptr])
+        if len(ends) == 0:
+            return []
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        return np.add.reduceat(self.rewards[:ends[-1] + 1].astype(np.float64), starts).tolist()
 
 
 # =============================================================================
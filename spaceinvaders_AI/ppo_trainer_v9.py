@@ -0,0 +1,355 @@
+# =============================================================================
+# ppo_trainer_v9.py  —  Headless data-parallel PPO v9 (DistributedDataParallel)
+# =============================================================================
+#
+# train_v9.py runs every update mini-batch (~600 of them) on one device.
+# This trainer spreads the whole loop over W processes — GPUs (nccl) or,
+# for testing, CPU processes (gloo):
+#
+#   ROLLOUT   each rank collects ROLLOUT_STEPS / W steps with its own
+#             N_ENVS envs (RolloutEngine + PPOPolicy) — the rollout buffer
+#             is sharded by construction, no steps cross process lines.
+#   UPDATE    each rank builds mini-batches from its shard and runs
+#             net.evaluate through a DDP wrapper; gradients are all-reduced
+#             (averaged) in backward, so every rank applies the same step.
+#             Ranks agree on the batch count first (all-reduce MIN) so no
+#             rank waits on an all-reduce the others never start.
+#   HALL OF FAME  sharded too: each rank keeps the best
+#             HOF_EPISODES / W of its own games and trains on its HoF
+#             batches in lockstep. Shards are merged for checkpoints and
+#             split again (rank::W) on resume.
+#   OUTPUT    rank 0 alone prints, writes the CSV log and saves checkpoints;
+#             episode stats are gathered to it every update. Checkpoints use
+#             train_v9's format and names (periodic, final and best — a new
+#             best avg50 writes best_model_v9.pth), so train_v9 / evaluate_v9 /
+#             tournament_v9 read them unchanged.
+#
+# Gradients are averaged over ranks, so one step sees W× the data of a
+# train_v9 mini-batch at the same LR.
+#
+# Usage:
+#   python ppo_trainer_v9.py --world 2                       # 2 local processes
+#   python ppo_trainer_v9.py --world 4 --resume final_model_v9.pth
+#   python ppo_trainer_v9.py --world 2 --grid-encoder conv_lut    # see ActorCritic
+#   torchrun --nproc_per_node 4 ppo_trainer_v9.py            # torchrun sets ranks
+#   python ppo_trainer_v9.py --world 2 --rollout 16384 --seq-len 256 --updates 2 --dir /tmp/ddp
+#                                                            # quick CPU check
+#
+# =============================================================================
+
+import os
+import sys
+import csv
+import time
+import itertools
+import collections
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.nn.utils import clip_grad_norm_
+
+from game_env_v7 import REWARDS
+from ppo_agent_v9 import ActorCritic, RolloutBuffer, HallOfFame, ppo_loss, save_weights, SEQ_LEN
+from rollout_engine_v9 import PPOPolicy, RolloutEngine
+from vec_env_v7 import VecEnv
+from features_v7 import feature_schema, check_schema
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAVE_DIR        = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
+
+ROLLOUT_STEPS   = 1_048_576   # total over all ranks, as in train_v9
+N_ENVS          = 32          # envs per rank
+SEQS_PER_BATCH  = 4           # per rank — global batch = W × this
+PPO_EPOCHS      = 6
+HOF_EPISODES    = 40          # total over all ranks
+
+GAMMA           = 0.99
+GAE_LAMBDA      = 0.95
+CLIP_EPS        = 0.2
+VALUE_COEF      = 0.5
+ENTROPY_COEF    = 0.004
+MAX_GRAD_NORM   = 0.5
+LR              = 2.5e-4
+CRITIC_LR_MULT  = 4
+ALIVE_BONUS     = 0.003
+WASTED_SHOT_PEN = REWARDS['wasted_shot']
+
+SAVE_EVERY      = 5
+MAX_UPDATES     = 10_000
+MASTER_PORT     = 29517
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+class _Evaluate(nn.Module):
+    """ActorCritic.evaluate as forward() — DDP only syncs gradients through forward."""
+
+    def __init__(self, net):
+        super().__init__()
+        self.net = net
+
+    def forward(self, states, actions, hidden):
+        return self.net.evaluate(states, actions, hidden)
+
+
+def _n_batches(n_items, seqs_per_batch):
+    """How many batches get_sequences / HallOfFame.get_batches yield for n_items sequences."""
+    return sum(1 for s in range(0, n_items, seqs_per_batch)
+               if min(seqs_per_batch, n_items - s) >= seqs_per_batch // 2)
+
+
+def _common(n, device):
+    """Smallest n over all ranks."""
+    t = torch.tensor([n], device=device)
+    dist.all_reduce(t, op=dist.ReduceOp.MIN)
+    return int(t.item())
+
+
+def _make_opt(net):
+    critic_ids  = {id(p) for p in net.critic_head.parameters()}
+    actor_group = [p for p in net.parameters() if id(p) not in critic_ids]
+    return optim.Adam([
+        {'params': actor_group,                  'lr': LR},
+        {'params': net.critic_head.parameters(), 'lr': LR * CRITIC_LR_MULT},
+    ])
+
+
+def _train_batches(model, opt, batches, n):
+    """n PPO steps from the batch iterator. Returns (policy, value, entropy) loss lists."""
+    pls, vls, ents = [], [], []
+    for batch in itertools.islice(batches, n):
+        states_b, actions_b, old_lp_b, adv_b, returns_b, init_h = batch
+        new_lp, values_b, entropy = model(states_b, actions_b, init_h)
+        loss, pl, vl, ent = ppo_loss(new_lp, values_b, entropy, old_lp_b, adv_b, returns_b,
+                                     clip_eps=CLIP_EPS, value_coef=VALUE_COEF,
+                                     entropy_coef=ENTROPY_COEF)
+        opt.zero_grad()
+        loss.backward()                 # DDP all-reduces gradients here
+        clip_grad_norm_(model.parameters(), MAX_GRAD_NORM)
+        opt.step()
+        pls.append(pl.item())
+        vls.append(vl.item())
+        ents.append(ent.item())
+    return pls, vls, ents
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+def run_worker(rank, world, cfg):
+    backend = cfg['backend']
+    os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+    os.environ.setdefault('MASTER_PORT', str(MASTER_PORT))
+    dist.init_process_group(backend, rank=rank, world_size=world)
+    local  = int(os.environ.get('LOCAL_RANK', rank))
+    device = torch.device(f'cuda:{local}') if backend == 'nccl' else torch.device('cpu')
+    if device.type == 'cpu':
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // world))
+    torch.manual_seed(1000 + rank)
+    np.random.seed(1000 + rank)
+    lead = rank == 0
+
+    save_dir      = cfg['dir']
+    seq_len       = cfg['seq_len']
+    steps_per_env = max(seq_len, cfg['rollout'] // world // N_ENVS)
+    ckpt_pattern  = f'{save_dir}/checkpoint_v9_upd{{n}}.pth'
+    final_path    = f'{save_dir}/final_model_v9.pth'
+    best_path     = f'{save_dir}/best_model_v9.pth'
+    log_path      = f'{save_dir}/training_log_v9_ddp.csv'
+
+    # Checkpoint first — its grid encoder decides the net layout
+    ck = None
+    if cfg['resume']:
+        ck = torch.load(cfg['resume'], map_location=device, weights_only=False)
+        check_schema(ck.get('feature_schema'), os.path.basename(cfg['resume']))
+        if ck.get('ctx_norm') is not None:
+            raise ValueError("checkpoint was trained with NORMALISE_CONTEXT — not supported here yet")
+    saved   = ck.get('grid_encoder', 'conv') if ck is not None else None
+    encoder = cfg['grid_encoder'] or saved or 'conv'
+    if saved is not None and (saved == 'embed') != (encoder == 'embed'):
+        raise ValueError(f"{os.path.basename(cfg['resume'])} has grid_encoder={saved!r} "
+                         f"— incompatible with {encoder!r}")
+
+    net   = ActorCritic(encoder).to(device)
+    opt   = _make_opt(net)
+    hof   = HallOfFame(max_episodes=max(2, HOF_EPISODES // world))
+    state = {'ep_num': 0, 'update_num': 0, 'total_steps': 0, 'best_avg50': -999.0,
+             'best_avg50_kills': 0.0}
+    score_history = collections.deque(maxlen=50)
+    kill_history  = collections.deque(maxlen=50)
+
+    if ck is not None:
+        net.load_state_dict(ck['net'])
+        try:
+            opt.load_state_dict(ck['optimizer'])
+        except Exception:
+            if lead:
+                print("  [Optimizer structure changed — fresh optimizer, weights kept]")
+        for k in state:
+            state[k] = ck.get(k, state[k])
+        score_history.extend(ck.get('score_history', []))
+        kill_history.extend(ck.get('kill_history', []))
+        hof.kill_hof   = ck.get('hof_kill_episodes',   [])[rank::world]
+        hof.reward_hof = ck.get('hof_reward_episodes', [])[rank::world]
+
+    model  = DDP(_Evaluate(net), device_ids=[device.index] if device.type == 'cuda' else None)
+    buf    = RolloutBuffer(N_ENVS * steps_per_env, seq_len=seq_len)
+    policy = PPOPolicy(net, device, buf, N_ENVS, steps_per_env, gamma=GAMMA,
+                       alive_bonus=ALIVE_BONUS, wasted_shot_pen=WASTED_SHOT_PEN)
+    engine = RolloutEngine(VecEnv(N_ENVS), policy)
+
+    def save(path, tag=''):
+        # Every rank contributes its HoF shard; rank 0 writes
+        shards = [None] * world
+        dist.all_gather_object(shards, (hof.kill_hof, hof.reward_hof))
+        if not lead:
+            return
+        kill_eps   = sorted((e for s in shards for e in s[0]),
+                            key=lambda e: (e['kills'], e['score']), reverse=True)
+        reward_eps = sorted((e for s in shards for e in s[1]),
+                            key=lambda e: (e['score'], e['kills']), reverse=True)
+        tmp = path + '.tmp'
+        torch.save({
+            'net':                 net.state_dict(),
+            'optimizer':           opt.state_dict(),
+            **state,
+            'score_history':       list(score_history),
+            'kill_history':        list(kill_history),
+            'hof_kill_episodes':   kill_eps,
+            'hof_reward_episodes': reward_eps,
+            'feature_schema':      feature_schema(),
+            'ctx_norm':            None,
+            'grid_encoder':        net.grid_encoder,
+            'world_size':          world,
+        }, tmp)
+        os.replace(tmp, path)
+        save_weights(path, net, update_num=state['update_num'], ep_num=state['ep_num'],
+                     total_steps=state['total_steps'], best_avg50=float(state['best_avg50']),
+                     best_avg50_kills=float(state['best_avg50_kills']),
+                     feature_schema=feature_schema(), source=os.path.basename(path))
+        print(f"  [Saved{tag} → {os.path.basename(path)}]")
+
+    log_file = log_writer = None
+    if lead:
+        os.makedirs(save_dir, exist_ok=True)
+        new_log    = not os.path.exists(log_path)
+        log_file   = open(log_path, 'a', newline='')
+        log_writer = csv.writer(log_file)
+        if new_log:
+            log_writer.writerow(['update', 'episodes', 'total_steps', 'ep_mean', 'avg50',
+                                 'mean_kills', 'avg50_kills', 'policy_loss', 'value_loss',
+                                 'entropy', 'secs_rollout', 'secs_update', 'world_size'])
+        print(f"\n{'=' * 65}\n  PPO v9 data-parallel  |  {world} × {backend} on {device.type}\n"
+              f"  Rollout: {world} × {N_ENVS} envs × {steps_per_env} = "
+              f"{world * N_ENVS * steps_per_env:,} steps/update  |  SeqLen: {seq_len}  |  Grid: {encoder}\n"
+              f"  Batch: {world} × {SEQS_PER_BATCH} seqs  |  Epochs: {PPO_EPOCHS}\n{'=' * 65}\n")
+
+    max_updates = cfg['updates']
+    try:
+        for _ in range(max_updates):
+            # ── Rollout (this rank's shard) ───────────────────────────────────
+            t0 = time.time()
+            buf.reset()
+            episodes, pieces = engine.run(steps_per_env)
+            buf.compute_gae(0.0, gamma=GAMMA, gae_lambda=GAE_LAMBDA)   # bootstrap folded in
+            ep_records = ([(*ep['buf_range'], ep['return']) for ep in episodes] +
+                          [(*info['buf_range'], info['return']) for _, info in pieces])
+            for ep in episodes:
+                s, e = ep['buf_range']
+                hof.offer(buf.states[s:e], buf.actions[s:e], buf.log_probs[s:e],
+                          buf.rewards[s:e], buf.dones[s:e], ep['kills'], ep['return'])
+            secs_rollout = time.time() - t0
+
+            # ── Update — same number of batches on every rank ────────────────
+            t0 = time.time()
+            net.train()
+            pls, vls, ents = [], [], []
+            n_seq = _common(_n_batches(buf.ptr // seq_len, SEQS_PER_BATCH), device)
+            for _ in range(PPO_EPOCHS):
+                batches = buf.get_sequences(SEQS_PER_BATCH, device, ep_records=ep_records)
+                for lst, vals in zip((pls, vls, ents), _train_batches(model, opt, batches, n_seq)):
+                    lst.extend(vals)
+
+            hof_batches = list(hof.get_batches(net, device, seq_len, SEQS_PER_BATCH,
+                                               gamma=GAMMA, gae_lambda=GAE_LAMBDA))
+            n_hof = _common(len(hof_batches), device)
+            _train_batches(model, opt, iter(hof_batches), n_hof)
+            net.eval()
+            secs_update = time.time() - t0
+
+            # ── Stats to rank 0 ──────────────────────────────────────────────
+            mine = [(ep['return'], ep['kills']) for ep in episodes]
+            gathered = [None] * world
+            dist.all_gather_object(gathered, mine)
+            all_eps = [g for part in gathered for g in part]
+
+            state['update_num']  += 1
+            state['ep_num']      += len(all_eps)
+            state['total_steps'] += world * N_ENVS * steps_per_env
+            for ret, kills in all_eps:
+                score_history.append(ret)
+                kill_history.append(kills)
+            avg50       = float(np.mean(score_history)) if score_history else 0.0
+            avg50_kills = float(np.mean(kill_history))  if kill_history  else 0.0
+            state['best_avg50_kills'] = max(state['best_avg50_kills'], avg50_kills)
+
+            if lead:
+                ep_mean    = float(np.mean([r for r, _ in all_eps])) if all_eps else 0.0
+                mean_kills = float(np.mean([k for _, k in all_eps])) if all_eps else 0.0
+                pl, vl, ent = (float(np.mean(x)) if x else 0.0 for x in (pls, vls, ents))
+                print(f"  Update {state['update_num']:>5}  |  {len(all_eps):>4} eps  "
+                      f"mean={ep_mean:7.1f}  kills={mean_kills:5.2f}  avg50={avg50:7.1f}  |  "
+                      f"pl={pl:+.4f}  vl={vl:.4f}  ent={ent:.3f}  |  "
+                      f"{n_seq * PPO_EPOCHS}+{n_hof} batches/rank  |  "
+                      f"roll {secs_rollout:.1f}s  upd {secs_update:.1f}s")
+                log_writer.writerow([state['update_num'], state['ep_num'], state['total_steps'],
+                                     round(ep_mean, 2), round(avg50, 2), round(mean_kills, 2),
+                                     round(avg50_kills, 2), round(pl, 5), round(vl, 5),
+                                     round(ent, 5), round(secs_rollout, 1), round(secs_update, 1),
+                                     world])
+                log_file.flush()
+
+            # score_history is the gathered one on every rank, so all ranks agree
+            # here and reach save()'s all-gather together
+            if score_history and avg50 > state['best_avg50']:
+                state['best_avg50'] = avg50
+                save(best_path, tag=' BEST')
+            if state['update_num'] % SAVE_EVERY == 0:
+                save(ckpt_pattern.format(n=state['update_num']))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        save(final_path, tag=' FINAL')
+        if log_file is not None:
+            log_file.close()
+        engine.close()
+        dist.destroy_process_group()
+
+
+def _arg(args, flag, default, cast=str):
+    return cast(args[args.index(flag) + 1]) if flag in args else default
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    cfg  = {
+        'dir':          _arg(args, '--dir', SAVE_DIR),
+        'rollout':      _arg(args, '--rollout', ROLLOUT_STEPS, int),
+        'seq_len':      _arg(args, '--seq-len', SEQ_LEN, int),
+        'updates':      _arg(args, '--updates', MAX_UPDATES, int),
+        'resume':       _arg(args, '--resume', None),
+        'grid_encoder': _arg(args, '--grid-encoder', None),   # None = checkpoint's, else 'conv'
+        'backend':      _arg(args, '--backend', 'nccl' if torch.cuda.is_available() else 'gloo'),
+    }
+    if 'RANK' in os.environ:                       # launched by torchrun
+        run_worker(int(os.environ['RANK']), int(os.environ['WORLD_SIZE']), cfg)
+    else:
+        world = _arg(args, '--world', max(1, torch.cuda.device_count()), int)
+        torch.multiprocessing.spawn(run_worker, args=(world, cfg), nprocs=world, join=True)
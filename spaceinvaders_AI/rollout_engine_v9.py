@@ -0,0 +1,277 @@
+# =============================================================================
+# rollout_engine_v9.py  —  One batched rollout loop for PPO v9 and DQN v7
+# =============================================================================
+#
+# DQNAgent.choose_action(state) and ActorCritic.get_action(state_t, hidden)
+# don't share a signature, so train_v9.py and the DQN loop each hand-rolled a
+# single-env loop. Here both agents sit behind one batched Policy protocol:
+#
+#   policy.begin(states)       envs were just reset — initialise per-env memory
+#   policy.act(states)         (N, 94) states → (N,) int actions
+#   policy.observe(...)        results of that step; returns finished episodes
+#   policy.reset(mask)         forget per-env memory where mask is True
+#   policy.start_rollout()     hooks around RolloutEngine.run() — PPO uses
+#   policy.end_rollout(states) them to fill one on-policy RolloutBuffer
+#
+# RolloutEngine drives any Policy over a VecEnv (in-process) or SubprocVecEnv
+# (worker processes) from vec_env_v7.py, so speeding up the engine speeds up
+# both algorithms.
+#
+#   PPOPolicy   batched LSTM forward (one pass for N envs), hidden state per
+#               env, reset on done. Steps are staged per env and copied into
+#               the RolloutBuffer one whole episode at a time, so GAE still
+#               sees contiguous episodes.
+#   DQNPolicy   batched epsilon-greedy + NStepEventWriter (event rules and
+#               n-step returns from dqn_collector_v7.py), feeding agent.store.
+#
+# Usage (throughput demo):
+#   python rollout_engine_v9.py ppo 32        # 32 envs
+#   python rollout_engine_v9.py dqn 32 4      # 32 envs on 4 worker processes
+#
+# =============================================================================
+
+import sys
+import time
+import numpy as np
+import torch
+
+from vec_env_v7 import VecEnv, SubprocVecEnv
+from features_v7 import STATE_SIZE
+
+
+# =============================================================================
+# POLICY PROTOCOL
+# =============================================================================
+
+class Policy:
+    """Batched policy over N envs. Override act/observe; the rest are optional."""
+
+    def begin(self, states):
+        pass
+
+    def act(self, states):
+        raise NotImplementedError
+
+    def observe(self, states, actions, rewards, next_states, dones, infos):
+        """Returns [(env_index, dict), ...] for episodes that finished this step."""
+        return []
+
+    def reset(self, mask):
+        pass
+
+    def start_rollout(self):
+        pass
+
+    def end_rollout(self, states):
+        """Returns [(env_index, dict), ...] for episode pieces still open."""
+        return []
+
+
+# =============================================================================
+# PPO v9
+# =============================================================================
+
+class PPOPolicy(Policy):
+    """
+    ActorCritic over N envs, writing into a RolloutBuffer.
+
+    buf must hold n_envs × steps_per_env steps. Each finished episode is one
+    contiguous buf slice; its info dict carries 'buf_range' (s, e) and the
+    shaped 'return' — the same (s, e, score) triples train_v9 keeps in
+    ep_records. Episodes still running at end_rollout() are appended with
+    their last step marked done and γ·V(next state) folded into its reward,
+    so compute_gae(0.0) bootstraps every env correctly. 'return' is the
+    whole game's shaped return, even when the game spans rollouts.
+
+    transform: optional states → states (e.g. the running context norm).
+    """
+
+    def __init__(self, net, device, buf, n_envs, steps_per_env, gamma=0.99,
+                 alive_bonus=0.0, wasted_shot_pen=0.0, transform=None):
+        self.net             = net
+        self.device          = device
+        self.buf             = buf
+        self.n_envs          = n_envs
+        self.gamma           = gamma
+        self.alive_bonus     = alive_bonus
+        self.wasted_shot_pen = wasted_shot_pen
+        self.transform       = transform
+
+        T, N = steps_per_env, n_envs
+        self.st_states    = np.zeros((T, N, STATE_SIZE), dtype=np.float32)
+        self.st_actions   = np.zeros((T, N), dtype=np.int64)
+        self.st_rewards   = np.zeros((T, N), dtype=np.float32)
+        self.st_values    = np.zeros((T, N), dtype=np.float32)
+        self.st_log_probs = np.zeros((T, N), dtype=np.float32)
+        self.st_dones     = np.zeros((T, N), dtype=np.float32)
+        self.ep_start     = np.zeros(N, dtype=np.int64)
+        self.ep_return    = np.zeros(N, dtype=np.float64)
+        self.t            = 0
+        self.hidden       = net.init_hidden(N, device)
+
+    def _input(self, states):
+        return states if self.transform is None else self.transform(states)
+
+    def start_rollout(self):
+        self.t = 0
+        self.ep_start[:] = 0     # ep_return carries on — games span rollouts
+        # Clean slate at rollout start, as in train_v9
+        self.hidden = self.net.init_hidden(self.n_envs, self.device)
+
+    def act(self, states):
+        x = self._input(states)
+        a, lp, v, self.hidden = self.net.act_batch(torch.as_tensor(x, device=self.device),
+                                                   self.hidden)
+        t = self.t
+        self.st_states[t]    = x
+        self.st_values[t]    = v.cpu().numpy()
+        self.st_log_probs[t] = lp.cpu().numpy()
+        actions = a.cpu().numpy()
+        self.st_actions[t]   = actions
+        return actions
+
+    def observe(self, states, actions, rewards, next_states, dones, infos):
+        t = self.t
+        wasted = np.fromiter((info['wasted_shot'] for info in infos), dtype=bool,
+                             count=self.n_envs)
+        shaped = rewards + self.alive_bonus + self.wasted_shot_pen * wasted
+        self.st_rewards[t] = shaped
+        self.st_dones[t]   = dones
+        self.ep_return    += shaped
+
+        finished = [(i, self._flush(i, t + 1)) for i in np.flatnonzero(dones)]
+        self.t += 1
+        return finished
+
+    def _flush(self, i, end, closed=True):
+        """Copy env i's staged steps [ep_start, end) into the buffer."""
+        s0, ptr = self.ep_start[i], self.buf.ptr
+        self.buf.add_many(self.st_states[s0:end, i], self.st_actions[s0:end, i],
+                          self.st_rewards[s0:end, i], self.st_values[s0:end, i],
+                          self.st_log_probs[s0:end, i], self.st_dones[s0:end, i])
+        info = {'buf_range': (ptr, self.buf.ptr), 'return': float(self.ep_return[i])}
+        self.ep_start[i] = end
+        if closed:
+            self.ep_return[i] = 0.0
+        return info
+
+    def reset(self, mask):
+        if mask.any():
+            m = torch.as_tensor(mask, device=self.device)
+            for hc in self.hidden:
+                hc[:, m] = 0.0
+
+    @torch.no_grad()
+    def end_rollout(self, states):
+        t     = self.t
+        open_ = np.flatnonzero(self.ep_start < t)
+        if len(open_) == 0:
+            return []
+        # V(s_T) with the current hidden — hidden itself is not advanced
+        x = torch.as_tensor(self._input(states), device=self.device).unsqueeze(1)
+        lstm_out, _ = self.net.lstm(self.net._backbone(x), self.hidden)
+        v = self.net.critic_head(lstm_out.squeeze(1)).squeeze(-1).cpu().numpy()
+        self.st_rewards[t - 1, open_] += self.gamma * v[open_]
+        self.st_dones[t - 1, open_]    = 1.0
+        return [(i, self._flush(i, t, closed=False)) for i in open_]
+
+
+# =============================================================================
+# DQN v7
+# =============================================================================
+
+class DQNPolicy(Policy):
+    """DQNAgent over N envs — batched epsilon-greedy, event/n-step storage."""
+
+    def __init__(self, agent, n_envs, n_step=3, **writer_kw):
+        from dqn_collector_v7 import NStepEventWriter
+        self.agent  = agent
+        self.writer = NStepEventWriter(n_envs, agent.store, n_step=n_step,
+                                       gamma=agent.gamma, **writer_kw)
+
+    def begin(self, states):
+        self.writer.reset(states)
+
+    def act(self, states):
+        return self.agent.choose_actions(states)
+
+    def observe(self, states, actions, rewards, next_states, dones, infos):
+        finished = self.writer.step(states, actions, rewards, next_states, dones, infos)
+        for _ in finished:
+            self.agent.decay_epsilon()
+        return [(i, dict(counts)) for i, counts in finished]
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+class RolloutEngine:
+    """
+    Steps a vector env with any Policy. Envs auto-reset, so consecutive
+    run() calls continue the same games.
+    """
+
+    def __init__(self, venv, policy):
+        self.venv   = venv
+        self.policy = policy
+        self.states = venv.reset()
+        policy.begin(self.states)
+        self.env_steps = 0
+
+    def run(self, n_batch_steps):
+        """
+        n_batch_steps steps of every env. Returns (episodes, pieces):
+        episodes — finished games, info['episode'] merged with the policy's dict;
+        pieces   — policy's (env, dict) for games still running at the end.
+        """
+        policy   = self.policy
+        episodes = []
+        policy.start_rollout()
+        for _ in range(n_batch_steps):
+            actions = policy.act(self.states)
+            next_states, rewards, dones, infos = self.venv.step(actions)
+            for i, extra in policy.observe(self.states, actions, rewards,
+                                           next_states, dones, infos):
+                episodes.append({'env': int(i), **extra, **infos[i]['episode']})
+            policy.reset(dones)
+            self.states = next_states
+        self.env_steps += n_batch_steps * len(self.states)
+        return episodes, policy.end_rollout(self.states)
+
+    def close(self):
+        self.venv.close()
+
+
+# =============================================================================
+# DEMO — throughput of both policies on the same engine
+# =============================================================================
+
+if __name__ == '__main__':
+    kind      = sys.argv[1] if len(sys.argv) > 1 else 'ppo'
+    n_envs    = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    n_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    steps     = 256
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    venv   = SubprocVecEnv(n_envs, n_workers) if n_workers else VecEnv(n_envs)
+
+    if kind == 'ppo':
+        from ppo_agent_v9 import ActorCritic, RolloutBuffer
+        net    = ActorCritic().to(device)
+        buf    = RolloutBuffer(n_envs * steps)
+        policy = PPOPolicy(net, device, buf, n_envs, steps)
+    else:
+        from dqn_agent_v7 import DQNAgent
+        policy = DQNPolicy(DQNAgent(STATE_SIZE, 4, device), n_envs)
+
+    engine = RolloutEngine(venv, policy)
+    for it in range(5):
+        if kind == 'ppo':
+            buf.reset()
+        t0 = time.time()
+        episodes, pieces = engine.run(steps)
+        dt = time.time() - t0
+        print(f"  {kind}  {n_envs} envs  |  {n_envs * steps / dt:,.0f} steps/s  |  "
+              f"{len(episodes)} episodes finished")
+    engine.close()
@@ -0,0 +1,224 @@
+# =============================================================================
+# snapshot_stream_v9.py  —  Render-on-demand: env snapshots → viewer process
+# =============================================================================
+#
+# train_v9.py used to call env.render() on every step of every RENDER_EVERY-th
+# episode, so that episode ran at display speed (pygame.display.flip + font
+# rendering inline with rollout collection).
+#
+# Now the rollout only writes a 53-float snapshot (env.snapshot) into a ring
+# buffer in shared memory — a few microseconds, never blocks. A separate
+# viewer process reads the ring at its own pace and renders with GameWall.
+# If the viewer falls behind it simply drops frames and jumps to live.
+#
+# Shared memory layout (one block):
+#   header   int64[4]            write_count, stop_flag, capacity, reserved
+#   overlay  float64[N_OVERLAY]  episode, avg50, ... (see OVERLAY_KEYS)
+#   frames   float32[capacity, SNAPSHOT_SIZE]
+#
+# The writer fills slot (count % capacity) then bumps write_count, so the
+# reader only ever copies slots that were complete when it looked. With a
+# few hundred slots the writer cannot lap a single 53-float copy.
+#
+# Viewer (started automatically by train_v9.py):
+#   python snapshot_stream_v9.py <shm_name> [steps_per_frame] [--until-stdin-closes]
+# Press Q or close the viewer window to stop training cleanly. The trainer
+# holds the write end of the viewer's stdin, so if it dies without setting
+# the stop flag the pipe closes and the viewer exits anyway.
+#
+# =============================================================================
+
+import os
+import sys
+import subprocess
+import numpy as np
+from multiprocessing import shared_memory
+
+from game_env_v7 import SNAPSHOT_SIZE
+
+OVERLAY_KEYS = ('episode', 'avg50', 'best_avg50', 'total_steps',
+                'buffer_events', 'update', 'progress')
+N_OVERLAY    = len(OVERLAY_KEYS)
+
+_H_COUNT, _H_STOP, _H_CAP = 0, 1, 2
+_HEADER_BYTES  = 4 * 8
+_OVERLAY_BYTES = N_OVERLAY * 8
+
+VIEW_FPS        = 60
+STEPS_PER_FRAME = 4      # 4 env steps per viewer frame ≈ watch_v9 at 240 FPS
+
+
+# =============================================================================
+# RING BUFFER
+# =============================================================================
+
+class SnapshotRing:
+    """Single-writer / single-reader snapshot ring in shared memory."""
+
+    def __init__(self, shm, owner):
+        self.shm   = shm
+        self.owner = owner
+        buf = shm.buf
+        self.header  = np.ndarray(4, dtype=np.int64, buffer=buf)
+        self.overlay = np.ndarray(N_OVERLAY, dtype=np.float64, buffer=buf,
+                                  offset=_HEADER_BYTES)
+        self.capacity = int(self.header[_H_CAP])
+        self.frames  = np.ndarray((self.capacity, SNAPSHOT_SIZE), dtype=np.float32,
+                                  buffer=buf, offset=_HEADER_BYTES + _OVERLAY_BYTES)
+
+    @classmethod
+    def create(cls, capacity=512):
+        size = _HEADER_BYTES + _OVERLAY_BYTES + capacity * SNAPSHOT_SIZE * 4
+        shm  = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray(4, dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_H_CAP] = capacity
+        np.ndarray(N_OVERLAY, dtype=np.float64, buffer=shm.buf, offset=_HEADER_BYTES)[:] = 0
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            # Older Pythons register attached blocks with the resource tracker,
+            # which would unlink the trainer's block when the viewer exits.
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            except Exception:
+                pass
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # ── Writer side ──────────────────────────────────────────────────────────
+
+    def push(self, env):
+        """Snapshot env straight into the next slot. Never blocks."""
+        count = int(self.header[_H_COUNT])
+        env.snapshot(out=self.frames[count % self.capacity])
+        self.header[_H_COUNT] = count + 1
+
+    def set_overlay(self, **values):
+        for key, val in values.items():
+            self.overlay[OVERLAY_KEYS.index(key)] = val
+
+    # ── Reader side ──────────────────────────────────────────────────────────
+
+    def count(self):
+        return int(self.header[_H_COUNT])
+
+    def read(self, index, out):
+        """Copy frame number `index` into out. index must be < count()."""
+        np.copyto(out, self.frames[index % self.capacity])
+        return out
+
+    def overlay_dict(self):
+        return dict(zip(OVERLAY_KEYS, self.overlay.tolist()))
+
+    # ── Control ──────────────────────────────────────────────────────────────
+
+    def request_stop(self):
+        self.header[_H_STOP] = 1
+
+    def stop_requested(self):
+        return bool(self.header[_H_STOP])
+
+    def close(self):
+        # Drop numpy views before closing, or the buffer export stays pinned
+        self.header = self.overlay = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def launch_viewer(ring, steps_per_frame=STEPS_PER_FRAME):
+    """
+    Start the viewer as its own Python process (no re-import of the trainer).
+    It holds the read end of a pipe from the trainer — same as
+    tournament_v9 — and exits when that closes, even if the trainer crashed.
+    """
+    script = os.path.abspath(__file__)
+    return subprocess.Popen([sys.executable, script, ring.name, str(steps_per_frame),
+                             '--until-stdin-closes'],
+                            cwd=os.path.dirname(script), stdin=subprocess.PIPE)
+
+
+def _stdin_closed_event():
+    """Event set when stdin hits EOF — i.e. the launching trainer has exited."""
+    import threading
+    ev = threading.Event()
+
+    def _watch():
+        try:
+            sys.stdin.read()
+        finally:
+            ev.set()
+
+    threading.Thread(target=_watch, daemon=True).start()
+    return ev
+
+
+# =============================================================================
+# VIEWER PROCESS
+# =============================================================================
+
+def run_viewer(name, steps_per_frame=STEPS_PER_FRAME, parent_gone=None):
+    import pygame
+    from dashboard_v9 import GameWall
+
+    ring  = SnapshotRing.attach(name)
+    wall  = GameWall(1, tile=800, hud_h=24, caption="Space Invaders — PPO v9 (live)")
+    font  = pygame.font.SysFont(None, 22)
+    clock = pygame.time.Clock()
+    frame = np.zeros((1, SNAPSHOT_SIZE), dtype=np.float32)
+
+    overlay_text = None
+    overlay_surf = []
+    last = -1
+
+    while not ring.stop_requested() and not (parent_gone is not None and parent_gone.is_set()):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN
+                                             and event.key == pygame.K_q):
+                ring.request_stop()
+
+        count = ring.count()
+        if count > 0:
+            target = last + steps_per_frame
+            # Fell behind (or never started) — drop frames and jump to live
+            if last < 0 or count - target > ring.capacity // 2:
+                target = count - 1
+            target = min(target, count - 1)
+            if target != last:
+                ring.read(target, frame[0])
+                last = target
+            wall.draw(frame, flip=False)
+
+        # Overlay — text surfaces rebuilt only when the numbers change
+        ov   = ring.overlay_dict()
+        text = (f"Ep {int(ov['episode'])}  |  update {int(ov['update'])}",
+                f"Avg50: {ov['avg50']:.1f}  |  Best: {ov['best_avg50']:.1f}",
+                f"Steps: {int(ov['total_steps']):,}  |  Buffer: {int(ov['buffer_events']):,}",
+                f"Updating... {ov['progress'] * 100:.0f}%" if ov['progress'] > 0 else "")
+        if text != overlay_text:
+            overlay_text = text
+            overlay_surf = [font.render(t, True, (220, 220, 220)) for t in text if t]
+        for i, surf in enumerate(overlay_surf):
+            wall.screen.blit(surf, (10, 10 + 20 * i))
+
+        pygame.display.flip()
+        clock.tick(VIEW_FPS)
+
+    pygame.quit()
+    ring.close()
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    run_viewer(args[0], int(args[1]) if len(args) > 1 else STEPS_PER_FRAME,
+               parent_gone=_stdin_closed_event() if '--until-stdin-closes' in sys.argv else None)
@@ -0,0 +1,231 @@
+# =============================================================================
+# tournament_v9.py  —  Checkpoint tournament: promote "best" on evidence only
+# =============================================================================
+#
+# train_v9.py used to overwrite best_model_v9.pth whenever avg50 — the mean
+# of the last 50 stochastic training games — hit a new high. That number is
+# noisy enough that "best" was often just a lucky stretch.
+#
+# The tournament runs as its own process next to training:
+#
+#   1. It watches SAVE_DIR for new checkpoint_v9_upd*.pth files.
+#   2. Each one plays the same fixed-seed suite (evaluate_v9, EVAL_EPISODES
+#      games, game k from EVAL_SEED + k) on CPU worker processes — no GPU
+#      time taken from training.
+#   3. Results go on a leaderboard (tournament_v9/leaderboard.json, plus the
+#      per-game kills of every entrant for later pairing).
+#   4. A challenger replaces the champion only if its kills are higher on a
+#      one-sided paired test over the shared seeds (p < ALPHA). Then it is
+#      copied to best_model_v9.pth (atomic replace).
+#
+# Started automatically by train_v9.py when EVAL_GATE = True, or by hand:
+#   python tournament_v9.py                   # watch SAVE_DIR until killed
+#   python tournament_v9.py --once            # score what's there, then exit
+#
+# =============================================================================
+
+import os
+import sys
+import json
+import glob
+import time
+import math
+import shutil
+import subprocess
+import numpy as np
+
+from evaluate_v9 import evaluate_checkpoint, format_result, _update_no, EVAL_SEED
+from ppo_agent_v9 import weights_path
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAVE_DIR       = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
+BEST_PATH      = f'{SAVE_DIR}/best_model_v9.pth'
+CKPT_GLOB      = 'checkpoint_v9_upd*.pth'
+
+EVAL_EPISODES  = 500
+EVAL_GREEDY    = False     # score the policy as it is trained (stochastic)
+EVAL_WORKERS   = 2         # CPU processes — leaves the GPU to training
+ALPHA          = 0.05      # promotion needs p < ALPHA (one-sided, paired)
+POLL_SECS      = 30
+
+# =============================================================================
+# STATISTICS
+# =============================================================================
+
+def paired_test(challenger, champion):
+    """
+    One-sided paired test that challenger > champion on the same games.
+    Returns (mean difference, p-value). Normal approximation — fine at the
+    hundreds of games a suite plays.
+    """
+    d = np.asarray(challenger, dtype=np.float64) - np.asarray(champion, dtype=np.float64)
+    n = len(d)
+    sd = d.std(ddof=1) if n > 1 else 0.0
+    if sd == 0.0:
+        return float(d.mean()), (0.0 if d.mean() > 0 else 1.0)
+    z = d.mean() / (sd / math.sqrt(n))
+    return float(d.mean()), 0.5 * math.erfc(z / math.sqrt(2))
+
+# =============================================================================
+# TOURNAMENT
+# =============================================================================
+
+class Tournament:
+    """Leaderboard + champion for one checkpoint directory."""
+
+    def __init__(self, save_dir=SAVE_DIR, best_path=BEST_PATH, n_episodes=EVAL_EPISODES,
+                 greedy=EVAL_GREEDY, seed=EVAL_SEED, alpha=ALPHA, n_workers=EVAL_WORKERS):
+        self.save_dir   = save_dir
+        self.best_path  = best_path
+        self.n_episodes = n_episodes
+        self.greedy     = greedy
+        self.seed       = seed
+        self.alpha      = alpha
+        self.n_workers  = n_workers
+
+        self.dir        = os.path.join(save_dir, 'tournament_v9')
+        self.board_path = os.path.join(self.dir, 'leaderboard.json')
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.board    = {'suite': self._suite(), 'champion': None, 'entries': {}}
+        if os.path.exists(self.board_path):
+            with open(self.board_path) as f:
+                board = json.load(f)
+            # Results from a different suite can't be paired — start over
+            if board.get('suite') == self._suite():
+                self.board = board
+
+    def _suite(self):
+        return {'n_episodes': self.n_episodes, 'greedy': self.greedy, 'seed': self.seed}
+
+    def _kills_path(self, name):
+        return os.path.join(self.dir, name.replace('.pth', '.kills.npy'))
+
+    def _save_board(self):
+        tmp = self.board_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.board, f, indent=1)
+        os.replace(tmp, self.board_path)
+
+    def pending(self):
+        """Checkpoints in save_dir not yet on the leaderboard, oldest first."""
+        paths = sorted(glob.glob(os.path.join(self.save_dir, CKPT_GLOB)), key=_update_no)
+        return [p for p in paths if os.path.basename(p) not in self.board['entries']]
+
+    def play(self, path):
+        """Evaluate one checkpoint, enter it, and promote it if it beats the champion."""
+        name = os.path.basename(path)
+        res  = evaluate_checkpoint(path, self.n_episodes, self.greedy, seed=self.seed,
+                                   n_workers=self.n_workers, device='cpu')
+        kills = res['games']['kills']
+        np.save(self._kills_path(name), kills)
+        print(format_result(res))
+
+        entry = {'update':     _update_no(path),
+                 'kills_mean': res['kills_mean'], 'kills_ci': list(res['kills_ci']),
+                 'score_mean': res['score_mean'],
+                 'clear_rate': res['clear_rate'], 'clear_ci': list(res['clear_ci']),
+                 'promoted':   False}
+
+        champ = self.board['champion']
+        if champ is None:
+            entry['promoted'] = True
+            verdict = "first entrant — champion by default"
+        else:
+            diff, p = paired_test(kills, np.load(self._kills_path(champ)))
+            entry['vs_champion'] = {'champion': champ, 'kills_diff': diff, 'p': p}
+            entry['promoted']    = p < self.alpha
+            verdict = (f"vs {champ}: Δkills={diff:+.2f}  p={p:.4f}  → "
+                       f"{'PROMOTED' if entry['promoted'] else 'not significant'}")
+        print(f"    {verdict}")
+
+        if entry['promoted']:
+            tmp = self.best_path + '.tmp'
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, self.best_path)
+            # Weights-only artifact after the checkpoint, so it is never older
+            src_w, dst_w = weights_path(path), weights_path(self.best_path)
+            if os.path.exists(src_w):
+                shutil.copyfile(src_w, dst_w + '.tmp')
+                os.replace(dst_w + '.tmp', dst_w)
+            self.board['champion'] = name
+            print(f"  [Tournament] {name} → {os.path.basename(self.best_path)}")
+
+        self.board['entries'][name] = entry
+        self._save_board()
+        return entry
+
+    def leaderboard(self):
+        """Entries best first (by mean kills)."""
+        rows = sorted(self.board['entries'].items(), key=lambda kv: kv[1]['kills_mean'],
+                      reverse=True)
+        return rows
+
+    def print_leaderboard(self, top=10):
+        print(f"\n{'─' * 65}\n  LEADERBOARD  ({self.n_episodes} games, seed {self.seed})\n{'─' * 65}")
+        for i, (name, e) in enumerate(self.leaderboard()[:top], 1):
+            lo, hi = e['kills_ci']
+            star   = '  ← champion' if name == self.board['champion'] else ''
+            print(f"  {i:>3}. {name:<32} kills={e['kills_mean']:5.2f} [{lo:5.2f}, {hi:5.2f}]  "
+                  f"clear={e['clear_rate'] * 100:5.1f}%{star}")
+        print(f"{'─' * 65}\n")
+
+    def run(self, once=False, poll_secs=POLL_SECS, stop=None):
+        """
+        Score pending checkpoints; keep watching unless once=True.
+        stop: threading.Event — when set, finish what's pending and return.
+        """
+        while True:
+            finishing = once or (stop is not None and stop.is_set())
+            todo = self.pending()
+            for path in todo:
+                self.play(path)
+            if todo:
+                self.print_leaderboard()
+            if finishing:
+                return
+            if stop is not None:
+                stop.wait(poll_secs)
+            else:
+                time.sleep(poll_secs)
+
+
+def _stdin_closed_event():
+    """Event set when stdin hits EOF — i.e. the launching trainer has exited."""
+    import threading
+    ev = threading.Event()
+
+    def _watch():
+        try:
+            sys.stdin.read()
+        finally:
+            ev.set()
+
+    threading.Thread(target=_watch, daemon=True).start()
+    return ev
+
+
+def launch_tournament(save_dir=SAVE_DIR, best_path=BEST_PATH):
+    """
+    Start the tournament as its own Python process. It holds the read end of
+    a pipe from the trainer: when the trainer exits (cleanly or not) the pipe
+    closes, and the tournament scores any last checkpoints and exits.
+    """
+    script = os.path.abspath(__file__)
+    return subprocess.Popen([sys.executable, script, '--dir', save_dir, '--best', best_path,
+                             '--until-stdin-closes'],
+                            cwd=os.path.dirname(script), stdin=subprocess.PIPE)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    def _arg(flag, default):
+        return args[args.index(flag) + 1] if flag in args else default
+
+    t = Tournament(save_dir=_arg('--dir', SAVE_DIR), best_path=_arg('--best', BEST_PATH))
+    stop = _stdin_closed_event() if '--until-stdin-closes' in args else None
+    t.run(once='--once' in args, stop=stop)
@@ -48,7 +48,13 @@ import pygame
 
 from game_env_v7 import SpaceInvadersEnv, REWARDS
 from ppo_agent_v9 import (ActorCritic, RolloutBuffer, HallOfFame,
-                           ACTION_NAMES, SEQ_LEN, LSTM_HIDDEN)
+                           ACTION_NAMES, SEQ_LEN, LSTM_HIDDEN,
+                           quantized_copy, policy_kl, ppo_loss, save_weights)
+from snapshot_stream_v9 import SnapshotRing, launch_viewer
+from features_v7 import RunningNorm, feature_schema, check_schema
+from trajectory_recorder_v9 import TrajectoryRecorder
+from metrics_store_v9 import MetricsWriter
+from tournament_v9 import launch_tournament
 
 # =============================================================================
 # CONFIG  — all tunable knobs in one place
@@ -60,6 +66,24 @@ SEQ_LEN         = SEQ_LEN   # 2560 — eight full alien oscillation cycles (~ful
 SEQS_PER_BATCH  = 4         # sequences per mini-batch: 4 × 2560 = 10240 steps
                              # 1048576/2560 = 409 seqs → 409/4 ≈ 102 batches per epoch
 PPO_EPOCHS      = 6         # gradient epochs over each rollout
+HIDDEN_EVERY    = 0         # >0: store the rollout (h, c) every N steps and start each
+                             # training sequence from it instead of zeros
+BURN_IN         = 0         # steps replayed (no gradient) before each sequence to refresh
+                             # the stored state — multiple of HIDDEN_EVERY.
+                             # e.g. HIDDEN_EVERY=64, BURN_IN=64, SEQ_LEN=320, SEQS_PER_BATCH=32
+LSTM_CHECKPOINT = 0         # >0: activation checkpointing every N LSTM steps in backward —
+                             # ~10× less LSTM activation memory for one extra forward pass,
+                             # so SEQS_PER_BATCH can grow (see benchmark_v9.py lstm)
+EPISODE_ALIGNED = False     # cut training sequences at every done (no hidden state carried
+                             # across an episode end); variable-length chunks are sorted by
+                             # length into padded (B, T) batches and the loss is masked
+QUANTIZED_ROLLOUT = False   # collect with an int8 CPU copy of the policy (Linear layers
+                             # dynamically quantized), refreshed after every update
+QUANT_MAX_KL    = 0.01      # KL(fp32 || int8) on the last rollout above this → next
+                             # rollout falls back to the fp32 net
+GRID_ENCODER    = 'conv'    # 'conv' | 'conv_lut' (same weights, conv1 as a per-cell table)
+                             # | 'embed' (per-cell embedding sum, new weights — fresh run).
+                             # See benchmark_v9.py grid
 
 # ── PPO algorithm ─────────────────────────────────────────────────────────────
 GAMMA        = 0.99
@@ -77,9 +101,20 @@ CRITIC_LR_MULT  = 4         # critic head gets 4× LR
 ALIVE_BONUS     = 0.003     # per step
 WASTED_SHOT_PEN = REWARDS['wasted_shot']   # -2.0
 
+# ── Observation pipeline ──────────────────────────────────────────────────────
+NORMALISE_CONTEXT = False   # running mean/std on the 24 context features.
+                             # Stored in checkpoints — resuming with a different
+                             # setting fails fast (the net saw different inputs).
+
 # ── Training control ──────────────────────────────────────────────────────────
 RENDER_EVERY    = 10
+VIEWER_PROCESS  = True      # watched episodes stream snapshots to a separate viewer
+                             # process; False = old inline env.render()
 SAVE_EVERY      = 5
+EVAL_GATE       = False     # best_model_v9.pth chosen by tournament_v9.py (fixed-seed
+                             # eval of each periodic checkpoint, paired significance
+                             # test) instead of by a new avg50 high
+RECORD_TRAJECTORIES = False # every step of every episode → memmapped columns in TRAJ_DIR
 MAX_UPDATES     = 10_000
 
 # ── Paths ─────────────────────────────────────────────────────────────────────
@@ -89,6 +124,8 @@ FINAL_PATH      = f'{SAVE_DIR}/final_model_v9.pth'
 CKPT_PATTERN    = f'{SAVE_DIR}/checkpoint_v9_upd{{n}}.pth'
 LOG_PATH        = f'{SAVE_DIR}/training_log_v9.csv'
 DIAG_PATH       = f'{SAVE_DIR}/diag_log_v9.csv'
+TRAJ_DIR        = f'{SAVE_DIR}/trajectories_v9'
+METRICS_DIR     = f'{SAVE_DIR}/metrics_v9'      # columnar copy of both CSVs (metrics_store_v9)
 
 # v8 paths — for warm-start weight transfer
 BEST_PATH_V8    = f'{SAVE_DIR}/best_model_v8.pth'
@@ -113,8 +150,16 @@ device = get_device()
 # INIT
 # =============================================================================
 
-env = SpaceInvadersEnv(render_mode=True)
-net = ActorCritic().to(device)
+env = SpaceInvadersEnv(render_mode=not VIEWER_PROCESS)
+net = ActorCritic(GRID_ENCODER).to(device)
+net.lstm.checkpoint_every = LSTM_CHECKPOINT
+
+# Snapshot ring + viewer process (render-on-demand, never blocks the rollout)
+ring   = SnapshotRing.create() if VIEWER_PROCESS else None
+viewer = launch_viewer(ring) if ring is not None else None
+
+# Checkpoint tournament — scores every periodic checkpoint, owns BEST_PATH
+tournament = launch_tournament(SAVE_DIR, BEST_PATH) if EVAL_GATE else None
 
 # Separate LR for critic head
 _critic_ids  = {id(p) for p in net.critic_head.parameters()}
@@ -124,8 +169,9 @@ opt = optim.Adam([
     {'params': net.critic_head.parameters(), 'lr': LR * CRITIC_LR_MULT},
 ])
 
-buf = RolloutBuffer(ROLLOUT_STEPS, seq_len=SEQ_LEN)
+buf = RolloutBuffer(ROLLOUT_STEPS, seq_len=SEQ_LEN, hidden_every=HIDDEN_EVERY)
 hof = HallOfFame(max_episodes=40)
+ctx_norm = RunningNorm() if NORMALISE_CONTEXT else None
 
 # Tracking
 ep_num           = 0
@@ -142,7 +188,8 @@ print(f"  Space Invaders PPO v9 — LSTM({LSTM_HIDDEN}) temporal memory")
 print(f"  Rollout: {ROLLOUT_STEPS:,} steps/update  |  SeqLen: {SEQ_LEN}  |  Epochs: {PPO_EPOCHS}")
 print(f"  Seqs/batch: {SEQS_PER_BATCH} × {SEQ_LEN} = {SEQS_PER_BATCH*SEQ_LEN} steps")
 print(f"  Alive bonus: {ALIVE_BONUS}/step  |  Wasted shot: {WASTED_SHOT_PEN}")
-print(f"  Render every {RENDER_EVERY} episodes  |  Press Q to quit")
+print(f"  Render every {RENDER_EVERY} episodes"
+      f"{' (viewer process)' if VIEWER_PROCESS else ''}  |  Press Q to quit")
 print(f"{'='*65}\n")
 
 # =============================================================================
@@ -150,6 +197,8 @@ print(f"{'='*65}\n")
 # =============================================================================
 
 def save_checkpoint(path, tag=''):
+    # Write-then-rename: the tournament never sees a half-written checkpoint
+    tmp = path + '.tmp'
     torch.save({
         'net':                   net.state_dict(),
         'optimizer':             opt.state_dict(),
@@ -162,13 +211,31 @@ def save_checkpoint(path, tag=''):
         'best_avg50_kills':      best_avg50_kills,
         'hof_kill_episodes':     hof.kill_hof,
         'hof_reward_episodes':   hof.reward_hof,
-    }, path)
+        'feature_schema':        feature_schema(),
+        'ctx_norm':              ctx_norm.state_dict() if ctx_norm is not None else None,
+        'grid_encoder':          net.grid_encoder,
+    }, tmp)
+    os.replace(tmp, path)
+    # Small weights-only copy for watch / evaluate — written second, so never older
+    save_weights(path, net, ctx_norm, update_num=update_num, ep_num=ep_num,
+                 total_steps=total_steps, best_avg50=float(best_avg50),
+                 best_avg50_kills=float(best_avg50_kills), feature_schema=feature_schema(),
+                 source=os.path.basename(path))
     print(f"  [Saved{tag} → {os.path.basename(path)}]")
 
 
 def load_checkpoint(path):
     global ep_num, update_num, total_steps, best_avg50, best_avg50_kills
     ck = torch.load(path, map_location=device, weights_only=False)
+    check_schema(ck.get('feature_schema'), os.path.basename(path))
+    if (ck.get('ctx_norm') is not None) != (ctx_norm is not None):
+        raise ValueError(f"{os.path.basename(path)} was trained with NORMALISE_CONTEXT="
+                         f"{ck.get('ctx_norm') is not None} — set the same value to resume")
+    if ctx_norm is not None:
+        ctx_norm.load_state_dict(ck['ctx_norm'])
+    if (ck.get('grid_encoder', 'conv') == 'embed') != (GRID_ENCODER == 'embed'):
+        raise ValueError(f"{os.path.basename(path)} has grid_encoder="
+                         f"{ck.get('grid_encoder', 'conv')!r} — incompatible with {GRID_ENCODER!r}")
     net.load_state_dict(ck['net'])
     try:
         opt.load_state_dict(ck['optimizer'])
@@ -213,7 +280,18 @@ def warm_start_from_v8(v8_path):
     print(f"  [Warm-start] LSTM starts fresh with orthogonal init.")
 
 
+def observe(raw_state):
+    """Env state → network input (running context normalisation, if enabled)."""
+    if ctx_norm is None:
+        return raw_state
+    ctx_norm.update(raw_state)
+    return ctx_norm(raw_state)
+
+
 def check_quit():
+    if ring is not None and ring.stop_requested():
+        print("\n  [Viewer closed — stopping cleanly]")
+        return False
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             return False
@@ -317,11 +395,24 @@ if _diag_new:
                           'start_p_x', 'start_alien_dir', 'start_swarm_drift'])
     diag_file.flush()
 
+# Columnar metrics store — same rows as both CSVs, a fresh run gets a new run id
+metrics = MetricsWriter(METRICS_DIR, new_run=update_num == 0)
+
+# Trajectory recorder — optional, appends across runs like the diag CSV
+recorder = TrajectoryRecorder(TRAJ_DIR) if RECORD_TRAJECTORIES else None
+
+
+def record_steps(s, e):
+    """Copy buf[s:e] into the recorder's open episode (one slice per column)."""
+    if recorder is not None:
+        recorder.add_steps(buf.states[s:e], buf.actions[s:e], buf.rewards[s:e],
+                           buf.values[s:e], buf.log_probs[s:e], buf.dones[s:e])
+
 # =============================================================================
 # MAIN TRAINING LOOP
 # =============================================================================
 
-state = env.reset()
+state = observe(env.reset())
 ep_start_p_x    = env.p_x
 ep_start_dir    = 1 if env.aliens[0]['speed'] > 0 else -1
 ep_start_drift  = env._swarm_drift()
@@ -333,285 +424,341 @@ ep_start_step = 0
 ep_records    = []
 ep_kills_list = []
 
+# ── Rollout policy — the learner itself, or its int8 CPU copy ─────────────────
+if QUANTIZED_ROLLOUT:
+    rollout_net, rollout_device = quantized_copy(net), torch.device('cpu')
+else:
+    rollout_net, rollout_device = net, device
+
 # ── Hidden state — carries through the episode, resets at done ────────────────
-hidden = net.init_hidden(batch_size=1, device=device)
-
-while running and update_num < MAX_UPDATES:
-
-    # ── Rollout collection ────────────────────────────────────────────────────
-    buf.reset()
-    ep_records    = []
-    ep_kills_list = []
-    ep_start_step = 0
-    # Reset hidden at start of rollout (clean slate — not mid-episode)
-    hidden = net.init_hidden(batch_size=1, device=device)
-    t_rollout_start = time.time()
-
-    for step in range(ROLLOUT_STEPS):
-
-        if step % 500 == 0:
-            pygame.event.pump()
-        if step % 5000 == 0:
-            if not check_quit():
-                running = False
-                break
-
-        # Get action — hidden state flows forward step-by-step
-        state_t = torch.FloatTensor(state).unsqueeze(0).to(device)
-        action, log_prob, value, hidden = net.get_action(state_t, hidden)
-
-        # Step environment
-        next_state, reward, done, info = env.step(action)
-
-        # Reward shaping
-        if info['wasted_shot']:
-            reward += WASTED_SHOT_PEN
-        reward += ALIVE_BONUS
-
-        buf.add(state, action, reward, value, log_prob, done)
-        state = next_state
-        total_steps += 1
-
-        ep_score += reward
-        ep_steps += 1
-        if info.get('resolution_type') == 'kill':
-            ep_kills += 1
-
-        # Render
-        is_rendered = (RENDER_EVERY > 0 and ep_num % RENDER_EVERY == 0)
-        if is_rendered:
-            col_counts = [
-                sum(1 for a in env.aliens if a['alive'] and a['col'] == c)
-                for c in range(8)
-            ]
-            overlay = {
-                'episode':       ep_num,
-                'epsilon':       0.0,
-                'buffer_events': buf.ptr,
-                'warmup_done':   True,
-                'train_steps':   total_steps,
-                'best_score':    int(best_avg50),
-                'avg50':         np.mean(score_history) if score_history else 0.0,
-                'col_counts':    col_counts,
-                'recent_scores': list(score_history),
-            }
-            env.render(fps_cap=0, overlay=overlay)
-
-        # Episode end
-        if done:
-            s, e = ep_start_step, buf.ptr
-            ep_records.append((s, e, ep_score))
+hidden = rollout_net.init_hidden(batch_size=1, device=rollout_device)
+
+# The viewer is stopped and the snapshot ring unlinked however the loop ends
+try:
+    while running and update_num < MAX_UPDATES:
+
+        # ── Rollout collection ────────────────────────────────────────────────
+        buf.reset()
+        ep_records    = []
+        ep_kills_list = []
+        ep_start_step = 0
+        # Reset hidden at start of rollout (clean slate — not mid-episode)
+        hidden = rollout_net.init_hidden(batch_size=1, device=rollout_device)
+        t_rollout_start = time.time()
+
+        for step in range(ROLLOUT_STEPS):
+
+            if step % 500 == 0:
+                pygame.event.pump()
+            if step % 5000 == 0:
+                if not check_quit():
+                    running = False
+                    break
+
+            # Get action — hidden state flows forward step-by-step
+            state_t = torch.FloatTensor(state).unsqueeze(0).to(rollout_device)
+            buf.record_hidden(hidden)
+            action, log_prob, value, hidden = rollout_net.get_action(state_t, hidden)
+
+            # Step environment
+            next_state, reward, done, info = env.step(action)
+
+            # Reward shaping
+            if info['wasted_shot']:
+                reward += WASTED_SHOT_PEN
+            reward += ALIVE_BONUS
+
+            buf.add(state, action, reward, value, log_prob, done)
+            state = observe(next_state)
+            total_steps += 1
+
+            ep_score += reward
+            ep_steps += 1
+            if info.get('resolution_type') == 'kill':
+                ep_kills += 1
+
+            # Render
+            is_rendered = (RENDER_EVERY > 0 and ep_num % RENDER_EVERY == 0)
+            if is_rendered and ring is not None:
+                ring.push(env)
+            elif is_rendered:
+                col_counts = [
+                    sum(1 for a in env.aliens if a['alive'] and a['col'] == c)
+                    for c in range(8)
+                ]
+                overlay = {
+                    'episode':       ep_num,
+                    'epsilon':       0.0,
+                    'buffer_events': buf.ptr,
+                    'warmup_done':   True,
+                    'train_steps':   total_steps,
+                    'best_score':    int(best_avg50),
+                    'avg50':         np.mean(score_history) if score_history else 0.0,
+                    'col_counts':    col_counts,
+                    'recent_scores': list(score_history),
+                }
+                env.render(fps_cap=0, overlay=overlay)
+
+            # Episode end
+            if done:
+                s, e = ep_start_step, buf.ptr
+                ep_records.append((s, e, ep_score))
+                ep_kills_list.append(ep_kills)
+                hof.offer(buf.states[s:e], buf.actions[s:e], buf.log_probs[s:e],
+                          buf.rewards[s:e], buf.dones[s:e], ep_kills, ep_score)
+                ep_start_step = buf.ptr
+                score_history.append(ep_score)
+                kill_history.append(ep_kills)
+                console_ep(ep_score, ep_kills, ep_steps, is_rendered)
+                diag_writer.writerow([update_num, ep_num, round(ep_score, 1), ep_kills, ep_steps,
+                                       round(ep_start_p_x, 1), ep_start_dir, round(ep_start_drift, 1)])
+                diag_file.flush()
+                metrics.episode(update=update_num, ep_num=ep_num, ep_score=ep_score,
+                                ep_kills=ep_kills, ep_steps=ep_steps, start_p_x=ep_start_p_x,
+                                start_alien_dir=ep_start_dir, start_swarm_drift=ep_start_drift)
+                if recorder is not None:
+                    record_steps(s, e)
+                    recorder.end_episode(update=update_num, ep_num=ep_num,
+                                         score=ep_score, kills=ep_kills)
+                ep_num   += 1
+                ep_score  = 0.0
+                ep_kills  = 0
+                ep_steps  = 0
+                state          = observe(env.reset())
+                ep_start_p_x   = env.p_x
+                ep_start_dir   = 1 if env.aliens[0]['speed'] > 0 else -1
+                ep_start_drift = env._swarm_drift()
+                if ring is not None:
+                    ring.set_overlay(episode=ep_num, update=update_num,
+                                     avg50=np.mean(score_history) if score_history else 0.0,
+                                     best_avg50=best_avg50, total_steps=total_steps,
+                                     buffer_events=buf.ptr)
+                # ── Reset LSTM hidden state at episode boundary ─────────────
+                hidden = rollout_net.init_hidden(batch_size=1, device=rollout_device)
+
+        if not running:
+            break
+
+        secs_rollout = time.time() - t_rollout_start
+
+        # Partial episode at rollout end
+        if ep_start_step < buf.ptr:
+            ep_records.append((ep_start_step, buf.ptr, ep_score))
             ep_kills_list.append(ep_kills)
-            hof.offer(buf.states[s:e], buf.actions[s:e], buf.log_probs[s:e],
-                      buf.rewards[s:e], buf.dones[s:e], ep_kills, ep_score)
-            ep_start_step = buf.ptr
-            score_history.append(ep_score)
-            kill_history.append(ep_kills)
-            console_ep(ep_score, ep_kills, ep_steps, is_rendered)
-            diag_writer.writerow([update_num, ep_num, round(ep_score, 1), ep_kills, ep_steps,
-                                   round(ep_start_p_x, 1), ep_start_dir, round(ep_start_drift, 1)])
-            diag_file.flush()
-            ep_num   += 1
-            ep_score  = 0.0
-            ep_kills  = 0
-            ep_steps  = 0
-            state          = env.reset()
-            ep_start_p_x   = env.p_x
-            ep_start_dir   = 1 if env.aliens[0]['speed'] > 0 else -1
-            ep_start_drift = env._swarm_drift()
-            # ── Reset LSTM hidden state at episode boundary ─────────────────
-            hidden = net.init_hidden(batch_size=1, device=device)
-
-    if not running:
-        break
-
-    secs_rollout = time.time() - t_rollout_start
-
-    # Partial episode at rollout end
-    if ep_start_step < buf.ptr:
-        ep_records.append((ep_start_step, buf.ptr, ep_score))
-        ep_kills_list.append(ep_kills)
-
-    # ── GAE ───────────────────────────────────────────────────────────────────
-    state_t = torch.FloatTensor(state).unsqueeze(0).to(device)
-    with torch.no_grad():
-        # Bootstrap with a single-step LSTM forward (hidden carries from rollout)
-        x = state_t.unsqueeze(1)
-        trunk = net._backbone(x)
-        lstm_out, _ = net.lstm(trunk, hidden)
-        last_value = net.critic_head(lstm_out.squeeze(1)).item()
-
-    buf.compute_gae(last_value, gamma=GAMMA, gae_lambda=GAE_LAMBDA)
-
-    # ── Calculating screen ────────────────────────────────────────────────────
-    t_update_start = time.time()
-    net.train()
-
-    # Pre-calculate total batches so we can show a progress bar
-    _n_seqs         = buf.ptr // SEQ_LEN
-    _batches_per_ep = max(1, _n_seqs // SEQS_PER_BATCH)
-    _total_batches  = PPO_EPOCHS * _batches_per_ep
-    _avg  = float(np.mean(score_history)) if score_history else 0.0
-    _avgk = float(np.mean(kill_history))  if kill_history  else 0.0
-
-    _disp = pygame.display.get_surface()
-    _f1   = pygame.font.SysFont(None, 52) if _disp else None
-    _f2   = pygame.font.SysFont(None, 30) if _disp else None
-    _bar_w = 680
-
-    def _draw_progress(batch_num, epoch_num):
-        if not _disp:
-            return
-        pct     = batch_num / max(_total_batches, 1)
-        elapsed = time.time() - t_update_start
-        eta_s   = (elapsed / max(pct, 0.001)) * (1.0 - pct)
-        eta_min = int(eta_s // 60)
-        eta_sec = int(eta_s % 60)
-
-        _disp.fill((10, 10, 20))
-        _disp.blit(_f1.render(f"PPO v9  —  Update {update_num + 1}  calculating...",
-                              True, (80, 200, 100)), (60, 220))
-        _disp.blit(_f2.render(f"avg50={_avg:.1f}   avg50_kills={_avgk:.1f}   ep={ep_num}",
-                              True, (160, 160, 160)), (60, 285))
-        _disp.blit(_f2.render(f"LSTM({LSTM_HIDDEN})  SeqLen={SEQ_LEN}  {_n_seqs} seqs",
-                              True, (100, 100, 180)), (60, 315))
-        # Progress bar
-        bar_fill = int(_bar_w * pct)
-        pygame.draw.rect(_disp, (40, 40, 40),  (60, 360, _bar_w, 28))
-        pygame.draw.rect(_disp, (60, 180, 90), (60, 360, bar_fill, 28))
-        pygame.draw.rect(_disp, (80, 80, 80),  (60, 360, _bar_w, 28), 1)
-        _disp.blit(_f2.render(
-            f"Epoch {epoch_num}/{PPO_EPOCHS}   batch {batch_num}/{_total_batches}"
-            f"   {pct*100:.1f}%   ETA {eta_min}m {eta_sec:02d}s",
-            True, (200, 200, 200)), (60, 400))
-        _disp.blit(_f2.render(
-            f"elapsed {int(elapsed//60)}m {int(elapsed%60):02d}s",
-            True, (120, 120, 120)), (60, 430))
-        pygame.display.flip()
-
-    _draw_progress(0, 1)
-    pygame.event.pump()
-
-    # ── PPO update — sequence mini-batches ────────────────────────────────────
-    policy_losses, value_losses, entropies = [], [], []
-    _batch_count = 0
-
-    for epoch in range(PPO_EPOCHS):
-        for batch in buf.get_sequences(SEQS_PER_BATCH, device, ep_records=ep_records):
-            states_b, actions_b, old_lp_b, adv_b, returns_b = batch
-
-            # Flatten seq dimension for advantage normalisation
-            # adv_b shape: (B, seq_len) → normalise over all B*seq_len values
+            record_steps(ep_start_step, buf.ptr)   # continues in the next rollout
+        if recorder is not None:
+            recorder.flush()
+
+        # ── GAE ───────────────────────────────────────────────────────────────
+        state_t = torch.FloatTensor(state).unsqueeze(0).to(rollout_device)
+        with torch.no_grad():
+            # Bootstrap with a single-step LSTM forward (hidden carries from rollout)
+            x = state_t.unsqueeze(1)
+            trunk = rollout_net._backbone(x)
+            lstm_out, _ = rollout_net.lstm(trunk, hidden)
+            last_value = rollout_net.critic_head(lstm_out.squeeze(1)).item()
+
+        # Int8 rollout: how far were the log-probs PPO will divide by from fp32?
+        quant_kl = None
+        if rollout_net is not net:
+            quant_kl, quant_dlp = policy_kl(net, rollout_net, buf.states[:min(buf.ptr, SEQ_LEN)],
+                                            device, rollout_device)
+
+        buf.compute_gae(last_value, gamma=GAMMA, gae_lambda=GAE_LAMBDA)
+
+        # ── Calculating screen ────────────────────────────────────────────────
+        t_update_start = time.time()
+        net.train()
+
+        # Pre-calculate total batches so we can show a progress bar
+        _n_seqs         = len(buf.episode_chunks()[0]) if EPISODE_ALIGNED else buf.ptr // SEQ_LEN
+        _batches_per_ep = max(1, _n_seqs // SEQS_PER_BATCH)
+        _total_batches  = PPO_EPOCHS * _batches_per_ep
+        _avg  = float(np.mean(score_history)) if score_history else 0.0
+        _avgk = float(np.mean(kill_history))  if kill_history  else 0.0
+
+        _disp = pygame.display.get_surface()
+        _f1   = pygame.font.SysFont(None, 52) if _disp else None
+        _f2   = pygame.font.SysFont(None, 30) if _disp else None
+        _bar_w = 680
+
+        def _draw_progress(batch_num, epoch_num):
+            pct     = batch_num / max(_total_batches, 1)
+            if ring is not None:
+                ring.set_overlay(progress=pct)
+            if not _disp:
+                return
+            elapsed = time.time() - t_update_start
+            eta_s   = (elapsed / max(pct, 0.001)) * (1.0 - pct)
+            eta_min = int(eta_s // 60)
+            eta_sec = int(eta_s % 60)
+
+            _disp.fill((10, 10, 20))
+            _disp.blit(_f1.render(f"PPO v9  —  Update {update_num + 1}  calculating...",
+                                  True, (80, 200, 100)), (60, 220))
+            _disp.blit(_f2.render(f"avg50={_avg:.1f}   avg50_kills={_avgk:.1f}   ep={ep_num}",
+                                  True, (160, 160, 160)), (60, 285))
+            _disp.blit(_f2.render(f"LSTM({LSTM_HIDDEN})  SeqLen={SEQ_LEN}  {_n_seqs} seqs",
+                                  True, (100, 100, 180)), (60, 315))
+            # Progress bar
+            bar_fill = int(_bar_w * pct)
+            pygame.draw.rect(_disp, (40, 40, 40),  (60, 360, _bar_w, 28))
+            pygame.draw.rect(_disp, (60, 180, 90), (60, 360, bar_fill, 28))
+            pygame.draw.rect(_disp, (80, 80, 80),  (60, 360, _bar_w, 28), 1)
+            _disp.blit(_f2.render(
+                f"Epoch {epoch_num}/{PPO_EPOCHS}   batch {batch_num}/{_total_batches}"
+                f"   {pct*100:.1f}%   ETA {eta_min}m {eta_sec:02d}s",
+                True, (200, 200, 200)), (60, 400))
+            _disp.blit(_f2.render(
+                f"elapsed {int(elapsed//60)}m {int(elapsed%60):02d}s",
+                True, (120, 120, 120)), (60, 430))
+            pygame.display.flip()
+
+        _draw_progress(0, 1)
+        pygame.event.pump()
+
+        # ── PPO update — sequence mini-batches ────────────────────────────────
+        policy_losses, value_losses, entropies = [], [], []
+        _batch_count = 0
+
+        for epoch in range(PPO_EPOCHS):
+            if EPISODE_ALIGNED:
+                batches = buf.get_episode_sequences(SEQS_PER_BATCH, device, ep_records=ep_records,
+                                                    net=net, burn_in=BURN_IN)
+            else:
+                batches = buf.get_sequences(SEQS_PER_BATCH, device, ep_records=ep_records,
+                                            net=net, burn_in=BURN_IN)
+            for batch in batches:
+                states_b, actions_b, old_lp_b, adv_b, returns_b, init_h = batch[:6]
+                mask_b = batch[6] if len(batch) > 6 else None   # episode-aligned: padding mask
+
+                # init_h: zeros (truncated BPTT) or the stored rollout state + burn-in
+
+                # Re-evaluate stored sequences with current policy + LSTM
+                new_lp, values_b, entropy = net.evaluate(states_b, actions_b, init_h)
+
+                # PPO clipped surrogate — advantages normalised over the (unmasked) batch
+                loss, policy_loss, value_loss, ent_mean = ppo_loss(
+                    new_lp, values_b, entropy, old_lp_b, adv_b, returns_b, mask_b,
+                    clip_eps=CLIP_EPS, value_coef=VALUE_COEF, entropy_coef=ENTROPY_COEF)
+
+                opt.zero_grad()
+                loss.backward()
+                clip_grad_norm_(net.parameters(), MAX_GRAD_NORM)
+                opt.step()
+
+                policy_losses.append(policy_loss.item())
+                value_losses.append(value_loss.item())
+                entropies.append(ent_mean.item())
+                _batch_count += 1
+                _draw_progress(_batch_count, epoch + 1)
+                pygame.event.pump()
+
+        # ── Hall of Fame pass ─────────────────────────────────────────────────
+        hof_pl, hof_vl = [], []
+        for batch in hof.get_batches(net, device, SEQ_LEN, SEQS_PER_BATCH,
+                                      gamma=GAMMA, gae_lambda=GAE_LAMBDA):
+            states_b, actions_b, old_lp_b, adv_b, returns_b, hof_hidden = batch
+
             adv_flat = adv_b.reshape(-1)
             adv_norm = (adv_flat - adv_flat.mean()) / (adv_flat.std() + 1e-8)
             adv_b_norm = adv_norm.reshape(adv_b.shape)
 
-            # Zero hidden state at sequence start (truncated BPTT)
-            init_h = net.init_hidden(states_b.shape[0], device)
-
-            # Re-evaluate stored sequences with current policy + LSTM
-            new_lp, values_b, entropy = net.evaluate(states_b, actions_b, init_h)
+            new_lp, values_b, entropy = net.evaluate(states_b, actions_b, hof_hidden)
 
-            # Flatten for PPO loss
             old_lp_flat   = old_lp_b.reshape(-1)
             adv_flat_norm = adv_b_norm.reshape(-1)
             returns_flat  = returns_b.reshape(-1)
 
-            # PPO clipped surrogate
-            ratio  = (new_lp - old_lp_flat).exp()
+            ratio  = (new_lp - old_lp_b.reshape(-1)).exp()
             surr1  = ratio * adv_flat_norm
             surr2  = ratio.clamp(1.0 - CLIP_EPS, 1.0 + CLIP_EPS) * adv_flat_norm
-            policy_loss = -torch.min(surr1, surr2).mean()
-
-            value_loss = F.mse_loss(values_b, returns_flat)
-
-            loss = policy_loss + VALUE_COEF * value_loss - ENTROPY_COEF * entropy.mean()
+            pl     = -torch.min(surr1, surr2).mean()
+            vl     = F.mse_loss(values_b, returns_flat)
+            loss   = pl + VALUE_COEF * vl - ENTROPY_COEF * entropy.mean()
 
             opt.zero_grad()
             loss.backward()
             clip_grad_norm_(net.parameters(), MAX_GRAD_NORM)
             opt.step()
-
-            policy_losses.append(policy_loss.item())
-            value_losses.append(value_loss.item())
-            entropies.append(entropy.mean().item())
-            _batch_count += 1
-            _draw_progress(_batch_count, epoch + 1)
-            pygame.event.pump()
-
-    # ── Hall of Fame pass ─────────────────────────────────────────────────────
-    hof_pl, hof_vl = [], []
-    for batch in hof.get_batches(net, device, SEQ_LEN, SEQS_PER_BATCH,
-                                  gamma=GAMMA, gae_lambda=GAE_LAMBDA):
-        states_b, actions_b, old_lp_b, adv_b, returns_b, hof_hidden = batch
-
-        adv_flat = adv_b.reshape(-1)
-        adv_norm = (adv_flat - adv_flat.mean()) / (adv_flat.std() + 1e-8)
-        adv_b_norm = adv_norm.reshape(adv_b.shape)
-
-        new_lp, values_b, entropy = net.evaluate(states_b, actions_b, hof_hidden)
-
-        old_lp_flat   = old_lp_b.reshape(-1)
-        adv_flat_norm = adv_b_norm.reshape(-1)
-        returns_flat  = returns_b.reshape(-1)
-
-        ratio  = (new_lp - old_lp_b.reshape(-1)).exp()
-        surr1  = ratio * adv_flat_norm
-        surr2  = ratio.clamp(1.0 - CLIP_EPS, 1.0 + CLIP_EPS) * adv_flat_norm
-        pl     = -torch.min(surr1, surr2).mean()
-        vl     = F.mse_loss(values_b, returns_flat)
-        loss   = pl + VALUE_COEF * vl - ENTROPY_COEF * entropy.mean()
-
-        opt.zero_grad()
-        loss.backward()
-        clip_grad_norm_(net.parameters(), MAX_GRAD_NORM)
-        opt.step()
-        hof_pl.append(pl.item())
-        hof_vl.append(vl.item())
-
-    net.eval()
-    secs_update = time.time() - t_update_start
-
-    # ── Logging ───────────────────────────────────────────────────────────────
-    update_num += 1
-    ep_scores_this_rollout = buf.episode_stats()
-    avg50  = float(np.mean(score_history)) if score_history else 0.0
-    pl     = float(np.mean(policy_losses))
-    vl     = float(np.mean(value_losses))
-    ent    = float(np.mean(entropies))
-    ep_mean_this  = float(np.mean(ep_scores_this_rollout)) if ep_scores_this_rollout else 0.0
-    rel_vl = float(np.sqrt(vl) / ep_mean_this * 100) if ep_mean_this > 0 else 0.0
-    mean_kills    = float(np.mean(ep_kills_list))   if ep_kills_list else 0.0
-    max_kills     = float(np.max(ep_kills_list))    if ep_kills_list else 0.0
-    avg50_kills   = float(np.mean(kill_history))    if kill_history  else 0.0
-    if avg50_kills > best_avg50_kills:
-        best_avg50_kills = avg50_kills
-
-    hof_str = hof.summary()
-    console_update(ep_scores_this_rollout, pl, vl, ent, secs_rollout, secs_update)
-    print(f"  {hof_str}")
-
-    log_writer.writerow([
-        update_num, ep_num, total_steps,
-        round(np.mean(ep_scores_this_rollout), 2) if ep_scores_this_rollout else 0,
-        round(np.min(ep_scores_this_rollout),  2) if ep_scores_this_rollout else 0,
-        round(np.max(ep_scores_this_rollout),  2) if ep_scores_this_rollout else 0,
-        round(avg50, 2), round(best_avg50, 2),
-        round(mean_kills, 2), round(max_kills, 1), round(avg50_kills, 2), round(best_avg50_kills, 2),
-        round(pl, 5), round(vl, 5), round(rel_vl, 3), round(ent, 5),
-        round(secs_rollout, 1), round(secs_update, 1),
-    ])
-    log_file.flush()
-
-    # ── Save best ─────────────────────────────────────────────────────────────
-    if avg50 > best_avg50:
-        best_avg50 = avg50
-        save_checkpoint(BEST_PATH, tag=' BEST')
-
-    # ── Periodic checkpoint ───────────────────────────────────────────────────
-    if update_num % SAVE_EVERY == 0:
-        ckpt = CKPT_PATTERN.format(n=update_num)
-        save_checkpoint(ckpt)
+            hof_pl.append(pl.item())
+            hof_vl.append(vl.item())
+
+        net.eval()
+        secs_update = time.time() - t_update_start
+
+        # Refresh the int8 rollout copy from the updated weights — unless the last
+        # one drifted too far, in which case collect the next rollout in fp32
+        if QUANTIZED_ROLLOUT:
+            if quant_kl is not None:
+                print(f"  [int8 rollout] KL(fp32||int8)={quant_kl:.2e}  max|Δlogπ|={quant_dlp:.3f}")
+            if quant_kl is not None and quant_kl > QUANT_MAX_KL:
+                print(f"  [int8 rollout] KL above {QUANT_MAX_KL} — next rollout uses fp32")
+                rollout_net, rollout_device = net, device
+            else:
+                rollout_net, rollout_device = quantized_copy(net), torch.device('cpu')
+        if ring is not None:
+            ring.set_overlay(progress=0.0)
+
+        # ── Logging ───────────────────────────────────────────────────────────
+        update_num += 1
+        ep_scores_this_rollout = buf.episode_stats()
+        avg50  = float(np.mean(score_history)) if score_history else 0.0
+        pl     = float(np.mean(policy_losses))
+        vl     = float(np.mean(value_losses))
+        ent    = float(np.mean(entropies))
+        ep_mean_this  = float(np.mean(ep_scores_this_rollout)) if ep_scores_this_rollout else 0.0
+        rel_vl = float(np.sqrt(vl) / ep_mean_this * 100) if ep_mean_this > 0 else 0.0
+        mean_kills    = float(np.mean(ep_kills_list))   if ep_kills_list else 0.0
+        max_kills     = float(np.max(ep_kills_list))    if ep_kills_list else 0.0
+        avg50_kills   = float(np.mean(kill_history))    if kill_history  else 0.0
+        if avg50_kills > best_avg50_kills:
+            best_avg50_kills = avg50_kills
+
+        hof_str = hof.summary()
+        console_update(ep_scores_this_rollout, pl, vl, ent, secs_rollout, secs_update)
+        print(f"  {hof_str}")
+
+        log_writer.writerow([
+            update_num, ep_num, total_steps,
+            round(np.mean(ep_scores_this_rollout), 2) if ep_scores_this_rollout else 0,
+            round(np.min(ep_scores_this_rollout),  2) if ep_scores_this_rollout else 0,
+            round(np.max(ep_scores_this_rollout),  2) if ep_scores_this_rollout else 0,
+            round(avg50, 2), round(best_avg50, 2),
+            round(mean_kills, 2), round(max_kills, 1), round(avg50_kills, 2), round(best_avg50_kills, 2),
+            round(pl, 5), round(vl, 5), round(rel_vl, 3), round(ent, 5),
+            round(secs_rollout, 1), round(secs_update, 1),
+        ])
+        log_file.flush()
+        metrics.update(
+            update=update_num, episodes=ep_num, total_steps=total_steps,
+            ep_mean=np.mean(ep_scores_this_rollout) if ep_scores_this_rollout else 0,
+            ep_min=np.min(ep_scores_this_rollout) if ep_scores_this_rollout else 0,
+            ep_max=np.max(ep_scores_this_rollout) if ep_scores_this_rollout else 0,
+            avg50=avg50, best_avg50=best_avg50, mean_kills=mean_kills, max_kills=max_kills,
+            avg50_kills=avg50_kills, best_avg50_kills=best_avg50_kills, policy_loss=pl,
+            value_loss=vl, rel_value_loss_pct=rel_vl, entropy=ent,
+            secs_rollout=secs_rollout, secs_update=secs_update)
+        metrics.flush()
+
+        # ── Save best ─────────────────────────────────────────────────────────
+        if avg50 > best_avg50:
+            best_avg50 = avg50
+            if not EVAL_GATE:
+                save_checkpoint(BEST_PATH, tag=' BEST')
+
+        # ── Periodic checkpoint ───────────────────────────────────────────────
+        if update_num % SAVE_EVERY == 0:
+            ckpt = CKPT_PATTERN.format(n=update_num)
+            save_checkpoint(ckpt)
+finally:
+    if ring is not None:
+        ring.request_stop()
+        try:
+            viewer.wait(timeout=5)
+        except Exception:
+            viewer.kill()
+        ring.close()
 
 # =============================================================================
 # CLEANUP
@@ -621,6 +768,13 @@ print("\nTraining ended.")
 save_checkpoint(FINAL_PATH, tag=' FINAL')
 log_file.close()
 diag_file.close()
+metrics.close()
+if recorder is not None:
+    recorder.close()
+if tournament is not None:
+    # Closing its stdin tells it we're done — it scores what's left, then exits
+    tournament.stdin.close()
+    print("  [Tournament still scoring the last checkpoints in the background]")
 pygame.quit()
 print("Done.")
 print(f"  Resume: run train_v9.py — it will find {os.path.basename(FINAL_PATH)} automatically.")
@@ -0,0 +1,220 @@
+# =============================================================================
+# trajectory_recorder_v9.py  —  Per-step episode recorder, memory-mapped columns
+# =============================================================================
+#
+# diag_log_v9.csv keeps one row per episode (score, kills, start position).
+# This keeps EVERY step: state, action, reward, value, log-prob, done — so
+# episodes can be analysed offline, replayed into the DQN buffer or used for
+# behaviour cloning without re-running the (slow) env.
+#
+# On disk (one directory):
+#
+#   seg_00000.states.npy     (SEGMENT_STEPS, 94) float32   ┐ one .npy per column
+#   seg_00000.actions.npy    (SEGMENT_STEPS,)    int8      │ per segment, opened
+#   seg_00000.rewards.npy    ...                           │ with open_memmap —
+#   seg_00000.values.npy                                   │ writes go straight
+#   seg_00000.log_probs.npy                                │ into the page cache
+#   seg_00000.dones.npy                                    ┘
+#   index.bin                fixed-size INDEX_DTYPE records, append-only
+#
+# An episode never straddles segments, so episode i is a plain slice
+# [start, start + length) of segment index[i]['segment'] in every column —
+# random access by episode is one memmap slice per column, zero copies.
+#
+# Writing from train_v9.py: the rollout buffer already holds each episode
+# contiguously, so add_steps() is one slice copy per column. Episodes that
+# span a rollout boundary are appended in two pieces and closed on done.
+#
+# Reading:
+#   rd = TrajectoryReader('trajectories_v9')
+#   ep = rd.episode(123)              # dict of memmap views + meta
+#   s, a, r, ns, d = rd.transitions(123)
+#
+# =============================================================================
+
+import os
+import numpy as np
+
+from features_v7 import STATE_SIZE
+
+SEGMENT_STEPS = 262_144   # ~98 MB of states per segment
+
+COLUMNS = {
+    'states':    (np.float32, (STATE_SIZE,)),
+    'actions':   (np.int8,    ()),
+    'rewards':   (np.float32, ()),
+    'values':    (np.float32, ()),
+    'log_probs': (np.float32, ()),
+    'dones':     (np.uint8,   ()),
+}
+
+INDEX_DTYPE = np.dtype([
+    ('segment', np.int32),
+    ('start',   np.int64),
+    ('length',  np.int32),
+    ('update',  np.int32),
+    ('ep_num',  np.int64),
+    ('score',   np.float32),
+    ('kills',   np.int16),
+])
+
+
+def _seg_path(root, seg, col):
+    return os.path.join(root, f'seg_{seg:05d}.{col}.npy')
+
+
+def _read_index(root):
+    path = os.path.join(root, 'index.bin')
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.fromfile(path, dtype=INDEX_DTYPE)
+
+
+# =============================================================================
+# WRITER
+# =============================================================================
+
+class TrajectoryRecorder:
+    """Append-only writer. Re-opening an existing directory continues it."""
+
+    def __init__(self, root, segment_steps=SEGMENT_STEPS):
+        self.root          = root
+        self.segment_steps = segment_steps
+        os.makedirs(root, exist_ok=True)
+
+        index = _read_index(root)
+        self.n_episodes = len(index)
+        if len(index):
+            last = index[-1]
+            self.segment = int(last['segment'])
+            self.pos     = int(last['start'] + last['length'])
+        else:
+            self.segment, self.pos = 0, 0
+
+        self._cols      = self._open_segment(self.segment)
+        self._ep_start  = self.pos     # start of the open (unfinished) episode
+        self._index_f   = open(os.path.join(root, 'index.bin'), 'ab')
+
+    def _open_segment(self, seg):
+        cols = {}
+        for name, (dtype, shape) in COLUMNS.items():
+            path = _seg_path(self.root, seg, name)
+            if os.path.exists(path):
+                cols[name] = np.load(path, mmap_mode='r+')
+            else:
+                cols[name] = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=dtype, shape=(self.segment_steps,) + shape)
+        return cols
+
+    def _next_segment(self):
+        """Move to a fresh segment, carrying the open episode's steps along."""
+        open_len = self.pos - self._ep_start
+        new_cols = self._open_segment(self.segment + 1)
+        for name, col in self._cols.items():
+            new_cols[name][:open_len] = col[self._ep_start:self.pos]
+            col.flush()
+        self._cols     = new_cols
+        self.segment  += 1
+        self._ep_start = 0
+        self.pos       = open_len
+
+    def add_steps(self, states, actions, rewards, values, log_probs, dones):
+        """Append a contiguous run of steps to the open episode."""
+        n = len(actions)
+        if n == 0:
+            return
+        if self.pos + n > self.segment_steps:
+            if self.pos - self._ep_start + n > self.segment_steps:
+                raise ValueError(f"episode longer than a segment ({self.segment_steps} steps)")
+            self._next_segment()
+        sl = slice(self.pos, self.pos + n)
+        self._cols['states'][sl]    = states
+        self._cols['actions'][sl]   = actions
+        self._cols['rewards'][sl]   = rewards
+        self._cols['values'][sl]    = values
+        self._cols['log_probs'][sl] = log_probs
+        self._cols['dones'][sl]     = dones
+        self.pos += n
+
+    def end_episode(self, update=0, ep_num=-1, score=0.0, kills=0):
+        """Close the open episode and append its index record. Returns its id."""
+        length = self.pos - self._ep_start
+        if length == 0:
+            return None
+        rec = np.zeros(1, dtype=INDEX_DTYPE)
+        rec[0] = (self.segment, self._ep_start, length, update, ep_num, score, kills)
+        self._index_f.write(rec.tobytes())
+        self._ep_start   = self.pos
+        self.n_episodes += 1
+        return self.n_episodes - 1
+
+    def add_episode(self, states, actions, rewards, values, log_probs, dones, **meta):
+        self.add_steps(states, actions, rewards, values, log_probs, dones)
+        return self.end_episode(**meta)
+
+    def flush(self):
+        for col in self._cols.values():
+            col.flush()
+        self._index_f.flush()
+
+    def close(self):
+        """Flush. Steps of an unfinished episode are not indexed (dropped)."""
+        self.flush()
+        self._index_f.close()
+        self._cols = {}
+
+
+# =============================================================================
+# READER
+# =============================================================================
+
+class TrajectoryReader:
+    """Random access by episode — every column is a read-only memmap view."""
+
+    def __init__(self, root):
+        self.root  = root
+        self.index = _read_index(root)
+        self._segs = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def refresh(self):
+        """Pick up episodes appended since opening (e.g. by a running trainer)."""
+        self.index = _read_index(self.root)
+
+    def _segment(self, seg):
+        if seg not in self._segs:
+            self._segs[seg] = {name: np.load(_seg_path(self.root, seg, name), mmap_mode='r')
+                               for name in COLUMNS}
+        return self._segs[seg]
+
+    def episode(self, i):
+        rec  = self.index[i]
+        cols = self._segment(int(rec['segment']))
+        sl   = slice(int(rec['start']), int(rec['start'] + rec['length']))
+        ep   = {name: col[sl] for name, col in cols.items()}
+        ep.update({k: rec[k].item() for k in ('update', 'ep_num', 'score', 'kills', 'length')})
+        return ep
+
+    def transitions(self, i):
+        """
+        (states, actions, rewards, next_states, dones) for episode i, ready for
+        DQNAgent.store / behaviour cloning. Last step's next_state is itself.
+        """
+        ep  = self.episode(i)
+        n   = ep['length']
+        nxt = np.minimum(np.arange(n) + 1, n - 1)
+        return (ep['states'], ep['actions'].astype(np.int64), ep['rewards'],
+                ep['states'][nxt], ep['dones'].astype(np.float32))
+
+    def select(self, min_kills=None, min_score=None, updates=None):
+        """Episode ids matching simple filters — e.g. all clears for BC."""
+        mask = np.ones(len(self.index), dtype=bool)
+        if min_kills is not None:
+            mask &= self.index['kills'] >= min_kills
+        if min_score is not None:
+            mask &= self.index['score'] >= min_score
+        if updates is not None:
+            mask &= np.isin(self.index['update'], list(updates))
+        return np.flatnonzero(mask)
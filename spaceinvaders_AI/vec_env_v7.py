@@ -0,0 +1,128 @@
+# =============================================================================
+# vec_env_v7.py  —  A batch of SpaceInvadersEnv instances behind one step()
+# =============================================================================
+#
+# VecEnv          N envs in this process. One call steps them all and returns
+#                 stacked (N, 94) states — ready for one batched forward pass.
+# SubprocVecEnv   Same interface, envs split across worker processes so env
+#                 stepping (the slow, pure-Python part) scales with cores.
+#
+# rewards: optional overrides of game_env_v7.REWARDS for these envs only.
+#
+# Both auto-reset: when env i finishes, states[i] is already the first state
+# of its next episode. The real final state is in infos[i]['terminal_state']
+# and the finished game's numbers in infos[i]['episode']:
+#
+#   venv = VecEnv(16)
+#   states = venv.reset()
+#   states, rewards, dones, infos = venv.step(actions)   # actions: (16,) ints
+#
+# =============================================================================
+
+import multiprocessing as mp
+import numpy as np
+
+from game_env_v7 import SpaceInvadersEnv, MAX_ALIENS, STATE_SIZE
+
+
+class VecEnv:
+    """N headless envs stepped in lockstep, in this process."""
+
+    def __init__(self, n_envs, rewards=None):
+        self.n_envs = n_envs
+        self.envs   = [SpaceInvadersEnv(render_mode=False, rewards=rewards) for _ in range(n_envs)]
+        self.states = np.zeros((n_envs, STATE_SIZE), dtype=np.float32)
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            self.states[i] = env.reset()
+        return self.states.copy()
+
+    def step(self, actions):
+        rewards = np.zeros(self.n_envs, dtype=np.float32)
+        dones   = np.zeros(self.n_envs, dtype=bool)
+        infos   = []
+        for i, env in enumerate(self.envs):
+            ns, r, done, info = env.step(int(actions[i]))
+            if done:
+                info['terminal_state'] = ns
+                info['episode'] = {'score': env.score,
+                                   'kills': MAX_ALIENS - env.alien_count,
+                                   'steps': env.steps}
+                ns = env.reset()
+            self.states[i] = ns
+            rewards[i]     = r
+            dones[i]       = done
+            infos.append(info)
+        return self.states.copy(), rewards, dones, infos
+
+    def close(self):
+        pass
+
+
+# =============================================================================
+# WORKER PROCESSES
+# =============================================================================
+
+def _worker(conn, n_envs, rewards=None):
+    venv = VecEnv(n_envs, rewards)
+    try:
+        while True:
+            cmd, data = conn.recv()
+            if cmd == 'step':
+                conn.send(venv.step(data))
+            elif cmd == 'reset':
+                conn.send(venv.reset())
+            elif cmd == 'close':
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        conn.close()
+
+
+class SubprocVecEnv:
+    """
+    Same interface as VecEnv, envs spread over n_workers processes.
+    Each worker steps its own slice as a VecEnv; the parent only sends
+    actions and concatenates results. Spawn-safe — create it under
+    `if __name__ == '__main__':` on Windows.
+    """
+
+    def __init__(self, n_envs, n_workers=None, rewards=None):
+        n_workers = min(n_envs, n_workers or mp.cpu_count())
+        self.n_envs = n_envs
+        self.slices = np.array_split(np.arange(n_envs), n_workers)
+        self.conns, self.procs = [], []
+        for sl in self.slices:
+            parent, child = mp.Pipe()
+            proc = mp.Process(target=_worker, args=(child, len(sl), rewards), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+
+    def reset(self):
+        for conn in self.conns:
+            conn.send(('reset', None))
+        return np.concatenate([conn.recv() for conn in self.conns])
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        for conn, sl in zip(self.conns, self.slices):
+            conn.send(('step', actions[sl]))
+        results = [conn.recv() for conn in self.conns]
+        states  = np.concatenate([r[0] for r in results])
+        rewards = np.concatenate([r[1] for r in results])
+        dones   = np.concatenate([r[2] for r in results])
+        infos   = [info for r in results for info in r[3]]
+        return states, rewards, dones, infos
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
@@ -6,11 +6,9 @@
 # =============================================================================
 
 import os
-import torch
 import pygame
 
 from game_env_v7 import SpaceInvadersEnv
-from ppo_agent_v9 import ActorCritic
 
 # ── Config ────────────────────────────────────────────────────────────────────
 
@@ -18,29 +16,50 @@ SAVE_DIR    = 'D:/PythonProjects/MikeAI/spaceinvaders_AI'
 FINAL_PATH  = f'{SAVE_DIR}/final_model_v9.pth'
 BEST_PATH   = f'{SAVE_DIR}/best_model_v9.pth'
 
-FPS    = 240     # viewing speed — lower = slower, 0 = unlimited
-GREEDY = False   # False = sample from policy (more natural), True = always pick highest-prob action
+FPS     = 240       # viewing speed — lower = slower, 0 = unlimited
+GREEDY  = False     # False = sample from policy (more natural), True = always pick highest-prob action
+BACKEND = 'torch'   # 'torch' = .pth checkpoint, 'onnx' = .onnx from export_v9.py (no PyTorch needed),
+                    # 'server' = a running policy_server_v9.py (shares its one warm model)
+SCRIPT  = False     # torch backend: True = run a traced TorchScript step graph instead of eager
 
-DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+# One state per frame — a GPU round trip costs more than the whole CPU forward
+DEVICE = 'cpu'
 
 # ── Load model — prefer final (latest save), fall back to best ────────────────
 
-if os.path.exists(FINAL_PATH):
-    MODEL_PATH = FINAL_PATH
-elif os.path.exists(BEST_PATH):
-    MODEL_PATH = BEST_PATH
+ext = '.onnx' if BACKEND == 'onnx' else '.pth'
+candidates = [os.path.splitext(p)[0] + ext for p in (FINAL_PATH, BEST_PATH)]
+MODEL_PATH = next((p for p in candidates if os.path.exists(p)), None)
+if MODEL_PATH is None and BACKEND != 'server':
+    raise FileNotFoundError(f"No v9 {ext} model found in {SAVE_DIR}")
+
+if BACKEND == 'server':
+    from policy_server_v9 import PolicyClient, ADDRESS
+    session = PolicyClient(greedy=GREEDY)
+    print(f"Connected : {ADDRESS}")
+    print(f"  update={session.info()['update_num']}  |  Mode: {'greedy' if GREEDY else 'stochastic'}")
+elif BACKEND == 'onnx':
+    from onnx_policy_v9 import OnnxPolicy
+    session = OnnxPolicy(MODEL_PATH, greedy=GREEDY)
+    print(f"Loaded : {MODEL_PATH}")
+    print(f"  update={session.update_num}")
+    print(f"  onnxruntime (CPU)  |  Mode: {'greedy' if GREEDY else 'stochastic'}")
 else:
-    raise FileNotFoundError(f"No v9 model found in {SAVE_DIR}")
+    from ppo_agent_v9 import InferenceSession
+    from evaluate_v9 import load_policy
 
-net = ActorCritic().to(DEVICE)
-ckpt = torch.load(MODEL_PATH, map_location=DEVICE, weights_only=False)
-net.load_state_dict(ckpt['net'])
-net.eval()
+    # Weights-only artifact when present (ms), else the full checkpoint.
+    # ctx_norm: context normalisation the agent was trained with (None = raw features)
+    net, ctx_norm, ckpt = load_policy(MODEL_PATH, DEVICE)
 
-print(f"Loaded : {MODEL_PATH}")
-print(f"  update={ckpt.get('update_num', '?')}  "
-      f"best_avg50={ckpt.get('best_avg50', '?'):.1f}")
-print(f"  Device: {DEVICE}  |  Mode: {'greedy' if GREEDY else 'stochastic'}")
+    # Preallocated single-step player — normalisation is folded into its graph
+    session = InferenceSession(net, greedy=GREEDY, ctx_norm=ctx_norm, device=DEVICE, script=SCRIPT)
+
+    print(f"Loaded : {MODEL_PATH}")
+    print(f"  update={ckpt.get('update_num', '?')}  "
+          f"best_avg50={ckpt.get('best_avg50', '?'):.1f}")
+    print(f"  Device: {DEVICE}  |  Mode: {'greedy' if GREEDY else 'stochastic'}  |  "
+          f"{'TorchScript' if SCRIPT else 'eager'}")
 print("─" * 60)
 print("Q / close window = quit")
 print("─" * 60)
@@ -63,7 +82,7 @@ while running:
     done      = False
 
     # Reset LSTM hidden state at the start of each episode
-    hidden = net.init_hidden(batch_size=1, device=DEVICE)
+    session.reset()
 
     while not done:
 
@@ -77,17 +96,8 @@ while running:
         if not running:
             break
 
-        # Pick action — get_action handles LSTM state internally
-        state_t = torch.FloatTensor(state).unsqueeze(0).to(DEVICE)
-        if GREEDY:
-            with torch.no_grad():
-                x = state_t.unsqueeze(1)
-                trunk = net._backbone(x)
-                lstm_out, hidden = net.lstm(trunk, hidden)
-                logits = net.actor_head(lstm_out.squeeze(1))
-                action = int(logits.argmax(dim=-1).item())
-        else:
-            action, _, _, hidden = net.get_action(state_t, hidden)
+        # Pick action — the session carries the LSTM state between frames
+        action = session.act(state)
 
         state, reward, done, info = env.step(action)
         ep_reward += reward
@@ -106,6 +116,8 @@ while running:
           f"avg_kills={running_kills / ep_num:5.1f}")
 
 pygame.quit()
+if BACKEND == 'server':
+    session.close()                   # free this watcher's session on the server
 print("─" * 60)
 print(f"Watched {ep_num} episodes  |  "
       f"avg kills: {running_kills / max(ep_num, 1):.1f}")